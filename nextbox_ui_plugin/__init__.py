@@ -22,4 +22,8 @@ class NextBoxUIConfig(PluginConfig):
         '*': None
     }
 
+    def ready(self):
+        super().ready()
+        from . import jobs, signals
+
 config = NextBoxUIConfig
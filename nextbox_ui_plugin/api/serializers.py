@@ -1,22 +1,40 @@
+from django.utils import timezone
 from rest_framework import serializers
 from nextbox_ui_plugin.models import SavedTopology
-import datetime
 import json
 
 
+def load_json(value):
+    # Accepts both JSON-encoded strings and already parsed JSON
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
 class SavedTopologySerializer(serializers.ModelSerializer):
 
     created_by = serializers.CharField(read_only=True)
     timestamp = serializers.DateTimeField(read_only=True)
 
     def to_internal_value(self, data):
-        validated = {
-            'name': str(data.get('name').strip() or f"{self.context['request'].user} - {datetime.datetime.now()}"),
-            'topology': json.loads(data.get('topology')),
-            'layout_context': json.loads(data.get('layout_context')),
-            'created_by': self.context['request'].user,
-            'timestamp': str(datetime.datetime.now())
-        }
+        validated = {}
+        now = timezone.now()
+        if not self.partial or 'name' in data:
+            name = str(data.get('name') or '').strip()
+            validated['name'] = (name or f"{self.context['request'].user} - {now}")[:100]
+        for field in ('topology', 'layout_context'):
+            if self.partial and field not in data:
+                continue
+            try:
+                validated[field] = load_json(data.get(field))
+            except ValueError as e:
+                raise serializers.ValidationError({field: f'Invalid JSON: {e}'})
+        if 'topology' in validated and not isinstance(validated['topology'], dict):
+            raise serializers.ValidationError({'topology': 'A JSON object is required.'})
+        # Layouts stay owned by the user who saved them
+        if self.instance is None:
+            validated['created_by'] = self.context['request'].user
+        validated['timestamp'] = now
         return validated
 
     class Meta:
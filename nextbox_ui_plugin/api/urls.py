@@ -4,6 +4,8 @@ from . import views
 
 router = DefaultRouter()
 router.APIRootView = views.NextBoxUIPluginRootView
+router.register('topology', views.TopologyViewSet, basename='topology')
+router.register('saved-topologies', views.SavedTopologyViewSet)
 
 app_name = "nextbox_ui_plugin-api"
 urlpatterns = router.urls
@@ -1,7 +1,31 @@
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.gzip import gzip_page
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import BasePermission
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.response import Response
 from rest_framework.routers import APIRootView
-from rest_framework.viewsets import ModelViewSet
+from rest_framework.settings import api_settings
+from rest_framework.viewsets import ModelViewSet, ViewSet
+from dcim.models import Site
+from nextbox_ui_plugin import NextBoxUIConfig, cache, instrumentation, wire
+from nextbox_ui_plugin.delta import get_request_topology_delta, store_topology_snapshot
+from nextbox_ui_plugin.events import get_request_topology_events
+from nextbox_ui_plugin.jobs import get_request_precomputed_topology, refresh_site_topology
 from nextbox_ui_plugin.models import SavedTopology
+from nextbox_ui_plugin.plugin_settings import is_installed
+from nextbox_ui_plugin.views import (
+    get_cached_request_topology, get_expanded_topology, get_related_fingerprint, get_request_site_id,
+    get_topology_fingerprint, get_topology_params, get_topology_queryset, iter_topology_chunks,
+)
 from . import serializers
+import json
+import re
 
 
 class NextBoxUIPluginRootView(APIRootView):
@@ -11,3 +35,283 @@ class NextBoxUIPluginRootView(APIRootView):
     def get_view_name(self):
         return 'NextBoxUI'
 
+
+class TopologyPermissions(BasePermission):
+    """
+    Requires the same permissions as the Topology Viewer UI.
+    """
+    perms = ('dcim.view_site', 'dcim.view_device', 'dcim.view_cable')
+
+    def has_permission(self, request, view):
+        return request.user.has_perms(self.perms)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Accepts requests for streamed topology records.
+    Streamed responses bypass rendering, errors are rendered as JSON.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode()
+
+
+class EventStreamRenderer(NDJSONRenderer):
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+
+
+class CompactTopologyRenderer(BaseRenderer):
+    """
+    Topology data in the compact column format.
+    Topology responses bypass rendering, errors are rendered as JSON.
+    """
+    media_type = 'application/vnd.nextbox.topology+json'
+    format = 'compact'
+    topology_encoding = 'compact'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode()
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Topology data in the compact column format, encoded as MessagePack."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    topology_encoding = 'msgpack'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return wire.get_optional_module('msgpack').packb(data)
+
+
+TOPOLOGY_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, CompactTopologyRenderer]
+if is_installed('msgpack'):
+    TOPOLOGY_RENDERERS.append(MessagePackRenderer)
+
+TOPOLOGY_CONTENT_TYPES = {
+    'json': 'application/json',
+    'compact': CompactTopologyRenderer.media_type,
+    'msgpack': MessagePackRenderer.media_type,
+}
+
+ACCEPT_BROTLI = re.compile(r'\bbr\b')
+
+
+def compress_brotli(request, response):
+    """
+    Brotli-compresses the response if the brotli package is installed
+    and the client accepts it. Other responses are left to gzip_page.
+    """
+    patch_vary_headers(response, ('Accept-Encoding',))
+    brotli = wire.get_optional_module('brotli')
+    if brotli is None or response.status_code != 200 or response.has_header('Content-Encoding'):
+        return response
+    if not ACCEPT_BROTLI.search(request.headers.get('Accept-Encoding', '')):
+        return response
+    response.content = brotli.compress(response.content, quality=wire.BROTLI_QUALITY)
+    response['Content-Length'] = str(len(response.content))
+    response['Content-Encoding'] = 'br'
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+    return response
+
+
+class TopologyViewSet(ViewSet):
+    """
+    Topology nodes and edges for the TopologyFilterSet parameters.
+    Supports conditional requests via ETag. ETags are derived from a
+    fingerprint of the topology data, requests for an unchanged
+    topology are answered with 304 before it is built.
+    The compact column format is returned for the
+    application/vnd.nextbox.topology+json and application/msgpack
+    media types.
+    The X-Topology-Version response header identifies the topology
+    for incremental updates from the delta endpoint.
+    Precomputed Site topologies carry the X-Topology-Computed
+    and X-Topology-Stale headers.
+    """
+    permission_classes = [TopologyPermissions]
+    renderer_classes = TOPOLOGY_RENDERERS
+
+    def get_view_name(self):
+        return 'Topology'
+
+    @method_decorator(gzip_page)
+    def list(self, request):
+        request_params = request.GET.copy()
+        # The encoding is not part of the topology parameters
+        request_params.pop(api_settings.URL_FORMAT_OVERRIDE, None)
+        encoding = getattr(request.accepted_renderer, 'topology_encoding', 'json')
+        with instrumentation.profile_topology() as profile:
+            queryset = get_topology_queryset(request_params)
+            with instrumentation.phase('fingerprint'):
+                fingerprint = get_topology_fingerprint(queryset)
+            # The fingerprint's Device count spares the aggregation threshold its own count
+            queryset, params = get_topology_params(request_params, queryset, fingerprint['devices'])
+            with instrumentation.phase('fingerprint'):
+                fingerprint.update(get_related_fingerprint(queryset, params))
+            with instrumentation.phase('cache'):
+                precomputed = get_request_precomputed_topology(request_params)
+            # Precomputed topologies change when they are recomputed
+            etag = quote_etag(cache.get_topology_etag(
+                request_params, params, request.user, fingerprint, encoding, NextBoxUIConfig.version,
+                precomputed['computed'] if precomputed is not None else None,
+            ))
+            # Unchanged topologies are neither built nor loaded from the cache
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                if precomputed is not None:
+                    instrumentation.count('precomputed')
+                    topology_dict, last_modified = precomputed['topology'], precomputed['computed']
+                else:
+                    topology_dict, last_modified = get_cached_request_topology(
+                        request_params, queryset, params, request.user
+                    )
+                topology_version = store_topology_snapshot(
+                    request_params, params, request.user, topology_dict, last_modified
+                )
+                with instrumentation.phase('serialize'):
+                    content = wire.encode_topology(topology_dict, encoding)
+                instrumentation.count('payload', len(content))
+        if response is None:
+            response = HttpResponse(content, content_type=TOPOLOGY_CONTENT_TYPES[encoding])
+            response['Last-Modified'] = http_date(int(last_modified.timestamp()))
+            response['X-Topology-Version'] = topology_version
+            if precomputed is not None:
+                response['X-Topology-Computed'] = precomputed['computed'].isoformat()
+                response['X-Topology-Stale'] = str(precomputed['stale']).lower()
+        patch_vary_headers(response, ('Accept',))
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        response['Server-Timing'] = profile.get_server_timing()
+        return compress_brotli(request, response)
+
+    @action(detail=False, methods=['post'])
+    def refresh(self, request):
+        """
+        Enqueues the recomputation of the precomputed topology of the Site
+        given in the 'site_id' parameter: {"job": ..., "status": ...}.
+        The list endpoint serves the new topology once the job has completed.
+        """
+        site_id = get_request_site_id(request.GET)
+        if site_id is None:
+            raise ValidationError('A single site_id parameter is required')
+        job = refresh_site_topology(get_object_or_404(Site, pk=site_id), request.user)
+        return Response({'job': job.pk, 'status': job.status}, status=202)
+
+    @action(detail=False, methods=['get'])
+    @method_decorator(gzip_page)
+    def delta(self, request):
+        """
+        Topology changes since the topology version given in the 'version' parameter:
+        {"version": ..., "full": false, "nodes": {"added", "updated", "removed"}, "edges": {...}}.
+        Added and updated entries carry node and edge data, removed entries their IDs.
+        If the version is unknown or expired, the full topology is returned instead:
+        {"version": ..., "full": true, "topology": {"nodes": [...], "edges": [...]}}.
+        """
+        with instrumentation.profile_topology() as profile:
+            topology_delta = get_request_topology_delta(request)
+            with instrumentation.phase('serialize'):
+                content = json.dumps(topology_delta).encode()
+            instrumentation.count('payload', len(content))
+        response = HttpResponse(content, content_type='application/json')
+        response['Cache-Control'] = 'private, no-store'
+        response['Server-Timing'] = profile.get_server_timing()
+        return response
+
+    @action(detail=False, methods=['get'])
+    @method_decorator(gzip_page)
+    def expand(self, request):
+        """
+        Device-level subgraph of an aggregated topology super-node:
+        {"group": ..., "nodes": [...], "edges": [...]}.
+        The group is given by the 'aggregate' level and 'group_id' parameters
+        ('null' for Devices with no group), groups expanded before
+        by repeated 'expanded' parameters.
+        """
+        request_params = request.GET.copy()
+        group_ids = [request_params.pop('group_id', [''])[-1]] + request_params.pop('expanded', [])
+        try:
+            group_ids = [None if group_id == 'null' else int(group_id) for group_id in group_ids]
+        except ValueError:
+            raise ValidationError('Invalid group_id or expanded parameter')
+        with instrumentation.profile_topology() as profile:
+            queryset, params = get_topology_params(request_params)
+            if not params['aggregate']:
+                raise ValidationError('Invalid aggregate parameter')
+            topology_dict = get_expanded_topology(queryset, params, group_ids[0], group_ids[1:])
+            with instrumentation.phase('serialize'):
+                content = json.dumps(topology_dict).encode()
+            instrumentation.count('payload', len(content))
+        response = HttpResponse(content, content_type='application/json')
+        response['Cache-Control'] = 'private, no-cache'
+        response['Server-Timing'] = profile.get_server_timing()
+        return response
+
+    @action(detail=False, methods=['get'], renderer_classes=[JSONRenderer, NDJSONRenderer])
+    @method_decorator(gzip_page)
+    def stream(self, request):
+        """
+        Streams the topology as newline-delimited JSON records:
+        {"type": "node" | "edge", "data": {...}}.
+        Nodes are sent first, then cable edges, then logical multi-cable edges.
+        """
+        queryset, params = get_topology_params(request.GET.copy())
+
+        def iter_lines():
+            for records in iter_topology_chunks(queryset, params):
+                if records:
+                    yield ''.join(
+                        json.dumps({'type': record_type, 'data': data}) + '\n'
+                        for record_type, data in records
+                    )
+
+        return StreamingHttpResponse(iter_lines(), content_type='application/x-ndjson')
+
+    @action(detail=False, methods=['get'], renderer_classes=[JSONRenderer, EventStreamRenderer])
+    def events(self, request):
+        """
+        Pushes topology deltas as Server-Sent Events ("delta" events,
+        same data as the delta endpoint) whenever the topology changes.
+        Event IDs are topology versions, reconnecting clients resume
+        from the Last-Event-ID header.
+        Responds with 503 if TOPOLOGY_PUSH_MAX_STREAMS streams are open,
+        clients then poll the delta endpoint instead.
+        """
+        topology_events = get_request_topology_events(request)
+        if topology_events is None:
+            return Response(
+                {'detail': 'Too many topology event streams, poll the delta endpoint instead.'},
+                status=503,
+            )
+        response = StreamingHttpResponse(topology_events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Disable response buffering on nginx proxies
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class SavedTopologyViewSet(ModelViewSet):
+    """
+    Saved topology layouts.
+    Filter by the filter set a layout was saved for
+    with the 'filter_key' parameter.
+    """
+    queryset = SavedTopology.objects.all()
+    serializer_class = serializers.SavedTopologySerializer
+
+    def get_view_name(self):
+        return 'Saved Topologies'
+
+    def get_queryset(self):
+        action = 'view' if self.request.method in ('GET', 'HEAD', 'OPTIONS') else 'change'
+        if self.request.method == 'DELETE':
+            action = 'delete'
+        queryset = SavedTopology.objects.restrict(self.request.user, action).select_related('created_by')
+        filter_key = self.request.GET.get('filter_key')
+        if filter_key:
+            queryset = queryset.filter(layout_context__filter_key=filter_key)
+        return queryset.order_by('-timestamp')
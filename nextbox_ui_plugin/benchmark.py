@@ -0,0 +1,482 @@
+"""Topology benchmark suite for NextBox-UI Plugin
+
+Generates synthetic NetBox topologies and measures wall time,
+SQL query counts and peak memory of topology builds and views.
+Used by the nextbox_ui_benchmark management command.
+All fixtures are created inside a transaction which is rolled back
+once the measurements are done. Parallel builds run in worker threads
+with their own database connections, and browser benchmarks load
+topologies from a running NetBox instance, so their fixtures are
+committed and deleted afterwards.
+"""
+from django.conf import settings
+from django.test import Client
+from django.urls import reverse
+from dcim.models import (
+    Cable, Device, DeviceRole, DeviceType, FrontPort, Interface, Manufacturer,
+    PowerFeed, PowerPanel, PowerPort, RearPort, Site,
+)
+from circuits.models import Circuit, CircuitTermination, CircuitType, Provider
+from . import cache, instrumentation, layout, wire
+from .plugin_settings import TOPOLOGY_ENCODINGS
+from .views import get_aggregated_topology, get_partitioned_topology_graph, get_topology, get_topology_graph
+import gc
+import gzip
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+
+SHAPES = ('leaf-spine', 'campus')
+
+# Client-side timings recorded by topoSphereApp.js in window.topologyClientTimings.
+# The initial layout is done once client-layout is recorded.
+BROWSER_TIMINGS = ('data-load', 'first-frame', 'render-complete', 'client-layout', 'main-thread-blocking')
+BROWSER_TIMEOUT_MS = 600000
+
+# Plugin modules imported by NetBox workers on their first request
+IMPORT_TIME_MODULES = (
+    'nextbox_ui_plugin.urls',
+    'nextbox_ui_plugin.api.urls',
+    'nextbox_ui_plugin.template_content',
+    'nextbox_ui_plugin.navigation',
+)
+
+
+class TopologyFixture:
+    """
+    Synthetic topology generator.
+    Creates a Site with the requested number of Devices
+    cabled in a leaf-spine or campus shape. Optionally every
+    uplink is patched through a pair of front/rear port patch panels,
+    and circuit and power feed terminations are added.
+    With several Sites, the Devices are split evenly between
+    Sites of the same shape joined in a ring by inter-site cables.
+    """
+
+    def __init__(self, shape, size, patch_panels=False, circuits=False, power_feeds=False, sites=1):
+        if shape not in SHAPES:
+            raise ValueError(f'Unsupported topology shape: {shape}')
+        self.shape = shape
+        self.size = size
+        self.patch_panels = patch_panels
+        self.circuits = circuits
+        self.power_feeds = power_feeds
+        self.site_count = sites
+        self.sites = []
+        self.devices = []
+        self.interface_counts = {}
+
+    @property
+    def name(self):
+        name = f'{self.shape}-{self.size}'
+        if self.site_count > 1:
+            name += f'-{self.site_count}-sites'
+        if self.patch_panels:
+            name += '-patched'
+        return name
+
+    def create(self):
+        manufacturer, _ = Manufacturer.objects.get_or_create(name='Benchmark', slug='benchmark')
+        self.device_type, _ = DeviceType.objects.get_or_create(
+            manufacturer=manufacturer, model='Benchmark Switch', slug='benchmark-switch'
+        )
+        self.roles = {}
+        gateways = []
+        for index in range(self.site_count):
+            name = f'benchmark-{self.name}' if self.site_count == 1 else f'benchmark-{self.name}-{index}'
+            self.site = Site.objects.create(name=name, slug=name)
+            self.sites.append(self.site)
+            if self.shape == 'leaf-spine':
+                gateways.append(self.create_leaf_spine(self.size // self.site_count))
+            else:
+                gateways.append(self.create_campus(self.size // self.site_count))
+        # Inter-site cables
+        if len(gateways) == 2:
+            self.connect(gateways[0][0], gateways[1][0])
+        elif len(gateways) > 2:
+            for i, site_gateways in enumerate(gateways):
+                self.connect(site_gateways[0], gateways[(i + 1) % len(gateways)][1])
+        self.site = self.sites[0]
+        if self.circuits:
+            self.create_circuits()
+        if self.power_feeds:
+            self.create_power_feeds()
+        return self.site
+
+    def get_devices(self):
+        return Device.objects.filter(site__in=self.sites)
+
+    def get_query(self):
+        return '&'.join(f'site_id={site.pk}' for site in self.sites)
+
+    def delete(self):
+        """Deletes fixtures created outside a transaction."""
+        device_ids = [device.pk for device in self.devices]
+        for cable in Cable.objects.filter(terminations___device_id__in=device_ids).distinct():
+            cable.delete()
+        Circuit.objects.filter(cid=f'benchmark-{self.name}').delete()
+        PowerPanel.objects.filter(site__in=self.sites).delete()
+        Device.objects.filter(pk__in=device_ids).delete()
+        Site.objects.filter(pk__in=[site.pk for site in self.sites]).delete()
+
+    def get_role(self, slug):
+        if slug not in self.roles:
+            self.roles[slug], _ = DeviceRole.objects.get_or_create(name=slug, slug=slug)
+        return self.roles[slug]
+
+    def create_devices(self, role_slug, count):
+        devices = []
+        for i in range(count):
+            device = Device(
+                name=f'{self.name}-{role_slug}-{i}',
+                site=self.site,
+                role=self.get_role(role_slug),
+                device_type=self.device_type,
+            )
+            device.save()
+            devices.append(device)
+        self.devices.extend(devices)
+        return devices
+
+    def create_interface(self, device):
+        index = self.interface_counts.get(device.pk, 0)
+        self.interface_counts[device.pk] = index + 1
+        interface = Interface(device=device, name=f'Ethernet{index}', type='1000base-t')
+        interface.save()
+        return interface
+
+    def create_patch_panel_pair(self):
+        ports = []
+        for _ in range(2):
+            patch_panel = self.create_devices('patch-panel', 1)[0]
+            rear_port = RearPort(device=patch_panel, name='Rear1', type='8p8c', positions=1)
+            rear_port.save()
+            front_port = FrontPort(
+                device=patch_panel, name='Front1', type='8p8c', rear_port=rear_port, rear_port_position=1
+            )
+            front_port.save()
+            ports.append((front_port, rear_port))
+        return ports
+
+    def connect(self, device_a, device_b):
+        interface_a = self.create_interface(device_a)
+        interface_b = self.create_interface(device_b)
+        if not self.patch_panels:
+            Cable(a_terminations=[interface_a], b_terminations=[interface_b]).save()
+            return
+        (front_a, rear_a), (front_b, rear_b) = self.create_patch_panel_pair()
+        Cable(a_terminations=[interface_a], b_terminations=[front_a]).save()
+        Cable(a_terminations=[rear_a], b_terminations=[rear_b]).save()
+        Cable(a_terminations=[front_b], b_terminations=[interface_b]).save()
+
+    def create_leaf_spine(self, size):
+        """Creates a leaf-spine Site. Returns its spines."""
+        spine_count = max(2, size // 20)
+        spines = self.create_devices('spine', spine_count)
+        leaves = self.create_devices('leaf', max(size - spine_count, 0))
+        for i, leaf in enumerate(leaves):
+            # Every leaf is dual-homed to a pair of spines
+            self.connect(leaf, spines[i % spine_count])
+            self.connect(leaf, spines[(i + 1) % spine_count])
+        return spines
+
+    def create_campus(self, size):
+        """Creates a campus Site. Returns its core switches."""
+        cores = self.create_devices('core-switch', 2)
+        distribution_count = max(2, size // 10)
+        distribution = self.create_devices('distribution-switch', distribution_count)
+        access = self.create_devices('access-switch', max(size - distribution_count - 2, 0))
+        for switch in distribution:
+            for core in cores:
+                self.connect(switch, core)
+        for i, switch in enumerate(access):
+            self.connect(switch, distribution[i % distribution_count])
+            self.connect(switch, distribution[(i + 1) % distribution_count])
+        return cores
+
+    def create_circuits(self):
+        provider, _ = Provider.objects.get_or_create(name='Benchmark', slug='benchmark')
+        circuit_type, _ = CircuitType.objects.get_or_create(name='Benchmark', slug='benchmark')
+        circuit = Circuit.objects.create(cid=f'benchmark-{self.name}', provider=provider, type=circuit_type)
+        circuit_termination = CircuitTermination(circuit=circuit, term_side='A')
+        if hasattr(CircuitTermination, 'termination_type'):
+            circuit_termination.termination = self.site
+        else:
+            circuit_termination.site = self.site
+        circuit_termination.save()
+        Cable(
+            a_terminations=[self.create_interface(self.devices[0])],
+            b_terminations=[circuit_termination],
+        ).save()
+
+    def create_power_feeds(self):
+        power_panel = PowerPanel.objects.create(site=self.site, name=f'benchmark-{self.name}')
+        for i, device in enumerate(self.devices[:100]):
+            power_feed = PowerFeed(power_panel=power_panel, name=f'Feed{i}')
+            power_feed.save()
+            power_port = PowerPort(device=device, name='PSU1')
+            power_port.save()
+            Cable(a_terminations=[power_feed], b_terminations=[power_port]).save()
+
+
+def measure(name, func, track_memory=True, invalidate_cache=True):
+    """
+    Measures a single benchmark run.
+    Wall time and SQL query counts are taken from an untraced run,
+    peak memory from a second run under tracemalloc. Retained memory
+    is what the benchmark's return value still holds afterwards.
+    The topology cache is invalidated before every run, unless
+    invalidate_cache is False.
+    """
+    if invalidate_cache:
+        cache.invalidate_all()
+    gc.collect()
+    start = time.perf_counter()
+    with instrumentation.profile_topology() as profile:
+        func()
+    result = {
+        'benchmark': name,
+        'wall_time_ms': (time.perf_counter() - start) * 1000,
+        'queries': profile.queries,
+        'phases': profile.as_dict()['phases'],
+        'counters': profile.as_dict()['counters'],
+    }
+    if track_memory:
+        if invalidate_cache:
+            cache.invalidate_all()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            # The return value is referenced while memory is read, so it counts as retained
+            returned = [func()]
+            result['retained_memory_bytes'], result['peak_memory_bytes'] = tracemalloc.get_traced_memory()
+            returned.clear()
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def measure_payloads(topology_dict):
+    """
+    Measures the topology payload size in every wire encoding,
+    uncompressed and compressed, along with the encoding time.
+    Decoding times are shown in the TOPOLOGY_DEBUG panel of the topology view.
+    """
+    results = []
+    for encoding in TOPOLOGY_ENCODINGS:
+        if encoding == 'msgpack' and wire.get_optional_module('msgpack') is None:
+            continue
+        start = time.perf_counter()
+        content = wire.encode_topology(topology_dict, encoding)
+        result = {
+            'benchmark': f'payload-{encoding}',
+            'wall_time_ms': (time.perf_counter() - start) * 1000,
+            'payload_bytes': len(content),
+            'gzip_bytes': len(gzip.compress(content, compresslevel=6)),
+        }
+        brotli = wire.get_optional_module('brotli')
+        if brotli is not None:
+            result['brotli_bytes'] = len(brotli.compress(content, quality=wire.BROTLI_QUALITY))
+        results.append(result)
+    return results
+
+
+def parse_import_times(output):
+    """
+    Parses 'python -X importtime' output into
+    (depth, module, self time, cumulative time) tuples in microseconds.
+    """
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        module = fields[2].rstrip()
+        depth = len(module) - len(module.lstrip())
+        entries.append((depth, module.strip(), int(fields[0]), int(fields[1])))
+    return entries
+
+
+def trace_imports():
+    """
+    Sets up Django and imports the plugin modules in a fresh
+    interpreter with 'python -X importtime'. Returns the parsed trace.
+    """
+    code = 'import django; django.setup(); ' + ' '.join(f'import {module};' for module in IMPORT_TIME_MODULES)
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, check=True, env=os.environ.copy(),
+    )
+    return parse_import_times(process.stderr)
+
+
+def get_plugin_imports(entries):
+    """Modules of an import trace first imported by plugin modules."""
+    modules = set()
+    ancestors = []
+    # Reversed, the trace lists every module after its parent
+    for depth, module, self_time, cumulative_time in reversed(entries):
+        while ancestors and ancestors[-1][0] >= depth:
+            ancestors.pop()
+        if any(ancestor.startswith('nextbox_ui_plugin') for _, ancestor in ancestors):
+            modules.add(module)
+        ancestors.append((depth, module))
+    return modules
+
+
+def measure_import_time():
+    """
+    Measures import times of the plugin modules in a fresh interpreter
+    with 'python -X importtime', after Django is set up.
+    Total time covers the plugin modules along with
+    everything they import that was not loaded before.
+    """
+    entries = trace_imports()
+    modules = {}
+    total = 0
+    for i, (depth, module, self_time, cumulative_time) in enumerate(entries):
+        if not module.startswith('nextbox_ui_plugin'):
+            continue
+        modules[module] = {'self_us': self_time, 'cumulative_us': cumulative_time}
+        # Children are listed before their parent, with deeper indentation
+        parent = next((entry[1] for entry in entries[i + 1:] if entry[0] < depth), '')
+        if not parent.startswith('nextbox_ui_plugin'):
+            total += cumulative_time
+    return {
+        'benchmark': 'import-time',
+        'wall_time_ms': total / 1000,
+        'modules': modules,
+    }
+
+
+def measure_browser(fixture, user, base_url):
+    """
+    Loads the topology view of the fixture in headless Chromium
+    with Playwright and collects the client-side timings: time to
+    the first frame, to the last rendered node and to the finished
+    layout, along with the main thread blocking time.
+    NetBox has to serve the same database at base_url.
+    """
+    from playwright.sync_api import sync_playwright
+
+    client = get_client(user)
+    session_cookie = client.cookies[settings.SESSION_COOKIE_NAME]
+    url = f"{base_url.rstrip('/')}{reverse('plugins:nextbox_ui_plugin:topology')}?{fixture.get_query()}"
+    with sync_playwright() as playwright:
+        browser = playwright.chromium.launch()
+        try:
+            context = browser.new_context()
+            context.add_cookies([{'name': session_cookie.key, 'value': session_cookie.value, 'url': base_url}])
+            page = context.new_page()
+            start = time.perf_counter()
+            page.goto(url)
+            page.wait_for_function(
+                "window.topologyClientTimings && 'client-layout' in window.topologyClientTimings",
+                timeout=BROWSER_TIMEOUT_MS,
+            )
+            wall_time = time.perf_counter() - start
+            timings = page.evaluate('window.topologyClientTimings')
+        finally:
+            browser.close()
+    return {
+        'benchmark': 'browser-topology',
+        'wall_time_ms': wall_time * 1000,
+        **{f'{name.replace("-", "_")}_ms': timings.get(name) for name in BROWSER_TIMINGS},
+    }
+
+
+def get_client(user):
+    host = next((h for h in settings.ALLOWED_HOSTS if h and '*' not in h), 'localhost')
+    client = Client(HTTP_HOST=host)
+    client.force_login(user)
+    return client
+
+
+def read_response(response):
+    if response.status_code != 200:
+        raise RuntimeError(f'Unexpected status code {response.status_code} for {response.request["PATH_INFO"]}')
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+def read_not_modified_response(response):
+    if response.status_code != 304:
+        raise RuntimeError(f'Unexpected status code {response.status_code} for {response.request["PATH_INFO"]}')
+    return response
+
+
+def run_fixture_benchmarks(fixture, user, track_memory=True, workers=(), browser_url=None):
+    """
+    Runs all topology benchmarks against a created fixture.
+    Parallel builds are measured for every worker count in workers,
+    a single worker builds sequentially. With browser_url, the
+    topology view is also loaded in a headless browser.
+    """
+    client = get_client(user)
+    query = fixture.get_query()
+    params = {'display_unconnected': True, 'display_passive': False}
+    benchmarks = {
+        'get_topology': lambda: get_topology(fixture.get_devices(), params),
+        # Compact records, before they are expanded to topoSphere dicts
+        'get_topology_graph': lambda: get_topology_graph(fixture.get_devices(), params),
+        'get_topology-collapsed': lambda: get_topology(
+            fixture.get_devices(), {**params, 'collapse_virtual_chassis': True, 'merge_links': True}
+        ),
+        'TopologyView': lambda: read_response(
+            client.get(f"{reverse('plugins:nextbox_ui_plugin:topology')}?{query}")
+        ),
+        'SiteTopologyView': lambda: read_response(
+            client.get(f"{reverse('plugins:nextbox_ui_plugin:site_topology')}?{query}")
+        ),
+        # Devices are aggregated by role, fixtures may cover a single Site
+        'get_aggregated_topology': lambda: get_aggregated_topology(
+            fixture.get_devices(), {**params, 'aggregate': 'role'}
+        ),
+        'topology-api': lambda: read_response(
+            client.get(f"{reverse('plugins-api:nextbox_ui_plugin-api:topology-list')}?{query}")
+        ),
+        'topology-stream': lambda: read_response(
+            client.get(f"{reverse('plugins-api:nextbox_ui_plugin-api:topology-stream')}?{query}")
+        ),
+    }
+    for worker_count in workers:
+        benchmarks[f'get_partitioned_topology_graph-workers-{worker_count}'] = (
+            lambda worker_count=worker_count: get_partitioned_topology_graph(
+                fixture.get_devices(), params, workers=worker_count, min_devices=0
+            )
+        )
+    if layout.numpy_available():
+        # Layout input is built once, only the layout computation is measured
+        topology_dict = get_topology(fixture.get_devices(), params)[0]
+        benchmarks['server-layout'] = lambda: layout.compute_layered_layout(
+            topology_dict['nodes'], topology_dict['edges']
+        )
+    results = [measure(name, func, track_memory=track_memory) for name, func in benchmarks.items()]
+    # Conditional request for an unchanged topology, the ETag
+    # changes whenever the topology cache is invalidated
+    topology_url = f"{reverse('plugins-api:nextbox_ui_plugin-api:topology-list')}?{query}"
+    etag = client.get(topology_url)['ETag']
+    results.append(measure(
+        'topology-api-not-modified',
+        lambda: read_not_modified_response(client.get(topology_url, HTTP_IF_NONE_MATCH=etag)),
+        track_memory=False,
+        invalidate_cache=False,
+    ))
+    results.extend(measure_payloads(get_topology(fixture.get_devices(), params)[0]))
+    if browser_url:
+        results.append(measure_browser(fixture, user, browser_url))
+    for result in results:
+        result.update({
+            'fixture': fixture.name,
+            'shape': fixture.shape,
+            'devices': len(fixture.devices),
+            'sites': len(fixture.sites),
+            'patch_panels': fixture.patch_panels,
+        })
+    return results
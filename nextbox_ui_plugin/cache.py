@@ -0,0 +1,342 @@
+"""Server-side topology cache for NextBox-UI Plugin
+
+Computed topologies are stored in Django's cache backend.
+Cache keys are built from normalized filter parameters,
+plugin presentation parameters, the user permission scope
+and a global cache generation token.
+Every cache entry also records a per-site generation token
+for all Sites it covers. Signal handlers rotate site tokens
+on cabling and device changes, so only topologies containing
+the affected Sites are invalidated. Topologies whose filters
+are not limited to specific Sites, e.g. by tenant or region, may
+gain Devices in Sites they do not cover yet. They also record
+a Device generation token, rotated on any Device change.
+Topology snapshots handed out to clients are kept by version
+for incremental topology updates. The last topology change
+is recorded for live topology subscribers.
+Site topologies precomputed by background jobs are kept with
+no timeout, along with the generations they were computed at.
+Topology ETags are derived from the topology scope, a fingerprint
+of the topology data and the last topology change, so they are
+known before the topology is built.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from netbox.authentication import ObjectPermissionBackend
+from . import instrumentation
+from .plugin_settings import get_plugin_settings
+import hashlib
+import json
+import time
+import uuid
+
+
+PLUGIN_SETTINGS = get_plugin_settings()
+
+CACHE_KEY_PREFIX = 'nextbox_ui_plugin'
+GLOBAL_GENERATION_KEY = f'{CACHE_KEY_PREFIX}:generation'
+DEVICE_GENERATION_KEY = f'{CACHE_KEY_PREFIX}:devices'
+UPDATE_KEY = f'{CACHE_KEY_PREFIX}:update'
+STREAM_SLOT_KEY = f'{CACHE_KEY_PREFIX}:stream'
+PERMISSION_SCOPE_PERMS = ('dcim.view_site', 'dcim.view_device', 'dcim.view_cable')
+# Filters which only match Devices in given Sites, or given Devices
+SITE_SCOPE_PARAMS = ('site_id', 'site', 'location_id', 'location', 'rack_id', 'device_id')
+
+
+def new_generation():
+    return uuid.uuid4().hex
+
+
+def site_generation_key(site_id):
+    return f'{CACHE_KEY_PREFIX}:site:{site_id}'
+
+
+def get_generation(key):
+    generation = cache.get(key)
+    if generation is None:
+        generation = new_generation()
+        cache.set(key, generation, timeout=None)
+    return generation
+
+
+def get_global_generation():
+    return get_generation(GLOBAL_GENERATION_KEY)
+
+
+def get_device_generation():
+    return get_generation(DEVICE_GENERATION_KEY)
+
+
+def invalidate_all():
+    """Invalidate every cached topology."""
+    cache.set(GLOBAL_GENERATION_KEY, new_generation(), timeout=None)
+    notify_update()
+
+
+def get_site_generations(site_ids):
+    keys = {site_generation_key(site_id): site_id for site_id in site_ids}
+    generations = cache.get_many(keys.keys())
+    missing = {key: new_generation() for key in keys if key not in generations}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        generations.update(missing)
+    return {keys[key]: generation for key, generation in generations.items()}
+
+
+def invalidate_sites(site_ids):
+    """Invalidate cached topologies covering any of the given Sites."""
+    site_ids = {site_id for site_id in site_ids if site_id is not None}
+    if not site_ids:
+        return
+    cache.set_many(
+        {site_generation_key(site_id): new_generation() for site_id in site_ids},
+        timeout=None
+    )
+    notify_update()
+
+
+def invalidate_devices(site_ids):
+    """
+    Invalidate cached topologies covering any of the given Sites,
+    along with those not limited to specific Sites, which
+    the changed Devices may have entered.
+    """
+    site_ids = {site_id for site_id in site_ids if site_id is not None}
+    if not site_ids:
+        return
+    cache.set(DEVICE_GENERATION_KEY, new_generation(), timeout=None)
+    invalidate_sites(site_ids)
+
+
+def is_site_scoped(request_params):
+    """Whether the filters only match Devices of specific Sites."""
+    return any(value for param in SITE_SCOPE_PARAMS for value in request_params.getlist(param))
+
+
+def precomputed_topology_key(site_id):
+    return f'{CACHE_KEY_PREFIX}:precomputed:{site_id}'
+
+
+def precompute_pending_key(site_id):
+    return f'{CACHE_KEY_PREFIX}:precompute-pending:{site_id}'
+
+
+def get_site_generation_state(site_id):
+    """
+    Global and Site generations, read before a Site
+    topology is precomputed.
+    """
+    return get_global_generation(), get_site_generations({site_id})[site_id]
+
+
+def set_precomputed_topology(site_id, topology_dict, computed, generation_state):
+    cache.set(precomputed_topology_key(site_id), {
+        'generation_state': generation_state,
+        'topology': topology_dict,
+        'computed': computed,
+    }, timeout=None)
+
+
+def get_precomputed_topology(site_id):
+    """
+    Returns the precomputed topology of the Site as
+    {'topology': ..., 'computed': ..., 'stale': ...}, or None.
+    Topologies are stale once the Site or all topologies are
+    invalidated after they were computed.
+    """
+    precomputed = cache.get(precomputed_topology_key(site_id))
+    if precomputed is None:
+        return None
+    return {
+        'topology': precomputed['topology'],
+        'computed': precomputed['computed'],
+        'stale': precomputed['generation_state'] != get_site_generation_state(site_id),
+    }
+
+
+def get_precomputed_site_ids(site_ids):
+    """Returns the IDs of the given Sites with precomputed topologies."""
+    keys = {precomputed_topology_key(site_id): site_id for site_id in site_ids}
+    return {keys[key] for key in cache.get_many(keys.keys())}
+
+
+def claim_precompute(site_id, timeout):
+    """
+    Marks a precompute job of the Site as pending for timeout seconds.
+    Returns False if one is pending already.
+    """
+    return cache.add(precompute_pending_key(site_id), True, timeout=timeout)
+
+
+def claim_stream_slot(max_streams, timeout):
+    """
+    Claims one of max_streams event stream slots, shared
+    by all NetBox workers, for at most timeout seconds.
+    Returns the cache key of the slot, or None if all are taken.
+    """
+    for slot in range(max_streams):
+        key = f'{STREAM_SLOT_KEY}:{slot}'
+        if cache.add(key, True, timeout=timeout):
+            return key
+    return None
+
+
+def release_stream_slot(key):
+    cache.delete(key)
+
+
+def notify_update():
+    """
+    Records a topology change for live topology subscribers
+    once the current transaction is committed, so that
+    its change log records are visible to them.
+    """
+    transaction.on_commit(
+        lambda: cache.set(UPDATE_KEY, (new_generation(), time.time()), timeout=None)
+    )
+
+
+def get_update_state():
+    """Returns the ID and the time of the last topology change."""
+    return cache.get(UPDATE_KEY) or (None, 0.0)
+
+
+def get_permission_scope(user):
+    """
+    Identifies the set of objects visible to the user.
+    Users sharing the same constraints on the required
+    permissions share cached topologies.
+    """
+    if user.is_superuser:
+        return 'superuser'
+    object_permissions = ObjectPermissionBackend().get_all_permissions(user)
+    return {
+        perm: object_permissions.get(perm)
+        for perm in PERMISSION_SCOPE_PERMS
+    }
+
+
+def normalize_request_params(request_params):
+    normalized_params = sorted(
+        (key, sorted(str(v) for v in values if v not in (None, '')))
+        for key, values in request_params.lists()
+    )
+    return [p for p in normalized_params if p[1]]
+
+
+def get_topology_scope(request_params, params, user):
+    """
+    Identifies the topology requested: normalized filterset
+    parameters, plugin presentation parameters and
+    the user permission scope.
+    request_params is a QueryDict of filterset parameters,
+    params is a dict of plugin presentation parameters.
+    """
+    return [
+        normalize_request_params(request_params),
+        sorted(params.items()),
+        get_permission_scope(user),
+    ]
+
+
+def get_filter_key(request_params):
+    """
+    Identifies a filter set regardless of the user, e.g. for
+    reusing topology layouts saved for the same filters.
+    """
+    return get_key_hash(normalize_request_params(request_params))
+
+
+def get_key_hash(key_data):
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def get_topology_cache_key(request_params, params, user):
+    """Builds the topology cache key."""
+    key_hash = get_key_hash([get_global_generation(), *get_topology_scope(request_params, params, user)])
+    return f'{CACHE_KEY_PREFIX}:topology:{key_hash}'
+
+
+def get_topology_etag(request_params, params, user, fingerprint, *state):
+    """
+    Builds the topology ETag from the topology scope and the fingerprint
+    of its data. The global generation and the last topology change
+    cover changes outside the fingerprinted data, e.g. renamed
+    Interfaces or patch panels of other Sites on cable paths.
+    Further state the response depends on, such as its encoding,
+    is passed in state.
+    """
+    return get_key_hash([
+        get_global_generation(),
+        get_update_state()[0],
+        *get_topology_scope(request_params, params, user),
+        fingerprint,
+        *state,
+    ])
+
+
+def get_snapshot_key(request_params, params, user, version):
+    key_hash = get_key_hash(get_topology_scope(request_params, params, user))
+    return f'{CACHE_KEY_PREFIX}:snapshot:{key_hash}:{version}'
+
+
+def get_delta_key(request_params, params, user, version, update_id):
+    key_hash = get_key_hash(get_topology_scope(request_params, params, user))
+    return f'{CACHE_KEY_PREFIX}:delta:{key_hash}:{version}:{update_id}'
+
+
+def get_topology_snapshot(snapshot_key):
+    """
+    Returns the topology dict served to clients as the version
+    in the snapshot key, or None if it has expired or any
+    global invalidation happened since.
+    """
+    snapshot = cache.get(snapshot_key)
+    if snapshot is None or snapshot['generation'] != get_global_generation():
+        return None
+    return snapshot['topology']
+
+
+def set_topology_snapshot(snapshot_key, topology_dict):
+    # Snapshots are immutable, an existing one is never overwritten
+    cache.add(snapshot_key, {
+        'generation': get_global_generation(),
+        'topology': topology_dict,
+    }, timeout=PLUGIN_SETTINGS.topology_snapshot_timeout)
+
+
+def get_cached_topology(cache_key, nb_devices_qs, build, site_scoped=True):
+    """
+    Returns the topology dict stored under the cache key
+    and the time it was computed.
+    On a cache miss, or if any covered Site has been invalidated,
+    calls build() and stores its result. Unless site_scoped,
+    any Device change invalidates the entry as well.
+    """
+    if not PLUGIN_SETTINGS.topology_cache_timeout:
+        return build(), timezone.now()
+    with instrumentation.phase('cache'):
+        cached = cache.get(cache_key)
+        cache_hit = (
+            cached is not None
+            and get_site_generations(cached['sites']) == cached['sites']
+            and cached.get('devices') in (None, get_device_generation())
+        )
+    if cache_hit:
+        instrumentation.count('cache_hits')
+        return cached['topology'], cached['last_modified']
+    # Generations are read before building so that changes
+    # made while the topology is being built invalidate the entry.
+    device_generation = None if site_scoped else get_device_generation()
+    site_ids = set(nb_devices_qs.order_by().values_list('site_id', flat=True).distinct())
+    site_generations = get_site_generations(site_ids)
+    topology_dict = build()
+    last_modified = timezone.now()
+    cache.set(cache_key, {
+        'sites': site_generations,
+        'devices': device_generation,
+        'topology': topology_dict,
+        'last_modified': last_modified,
+    }, timeout=PLUGIN_SETTINGS.topology_cache_timeout)
+    return topology_dict, last_modified
@@ -0,0 +1,281 @@
+"""Incremental topology updates for NextBox-UI Plugin
+
+Every topology served through the API is identified by a version,
+the time it was computed at. A snapshot of it is kept in the cache
+under that version. Delta requests consult NetBox change log records
+made since the client-held version, rebuild the topology of the
+affected Devices' neighborhood only and return the nodes and edges
+that differ from the client's snapshot.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from core.models import ObjectChange
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+from dcim.models import Cable, CablePath, CableTermination, Device, FrontPort, Interface, RearPort
+from dcim.utils import compile_path_node
+from . import cache, instrumentation
+from .views import get_cached_request_topology, get_topology, get_topology_params, is_collapsed
+
+
+# Change log records are read with an overlap, so changes committed
+# by transactions which started before the previous delta request
+# are not missed. Applying a change twice yields the same result.
+CHANGE_LOG_OVERLAP = timedelta(seconds=10)
+
+# Deltas affecting more Devices than this are replaced
+# by a full topology response.
+MAX_DELTA_DEVICES = 500
+
+DELTA_MODELS = (Device, Cable, CableTermination, Interface)
+
+
+def get_topology_version(last_modified):
+    return f'{last_modified.timestamp():.6f}'
+
+
+def parse_topology_version(topology_version):
+    try:
+        return datetime.fromtimestamp(float(topology_version), tz=dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def get_delta_request_params(request):
+    request_params = request.GET.copy()
+    request_params.pop('version', None)
+    return request_params
+
+
+def store_topology_snapshot(request_params, params, user, topology_dict, last_modified):
+    """Keeps the topology served to the client for later deltas. Returns its version."""
+    topology_version = get_topology_version(last_modified)
+    cache.set_topology_snapshot(
+        cache.get_snapshot_key(request_params, params, user, topology_version),
+        topology_dict,
+    )
+    return topology_version
+
+
+def get_component_device_ids(components):
+    """
+    Resolves parent Device IDs of Device components
+    given as (content type ID, object ID) pairs.
+    """
+    object_ids = {}
+    for ct_id, object_id in components:
+        object_ids.setdefault(ct_id, set()).add(object_id)
+    device_ids = set()
+    for ct_id, ids in object_ids.items():
+        model_class = ContentType.objects.get_for_id(ct_id).model_class()
+        if model_class is None or not hasattr(model_class, 'device'):
+            continue
+        device_ids.update(model_class.objects.filter(pk__in=ids).values_list('device_id', flat=True))
+    return device_ids
+
+
+def get_changed_device_ids(since):
+    """
+    Reads change log records of Devices, Cables, CableTerminations
+    and Interfaces made since the given time.
+    Returns the IDs of the Devices they affect
+    and the IDs of deleted Devices.
+    """
+    content_types = ContentType.objects.get_for_models(*DELTA_MODELS)
+    device_ct = content_types[Device]
+    cable_ct = content_types[Cable]
+    cable_termination_ct = content_types[CableTermination]
+    changes = ObjectChange.objects.filter(
+        time__gt=since - CHANGE_LOG_OVERLAP,
+        changed_object_type__in=content_types.values(),
+    ).values_list(
+        'action', 'changed_object_type_id', 'changed_object_id',
+        'related_object_type_id', 'related_object_id',
+        'prechange_data', 'postchange_data',
+    )
+    device_ids = set()
+    deleted_device_ids = set()
+    cable_ids = set()
+    components = set()
+    for action, ct_id, object_id, related_ct_id, related_id, prechange_data, postchange_data in changes:
+        if ct_id == device_ct.pk:
+            device_ids.add(object_id)
+            if action == 'delete':
+                deleted_device_ids.add(object_id)
+            continue
+        if ct_id == cable_ct.pk:
+            cable_ids.add(object_id)
+            continue
+        # Interfaces relate to their Device,
+        # CableTerminations to their termination object
+        if related_ct_id == device_ct.pk:
+            device_ids.add(related_id)
+        elif related_ct_id is not None:
+            components.add((related_ct_id, related_id))
+        if ct_id == cable_termination_ct.pk:
+            for data in (prechange_data, postchange_data):
+                if not data:
+                    continue
+                if data.get('cable'):
+                    cable_ids.add(data['cable'])
+                if data.get('termination_type') and data.get('termination_id'):
+                    components.add((data['termination_type'], data['termination_id']))
+    # Termination types are serialized as content type IDs
+    components = {(ct_id, object_id) for ct_id, object_id in components if isinstance(ct_id, int)}
+    if components:
+        device_ids.update(get_component_device_ids(components))
+    if cable_ids:
+        device_ids.update(
+            CableTermination.objects.filter(
+                cable_id__in=cable_ids, _device__isnull=False
+            ).values_list('_device_id', flat=True)
+        )
+    device_ids.discard(None)
+    return device_ids, deleted_device_ids
+
+
+def get_transit_path_device_ids(device_ids):
+    """
+    Returns IDs of the Devices at the ends of cable paths
+    passing through front and rear ports of the given Devices.
+    Logical multi-cable edges between them depend on these ports.
+    """
+    path_nodes = []
+    for model in (FrontPort, RearPort):
+        ct = ContentType.objects.get_for_model(model)
+        path_nodes.extend(
+            compile_path_node(ct.pk, object_id)
+            for object_id in model.objects.filter(device_id__in=device_ids).values_list('pk', flat=True)
+        )
+    if not path_nodes:
+        return set()
+    cable_paths = CablePath.objects.filter(_nodes__overlap=path_nodes).values('pk')
+    return set(Interface.objects.filter(_path_id__in=cable_paths).values_list('device_id', flat=True))
+
+
+def get_neighbor_device_ids(device_ids):
+    """Returns IDs of the Devices sharing a Cable with any of the given Devices."""
+    cable_ids = CableTermination.objects.filter(_device_id__in=device_ids).values('cable_id')
+    return set(
+        CableTermination.objects.filter(
+            cable_id__in=cable_ids, _device__isnull=False
+        ).values_list('_device_id', flat=True)
+    )
+
+
+def diff_objects(old_objects, new_objects):
+    return {
+        'added': [data for object_id, data in new_objects.items() if object_id not in old_objects],
+        'updated': [
+            data for object_id, data in new_objects.items()
+            if object_id in old_objects and old_objects[object_id] != data
+        ],
+        'removed': [object_id for object_id in old_objects if object_id not in new_objects],
+    }
+
+
+def get_empty_delta():
+    return {
+        'nodes': {'added': [], 'updated': [], 'removed': []},
+        'edges': {'added': [], 'updated': [], 'removed': []},
+    }
+
+
+def get_topology_patch(topology_dict, nb_devices_qs, params, affected_device_ids):
+    """
+    Rebuilds the topology of the affected Devices and their neighbors.
+    Returns the delta to the given topology dict and the patched topology dict.
+    Only nodes of the affected Devices and edges attached to them
+    are compared, every other part of the topology is kept as is.
+    """
+    region_device_ids = affected_device_ids | get_neighbor_device_ids(affected_device_ids)
+    region_topology = get_topology(nb_devices_qs.filter(pk__in=region_device_ids), params)[0]
+    affected = {f'device-{device_id}' for device_id in affected_device_ids}
+
+    def is_affected_edge(edge):
+        return edge['source'] in affected or edge['target'] in affected
+
+    old_nodes = {node['id']: node for node in topology_dict['nodes'] if node['id'] in affected}
+    new_nodes = {node['id']: node for node in region_topology['nodes'] if node['id'] in affected}
+    old_edges = {edge['id']: edge for edge in topology_dict['edges'] if is_affected_edge(edge)}
+    new_edges = {edge['id']: edge for edge in region_topology['edges'] if is_affected_edge(edge)}
+    # Nodes keep server-side computed positions
+    for node_id, node in new_nodes.items():
+        if node_id in old_nodes and 'coord' in old_nodes[node_id]:
+            node['coord'] = old_nodes[node_id]['coord']
+
+    delta = {
+        'nodes': diff_objects(old_nodes, new_nodes),
+        'edges': diff_objects(old_edges, new_edges),
+    }
+    # Updated nodes are replaced on the client along with their edges
+    updated_node_ids = {node['id'] for node in delta['nodes']['updated']}
+    sent_edge_ids = {edge['id'] for edge in delta['edges']['added'] + delta['edges']['updated']}
+    delta['edges']['updated'].extend(
+        edge for edge_id, edge in new_edges.items()
+        if edge_id not in sent_edge_ids and (
+            edge['source'] in updated_node_ids or edge['target'] in updated_node_ids
+        )
+    )
+
+    patched_topology = {
+        'nodes': [
+            node for node in topology_dict['nodes'] if node['id'] not in affected
+        ] + list(new_nodes.values()),
+        'edges': [
+            edge for edge in topology_dict['edges'] if not is_affected_edge(edge)
+        ] + list(new_edges.values()),
+    }
+    return delta, patched_topology
+
+
+def get_topology_delta(request_params, user, topology_version):
+    """
+    Returns the topology delta for the filterset parameters
+    since the given topology version.
+    Falls back to the full topology if the client snapshot has
+    expired, the change is too large to be patched or
+    the topology is aggregated.
+    """
+    now = timezone.now()
+    queryset, params = get_topology_params(request_params)
+    since = parse_topology_version(topology_version)
+    topology_dict = None
+    if since is not None:
+        topology_dict = cache.get_topology_snapshot(
+            cache.get_snapshot_key(request_params, params, user, topology_version)
+        )
+
+    if topology_dict is not None:
+        with instrumentation.phase('changes'):
+            device_ids, deleted_device_ids = get_changed_device_ids(since)
+        instrumentation.count('changed_devices', len(device_ids))
+        if not device_ids:
+            return {'version': topology_version, 'full': False, **get_empty_delta()}
+        with instrumentation.phase('changes'):
+            device_ids |= get_transit_path_device_ids(device_ids)
+        node_ids = {node['id'] for node in topology_dict['nodes']}
+        # Deleted hidden Devices, such as passive patch panels,
+        # may have carried logical edges which cannot be traced anymore
+        hidden_deleted = any(f'device-{device_id}' not in node_ids for device_id in deleted_device_ids)
+        # Aggregated topologies are not patched, they are cheap to rebuild.
+        # Neither are neighborhoods, cabling changes move their bounds,
+        # nor collapsed topologies, whose records are not per Device
+        patchable = not (
+            params.get('aggregate') or params.get('neighborhood') or is_collapsed(params) or hidden_deleted
+        )
+        if patchable and len(device_ids) <= MAX_DELTA_DEVICES:
+            delta, patched_topology = get_topology_patch(topology_dict, queryset, params, device_ids)
+            topology_version = store_topology_snapshot(request_params, params, user, patched_topology, now)
+            return {'version': topology_version, 'full': False, **delta}
+
+    topology_dict, last_modified = get_cached_request_topology(request_params, queryset, params, user)
+    topology_version = store_topology_snapshot(request_params, params, user, topology_dict, last_modified)
+    return {'version': topology_version, 'full': True, 'topology': topology_dict}
+
+
+def get_request_topology_delta(request):
+    """
+    Returns the topology delta for the request GET parameters
+    since the topology version given in the 'version' parameter.
+    """
+    return get_topology_delta(get_delta_request_params(request), request.user, request.GET.get('version'))
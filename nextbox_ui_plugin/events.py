@@ -0,0 +1,138 @@
+"""Live topology updates for NextBox-UI Plugin
+
+Topology changes are pushed to open topology views as
+Server-Sent Events. Every subscriber watches the last topology
+change recorded in the cache by the signal handlers. Bursts of
+changes, such as bulk cable imports, are coalesced until they
+settle. The resulting topology delta is computed once per filter
+set and topology version and shared through the cache by all
+subscribers of the same view.
+Every subscriber holds a NetBox worker for the duration of its
+stream, so concurrent streams are capped by TOPOLOGY_PUSH_MAX_STREAMS.
+Database connections are only held while deltas are computed.
+"""
+from django.core.cache import cache as django_cache
+from django.db import connection
+from . import cache
+from .delta import get_delta_request_params, get_topology_delta
+from .plugin_settings import get_plugin_settings
+from .views import get_topology_params
+import json
+import time
+
+
+PLUGIN_SETTINGS = get_plugin_settings()
+
+# Continuous changes are pushed at least this often, in seconds
+MAX_PUSH_DELAY = 10
+# How often subscribers check for topology changes, in seconds
+CHECK_INTERVAL = 1
+HEARTBEAT_INTERVAL = 15
+# Event streams are closed after this many seconds,
+# browsers reconnect and resume from the last event ID
+STREAM_DURATION = 300
+RECONNECT_DELAY = 5
+# Time limit for a shared delta computation, in seconds
+DELTA_LOCK_TIMEOUT = 30
+DELTA_RESULT_TIMEOUT = 60
+# Stream slots of streams that were not closed properly expire after this many seconds
+STREAM_SLOT_TIMEOUT = STREAM_DURATION + DELTA_LOCK_TIMEOUT + 60
+
+
+def get_shared_topology_delta(request_params, params, user, topology_version, update_id):
+    """
+    Computes the topology delta once for all subscribers
+    of the same filter set and topology version.
+    Concurrent subscribers wait for the result of the first one.
+    """
+    delta_key = cache.get_delta_key(request_params, params, user, topology_version, update_id)
+    lock_key = f'{delta_key}:lock'
+    deadline = time.monotonic() + DELTA_LOCK_TIMEOUT
+    while True:
+        topology_delta = django_cache.get(delta_key)
+        if topology_delta is not None:
+            return topology_delta
+        if django_cache.add(lock_key, True, timeout=DELTA_LOCK_TIMEOUT) or time.monotonic() > deadline:
+            break
+        time.sleep(0.2)
+    try:
+        topology_delta = get_topology_delta(request_params, user, topology_version)
+        django_cache.set(delta_key, topology_delta, timeout=DELTA_RESULT_TIMEOUT)
+    finally:
+        django_cache.delete(lock_key)
+    return topology_delta
+
+
+def format_event(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def iter_topology_events(request_params, params, user, topology_version, stream_slot=None):
+    """
+    Yields Server-Sent Events with topology deltas since the given
+    topology version. The event ID is the topology version after the delta.
+    params are the topology parameters resolved from request_params.
+    The stream slot, if any, is released once the stream is closed.
+    """
+    try:
+        # The connection opened for the request is not needed between deltas
+        connection.close()
+        yield f'retry: {RECONNECT_DELAY * 1000}\n\n'
+        started = time.monotonic()
+        last_event = started
+        last_update_id = cache.get_update_state()[0]
+        # Changes made before subscribing are pushed right away
+        pending_since = started - MAX_PUSH_DELAY
+        while time.monotonic() - started < STREAM_DURATION:
+            update_id, update_time = cache.get_update_state()
+            now = time.monotonic()
+            if update_id != last_update_id and pending_since is None:
+                pending_since = now
+            settled = time.time() - update_time >= PLUGIN_SETTINGS.topology_push_debounce
+            if pending_since is not None and (settled or now - pending_since >= MAX_PUSH_DELAY):
+                last_update_id = update_id
+                pending_since = None
+                topology_delta = get_shared_topology_delta(
+                    request_params, params, user, topology_version, update_id
+                )
+                connection.close()
+                changed = topology_delta['full'] or any(
+                    topology_delta[objects][change]
+                    for objects in ('nodes', 'edges')
+                    for change in ('added', 'updated', 'removed')
+                )
+                topology_version = topology_delta['version']
+                if changed:
+                    last_event = now
+                    yield format_event('delta', topology_delta, event_id=topology_version)
+            if now - last_event >= HEARTBEAT_INTERVAL:
+                last_event = now
+                yield ': heartbeat\n\n'
+            time.sleep(CHECK_INTERVAL)
+    finally:
+        if stream_slot is not None:
+            cache.release_stream_slot(stream_slot)
+
+
+def get_request_topology_events(request):
+    """
+    Topology events for the request GET parameters. The topology version
+    is taken from the Last-Event-ID header of reconnecting browsers,
+    or the 'version' parameter.
+    Returns None if TOPOLOGY_PUSH_MAX_STREAMS streams are open already.
+    """
+    topology_version = request.headers.get('Last-Event-ID') or request.GET.get('version')
+    request_params = get_delta_request_params(request)
+    # Parameters are resolved once per stream
+    params = get_topology_params(request_params)[1]
+    stream_slot = None
+    if PLUGIN_SETTINGS.topology_push_max_streams:
+        stream_slot = cache.claim_stream_slot(PLUGIN_SETTINGS.topology_push_max_streams, STREAM_SLOT_TIMEOUT)
+        if stream_slot is None:
+            return None
+    return iter_topology_events(request_params, params, request.user, topology_version, stream_slot)
@@ -6,12 +6,20 @@ from ipam.filtersets import PrimaryIPFilterSet
 from ipam.models import IPAddress
 from netbox.filtersets import NetBoxModelFilterSet
 from tenancy.filtersets import TenancyFilterSet, ContactModelFilterSet
-from tenancy.models import *
 from utilities.filters import MultiValueCharFilter, TreeNodeMultipleChoiceFilter
 from virtualization.models import Cluster, ClusterGroup
-from dcim.choices import *
-from dcim.constants import *
-from dcim.models import *
+from dcim.choices import DeviceStatusChoices
+from dcim.models import (
+    ConsolePort, ConsoleServerPort, Device, DeviceBay, DeviceRole, DeviceType, FrontPort, Interface, InventoryItem,
+    Location, Manufacturer, ModuleBay, Platform, PowerOutlet, PowerPort, Rack, RearPort, Region, Site, SiteGroup,
+    VirtualChassis, VirtualDeviceContext,
+)
+from django.db.models import Exists, OuterRef, Q
+
+
+def device_components(model):
+    """Semi-join of the Device's components, matches each Device once."""
+    return Exists(model.objects.filter(device=OuterRef('pk')))
 
 
 class TopologyFilterSet(
@@ -252,18 +260,21 @@ class TopologyFilterSet(
         )
 
     def search(self, queryset, name, value):
+        # Related objects are matched by semi-joins, so no Device is
+        # repeated and icontains lookups may use the optional trigram indexes
         if not value.strip():
             return queryset
+        primary_ips = IPAddress.objects.filter(address__startswith=value).values('pk')
         return queryset.filter(
             Q(name__icontains=value) |
             Q(serial__icontains=value.strip()) |
-            Q(inventoryitems__serial__icontains=value.strip()) |
+            Exists(InventoryItem.objects.filter(device=OuterRef('pk'), serial__icontains=value.strip())) |
             Q(asset_tag__icontains=value.strip()) |
             Q(description__icontains=value.strip()) |
             Q(comments__icontains=value) |
-            Q(primary_ip4__address__startswith=value) |
-            Q(primary_ip6__address__startswith=value)
-        ).distinct()
+            Q(primary_ip4__in=primary_ips) |
+            Q(primary_ip6__in=primary_ips)
+        )
 
     def _has_primary_ip(self, queryset, name, value):
         params = Q(primary_ip4__isnull=False) | Q(primary_ip6__isnull=False)
@@ -280,38 +291,44 @@ class TopologyFilterSet(
     def _virtual_chassis_member(self, queryset, name, value):
         return queryset.exclude(virtual_chassis__isnull=value)
 
+    def filter_components(self, queryset, value, *models):
+        # Devices with any of the component types, or with none of them
+        params = Q()
+        for model in models:
+            params |= device_components(model)
+        if value:
+            return queryset.filter(params)
+        return queryset.filter(~params)
+
     def _console_ports(self, queryset, name, value):
-        return queryset.exclude(consoleports__isnull=value)
+        return self.filter_components(queryset, value, ConsolePort)
 
     def _console_server_ports(self, queryset, name, value):
-        return queryset.exclude(consoleserverports__isnull=value)
+        return self.filter_components(queryset, value, ConsoleServerPort)
 
     def _power_ports(self, queryset, name, value):
-        return queryset.exclude(powerports__isnull=value)
+        return self.filter_components(queryset, value, PowerPort)
 
     def _power_outlets(self, queryset, name, value):
-        return queryset.exclude(poweroutlets__isnull=value)
+        return self.filter_components(queryset, value, PowerOutlet)
 
     def _interfaces(self, queryset, name, value):
-        return queryset.exclude(interfaces__isnull=value)
+        return self.filter_components(queryset, value, Interface)
 
     def _pass_through_ports(self, queryset, name, value):
-        return queryset.exclude(
-            frontports__isnull=value,
-            rearports__isnull=value
-        )
+        if value:
+            return self.filter_components(queryset, value, FrontPort, RearPort)
+        # Devices missing either front or rear ports, as in the DeviceFilterSet
+        return queryset.filter(~device_components(FrontPort) | ~device_components(RearPort))
 
     def _module_bays(self, queryset, name, value):
-        return queryset.exclude(modulebays__isnull=value)
+        return self.filter_components(queryset, value, ModuleBay)
 
     def _device_bays(self, queryset, name, value):
-        return queryset.exclude(devicebays__isnull=value)
+        return self.filter_components(queryset, value, DeviceBay)
 
     def _has_virtual_device_context(self, queryset, name, value):
-        params = Q(vdcs__isnull=False)
-        if value:
-            return queryset.filter(params).distinct()
-        return queryset.exclude(params)
+        return self.filter_components(queryset, value, VirtualDeviceContext)
     
     def filter_exclude_site(self, queryset, name, value):
         """
@@ -1,9 +1,8 @@
 from django import forms
 from django.utils.translation import gettext_lazy as _
 
-from dcim.choices import *
-from dcim.constants import *
-from dcim.models import *
+from dcim.choices import DeviceStatusChoices
+from dcim.models import Device, DeviceRole, DeviceType, Location, Manufacturer, Platform, Rack, Region, Site, SiteGroup
 from extras.forms import LocalConfigContextFilterForm
 from netbox.forms import NetBoxModelFilterSetForm
 from tenancy.forms import ContactModelFilterForm, TenancyFilterForm
@@ -12,6 +11,15 @@ from utilities.forms.fields import DynamicModelMultipleChoiceField, TagFilterFie
 from utilities.forms.rendering import FieldSet
 from virtualization.models import Cluster, ClusterGroup
 
+AGGREGATE_CHOICES = (
+    ('', '---------'),
+    ('none', _('Devices')),
+    ('site', _('Site')),
+    ('location', _('Location')),
+    ('rack', _('Rack')),
+    ('role', _('Role')),
+)
+
 class TopologyFilterForm(
     LocalConfigContextFilterForm,
     TenancyFilterForm,
@@ -35,7 +43,11 @@ class TopologyFilterForm(
             name=_('Miscellaneous')
         ),
         FieldSet('exclude_device_id', 'exclude_site', 'exclude_site_group', 'exclude_location', 'exclude_role', name=_('Exclude')),
-        FieldSet('display_unconnected', 'display_passive', name=_('Topology Presentation Preferences')),
+        FieldSet('neighborhood_device_id', 'hops', name=_('Neighborhood')),
+        FieldSet(
+            'display_unconnected', 'display_passive', 'aggregate', 'collapse_virtual_chassis', 'merge_links',
+            name=_('Topology Presentation Preferences')
+        ),
     )
     selector_fields = ('filter_id', 'q', 'region_id', 'site_group_id', 'site_id', 'location_id', 'rack_id')
     device_id = DynamicModelMultipleChoiceField(
@@ -221,6 +233,17 @@ class TopologyFilterForm(
         label=_('Exclude Role')
     )
     # Plugin-specific fields
+    neighborhood_device_id = DynamicModelMultipleChoiceField(
+        queryset=Device.objects.all(),
+        to_field_name='id',
+        required=False,
+        label=_('Neighborhood Of Device')
+    )
+    hops = forms.IntegerField(
+        min_value=1,
+        required=False,
+        label=_('Neighborhood Hops')
+    )
     display_unconnected = forms.NullBooleanField(
         required=False,
         label=_('Display Unconnected Devices'),
@@ -235,3 +258,22 @@ class TopologyFilterForm(
             choices=BOOLEAN_WITH_BLANK_CHOICES
         )
     )
+    aggregate = forms.ChoiceField(
+        choices=AGGREGATE_CHOICES,
+        required=False,
+        label=_('Aggregate Devices By')
+    )
+    collapse_virtual_chassis = forms.NullBooleanField(
+        required=False,
+        label=_('Collapse Virtual Chassis'),
+        widget=forms.Select(
+            choices=BOOLEAN_WITH_BLANK_CHOICES
+        )
+    )
+    merge_links = forms.NullBooleanField(
+        required=False,
+        label=_('Merge Parallel Links'),
+        widget=forms.Select(
+            choices=BOOLEAN_WITH_BLANK_CHOICES
+        )
+    )
@@ -0,0 +1,330 @@
+"""Compact topology graph for NextBox-UI Plugin
+
+Topologies are built as lists of slotted node and edge records
+referring to Devices, Cables and Interfaces by integer ID.
+Repeated strings, such as Device roles, models, tags and
+interface names, are interned and shared by all records.
+Virtual chassis members and parallel edges can be collapsed
+into single records. Records are expanded to the topoSphere
+JSON schema only when the topology is serialized.
+"""
+from django.urls import reverse
+from functools import lru_cache
+import sys
+
+
+def intern(value):
+    """Interns strings, any other value is returned as is."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+@lru_cache(maxsize=None)
+def get_url_pattern(viewname):
+    """Object view URL with a '{pk}' placeholder, resolved once."""
+    return reverse(viewname, kwargs={'pk': 0}).replace('/0/', '/{pk}/')
+
+
+class TopologyNode:
+    """Device node record."""
+    __slots__ = (
+        'device_id', 'name', 'layer', 'icon_type', 'is_passive', 'is_unconnected',
+        'tags', 'model', 'serial', 'role_name', 'primary_ip',
+    )
+
+    def __init__(self, device_id, name, layer, icon_type, is_passive, is_unconnected,
+                 tags, model, serial, role_name, primary_ip):
+        self.device_id = device_id
+        self.name = name
+        self.layer = layer
+        self.icon_type = intern(icon_type)
+        self.is_passive = is_passive
+        self.is_unconnected = is_unconnected
+        self.tags = tuple(intern(tag) for tag in tags)
+        self.model = intern(model)
+        self.serial = serial
+        self.role_name = intern(role_name)
+        self.primary_ip = primary_ip
+
+    def as_dict(self):
+        return {
+            'id': f'device-{self.device_id}',
+            'name': self.name,
+            'label': self.name,
+            'layer': self.layer,
+            'iconName': self.icon_type,
+            'isPassive': self.is_passive,
+            'isUnconnected': self.is_unconnected,
+            'tags': list(self.tags),
+            'customAttributes': {
+                'name': self.name,
+                'model': self.model,
+                'serialNumber': self.serial,
+                'deviceRole': self.role_name,
+                'primaryIP': self.primary_ip,
+                'dcimDeviceLink': get_url_pattern('dcim:device').format(pk=self.device_id),
+            }
+        }
+
+
+class TopologyEdge:
+    """Base edge record between two Devices' Interfaces or ports."""
+    __slots__ = (
+        'source_id', 'target_id', 'source_interface', 'source_label',
+        'target_interface', 'target_label', 'source_name', 'target_name',
+    )
+
+    def __init__(self, source_id, target_id, source_interface, source_label,
+                 target_interface, target_label, source_name, target_name):
+        self.source_id = source_id
+        self.target_id = target_id
+        self.source_interface = intern(source_interface)
+        self.source_label = intern(source_label)
+        self.target_interface = intern(target_interface)
+        self.target_label = intern(target_label)
+        self.source_name = source_name
+        self.target_name = target_name
+
+    def get_interface_attributes(self):
+        return {
+            "sourceInterface": self.source_interface,
+            "sourceInterfaceLabel": {'text': self.source_label},
+            "targetInterface": self.target_interface,
+            "targetInterfaceLabel": {'text': self.target_label},
+        }
+
+
+class CableEdge(TopologyEdge):
+    """
+    Edge record of a single Cable. Cables split between several
+    Devices on their A side have an edge per Device.
+    """
+    __slots__ = ('cable_id', 'is_split')
+
+    def __init__(self, cable_id, is_split, *args):
+        super().__init__(*args)
+        self.cable_id = cable_id
+        self.is_split = is_split
+
+    def get_edge_id(self):
+        if self.is_split:
+            return f"cable-{self.cable_id}-device-{self.source_id}"
+        return f"cable-{self.cable_id}"
+
+    def as_dict(self):
+        return {
+            "id": self.get_edge_id(),
+            "label": f"Cable {self.cable_id}",
+            "source": f"device-{self.source_id}",
+            "target": f"device-{self.target_id}",
+            **self.get_interface_attributes(),
+            "customAttributes": {
+                "name": f"Cable {self.cable_id}",
+                "dcimCableURL": get_url_pattern('dcim:cable').format(pk=self.cable_id),
+                "source": self.source_name,
+                "target": self.target_name,
+            }
+        }
+
+
+class MultiCableEdge(TopologyEdge):
+    """Logical edge record of a cable path between two Interfaces."""
+    __slots__ = ('source_interface_id', 'target_interface_id')
+
+    def __init__(self, source_interface_id, target_interface_id, *args):
+        super().__init__(*args)
+        self.source_interface_id = source_interface_id
+        self.target_interface_id = target_interface_id
+
+    def as_dict(self):
+        # Logical edge IDs do not depend on the end the path was traced from
+        interface_ids = sorted((self.source_interface_id, self.target_interface_id))
+        return {
+            "id": f"path-{interface_ids[0]}-{interface_ids[1]}",
+            "source": f"device-{self.source_id}",
+            "target": f"device-{self.target_id}",
+            **self.get_interface_attributes(),
+            "isLogicalMultiCable": True,
+            "customAttributes": {
+                "name": "Multi-Cable Connection",
+                "dcimCableURL": f"/dcim/interfaces/{self.source_interface_id}/trace/",
+                "source": self.source_name,
+                "target": self.target_name,
+            }
+        }
+
+
+class TopologyGraph:
+    """Node and edge records of a topology."""
+    __slots__ = ('nodes', 'edges')
+
+    def __init__(self):
+        self.nodes = []
+        self.edges = []
+
+    def as_dict(self):
+        """Expands the records to the topoSphere topology data schema."""
+        return {
+            'nodes': [node.as_dict() for node in self.nodes],
+            'edges': [edge.as_dict() for edge in self.edges],
+        }
+
+
+class VirtualChassisNode:
+    """Node record of the members of a virtual chassis collapsed into one node."""
+    __slots__ = ('virtual_chassis_id', 'name', 'members')
+
+    def __init__(self, virtual_chassis_id, name):
+        self.virtual_chassis_id = virtual_chassis_id
+        self.name = name
+        # TopologyNode records, the master first
+        self.members = []
+
+    @property
+    def node_id(self):
+        return f'virtualchassis-{self.virtual_chassis_id}'
+
+    def add_member(self, node, is_master):
+        if is_master:
+            self.members.insert(0, node)
+        else:
+            self.members.append(node)
+
+    def as_dict(self):
+        master = self.members[0]
+        return {
+            'id': self.node_id,
+            'name': self.name,
+            'label': f'{self.name} ({len(self.members)})',
+            'layer': min(member.layer for member in self.members),
+            'iconName': master.icon_type,
+            'isPassive': all(member.is_passive for member in self.members),
+            'isUnconnected': all(member.is_unconnected for member in self.members),
+            'tags': sorted({tag for member in self.members for tag in member.tags}),
+            'customAttributes': {
+                'name': self.name,
+                'model': master.model,
+                'serialNumber': master.serial,
+                'deviceRole': master.role_name,
+                'primaryIP': master.primary_ip,
+                'dcimDeviceLink': get_url_pattern('dcim:virtualchassis').format(pk=self.virtual_chassis_id),
+                'members': [member.name for member in self.members],
+            }
+        }
+
+
+class CollapsedEdge:
+    """Edge record with its ends moved to collapsed nodes."""
+    __slots__ = ('edge', 'source', 'target')
+
+    def __init__(self, edge, source, target):
+        # Ends are (node ID, name) pairs
+        self.edge = edge
+        self.source = source
+        self.target = target
+
+    def as_dict(self):
+        edge_dict = self.edge.as_dict()
+        edge_dict['source'], edge_dict['customAttributes']['source'] = self.source
+        edge_dict['target'], edge_dict['customAttributes']['target'] = self.target
+        return edge_dict
+
+
+class MergedEdge:
+    """Weighted edge record of parallel edges between two nodes."""
+    __slots__ = ('source', 'target', 'members')
+
+    def __init__(self, source, target):
+        self.source = source
+        self.target = target
+        # (edge record, reversed) pairs
+        self.members = []
+
+    def as_dict(self):
+        count = len(self.members)
+        label = f'{count} Links'
+        members = []
+        for edge, is_reversed in self.members:
+            edge_dict = edge.as_dict()
+            interfaces = (edge_dict['sourceInterface'], edge_dict['targetInterface'])
+            source_interface, target_interface = interfaces[::-1] if is_reversed else interfaces
+            members.append({
+                'id': edge_dict['id'],
+                'name': edge_dict['customAttributes']['name'],
+                'dcimCableURL': edge_dict['customAttributes']['dcimCableURL'],
+                'sourceInterface': source_interface,
+                'targetInterface': target_interface,
+            })
+        # Merged edge IDs do not depend on the orientation of the first edge
+        node_ids = sorted((self.source[0], self.target[0]))
+        return {
+            "id": f"merged-{node_ids[0]}-{node_ids[1]}",
+            "label": label,
+            "source": self.source[0],
+            "target": self.target[0],
+            "weight": count,
+            "isMerged": True,
+            "customAttributes": {
+                "name": label,
+                "linkCount": count,
+                "source": self.source[1],
+                "target": self.target[1],
+                "members": members,
+            }
+        }
+
+
+def collapse_topology_graph(topology_graph, virtual_chassis, merge_links=False):
+    """
+    Returns the reduced TopologyGraph of the records.
+    Members of the virtual chassis, given as
+    {device_id: (virtual_chassis_id, name, is_master)},
+    are collapsed into one node and edges between them are dropped.
+    With merge_links, parallel edges between the same two nodes,
+    such as LAG member links, are merged into one weighted edge.
+    """
+    collapsed_graph = TopologyGraph()
+    chassis_nodes = {}
+    for node in topology_graph.nodes:
+        if node.device_id not in virtual_chassis:
+            collapsed_graph.nodes.append(node)
+            continue
+        virtual_chassis_id, name, is_master = virtual_chassis[node.device_id]
+        if virtual_chassis_id not in chassis_nodes:
+            chassis_nodes[virtual_chassis_id] = VirtualChassisNode(virtual_chassis_id, name)
+            collapsed_graph.nodes.append(chassis_nodes[virtual_chassis_id])
+        chassis_nodes[virtual_chassis_id].add_member(node, is_master)
+
+    def get_end(device_id, name):
+        if device_id in virtual_chassis:
+            virtual_chassis_id, name = virtual_chassis[device_id][:2]
+            return f'virtualchassis-{virtual_chassis_id}', name
+        return f'device-{device_id}', name
+
+    def get_edge(edge, source, target):
+        # Edges between Devices that are not collapsed are kept as they are
+        if edge.source_id in virtual_chassis or edge.target_id in virtual_chassis:
+            return CollapsedEdge(edge, source, target)
+        return edge
+
+    edges = []
+    merged_edges = {}
+    for edge in topology_graph.edges:
+        source = get_end(edge.source_id, edge.source_name)
+        target = get_end(edge.target_id, edge.target_name)
+        if edge.source_id in virtual_chassis and source[0] == target[0]:
+            # Stacking links within a virtual chassis
+            continue
+        if not merge_links:
+            edges.append(get_edge(edge, source, target))
+            continue
+        key = frozenset((source[0], target[0]))
+        if key not in merged_edges:
+            merged_edges[key] = MergedEdge(source, target)
+            edges.append(merged_edges[key])
+        merged_edges[key].members.append((edge, source[0] != merged_edges[key].source[0]))
+
+    for edge in edges:
+        if isinstance(edge, MergedEdge) and len(edge.members) == 1:
+            edge = get_edge(edge.members[0][0], edge.source, edge.target)
+        collapsed_graph.edges.append(edge)
+    return collapsed_graph
@@ -0,0 +1,202 @@
+"""Topology build instrumentation for NextBox-UI Plugin
+
+A TopologyProfile collects per-phase timers, SQL query counts
+and result statistics while a topology is being built.
+Collected data is exposed as a Server-Timing header value
+and passed to the optional METRICS_HOOK callable.
+Profiles may be shared with worker threads of parallel builds,
+phases then add up the time spent in every thread.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from django.db import connection
+from django.utils.module_loading import import_string
+from .plugin_settings import get_plugin_settings
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger('nextbox_ui_plugin.instrumentation')
+
+PLUGIN_SETTINGS = get_plugin_settings()
+
+_current_profile = ContextVar('nextbox_ui_plugin_topology_profile', default=None)
+
+
+class TopologyProfile:
+    """
+    Per-phase timings (in milliseconds) and SQL query counts,
+    plus named counters such as nodes, edges, traces and payload size.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        # SQL query counts by thread
+        self.thread_queries = {}
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    @property
+    def queries(self):
+        return sum(self.thread_queries.values())
+
+    def count_query(self, execute, sql, params, many, context):
+        thread_id = threading.get_ident()
+        with self.lock:
+            self.thread_queries[thread_id] = self.thread_queries.get(thread_id, 0) + 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def phase(self, name):
+        thread_id = threading.get_ident()
+        start = time.perf_counter()
+        start_queries = self.thread_queries.get(thread_id, 0)
+        try:
+            yield
+        finally:
+            # Repeated phases accumulate, e.g. across streamed chunks
+            with self.lock:
+                duration, queries = self.phases.get(name, (0.0, 0))
+                self.phases[name] = (
+                    duration + (time.perf_counter() - start) * 1000,
+                    queries + self.thread_queries.get(thread_id, 0) - start_queries,
+                )
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self):
+        return {
+            'total': self.total,
+            'queries': self.queries,
+            'phases': {
+                name: {'duration': duration, 'queries': queries}
+                for name, (duration, queries) in self.phases.items()
+            },
+            'counters': dict(self.counters),
+        }
+
+    def get_server_timing(self):
+        metrics = [f'total;dur={self.total:.1f};desc="{self.queries} queries"']
+        for name, (duration, queries) in self.phases.items():
+            metrics.append(f'{name};dur={duration:.1f};desc="{queries} queries"')
+        for name, value in self.counters.items():
+            metrics.append(f'{name};desc="{value}"')
+        return ', '.join(metrics)
+
+
+@contextmanager
+def profile_topology():
+    """
+    Activates a TopologyProfile for the enclosed block.
+    Phases and counters recorded anywhere within the block
+    are collected into it. Emits the profile to METRICS_HOOK on exit.
+    """
+    profile = TopologyProfile()
+    token = _current_profile.set(profile)
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(profile.count_query):
+            yield profile
+    finally:
+        profile.total = (time.perf_counter() - start) * 1000
+        _current_profile.reset(token)
+    emit_metrics(profile)
+
+
+@contextmanager
+def worker_queries():
+    """
+    Counts SQL queries of the current worker thread's
+    database connection into the active profile, if any.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+    else:
+        with connection.execute_wrapper(profile.count_query):
+            yield
+
+
+@contextmanager
+def phase(name):
+    """Times the enclosed block as a phase of the active profile, if any."""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+    else:
+        with profile.phase(name):
+            yield
+
+
+def count(name, value=1):
+    """Increments a counter of the active profile, if any."""
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.count(name, value)
+
+
+@lru_cache(maxsize=None)
+def get_metrics_hook():
+    # Dotted path to a callable receiving the profile data dict
+    # of every instrumented topology build.
+    metrics_hook = PLUGIN_SETTINGS.metrics_hook
+    if not metrics_hook:
+        return None
+    if callable(metrics_hook):
+        return metrics_hook
+    return import_string(metrics_hook)
+
+
+def emit_metrics(profile):
+    metrics_hook = get_metrics_hook()
+    if metrics_hook is None:
+        return
+    try:
+        metrics_hook(profile.as_dict())
+    except Exception:
+        logger.exception('Topology metrics hook failed')
+
+
+@lru_cache(maxsize=None)
+def get_prometheus_metrics():
+    from prometheus_client import Counter, Histogram
+    return {
+        'duration': Histogram(
+            'nextbox_ui_topology_build_seconds',
+            'Topology build duration',
+        ),
+        'phase_duration': Histogram(
+            'nextbox_ui_topology_phase_seconds',
+            'Topology build phase duration',
+            ['phase'],
+        ),
+        'queries': Histogram(
+            'nextbox_ui_topology_queries',
+            'SQL queries per topology build',
+            buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000),
+        ),
+        'objects': Counter(
+            'nextbox_ui_topology_objects',
+            'Topology objects built',
+            ['counter'],
+        ),
+    }
+
+
+def prometheus_metrics_hook(profile_data):
+    """
+    Metrics hook exporting topology build metrics through prometheus_client.
+    Enable with 'METRICS_HOOK': 'nextbox_ui_plugin.instrumentation.prometheus_metrics_hook'.
+    """
+    metrics = get_prometheus_metrics()
+    metrics['duration'].observe(profile_data['total'] / 1000)
+    metrics['queries'].observe(profile_data['queries'])
+    for name, phase_data in profile_data['phases'].items():
+        metrics['phase_duration'].labels(name).observe(phase_data['duration'] / 1000)
+    for name, value in profile_data['counters'].items():
+        metrics['objects'].labels(name).inc(value)
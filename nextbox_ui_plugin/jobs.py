@@ -0,0 +1,168 @@
+"""Background topology precomputation for NextBox-UI Plugin
+
+Topologies of Sites with at least TOPOLOGY_PRECOMPUTE_MIN_DEVICES
+Devices are computed by NetBox background jobs every
+TOPOLOGY_PRECOMPUTE_INTERVAL minutes and shortly after cabling
+changes in precomputed Sites. They are kept in the NetBox cache and
+served to the single-Site topology requests of SiteTopologyView, so
+large Sites are shown without waiting for the topology build. Stale
+topologies are served along with their computation time until the
+refresh job has run. Topologies are not restricted by object
+permissions, so precomputed topologies are shared by all users.
+Jobs are run by the NetBox RQ worker (manage.py rqworker).
+"""
+from datetime import timedelta
+from functools import lru_cache
+from core.choices import JobStatusChoices
+from django.db import transaction
+from django.db.models import Count
+from django.http import QueryDict
+from django.utils import timezone
+from dcim.models import Device, Site
+from netbox.jobs import JobRunner
+from . import cache
+from .plugin_settings import get_plugin_settings
+from .views import build_request_topology, get_request_site_id, get_topology_params
+import logging
+
+try:
+    from netbox.jobs import system_job
+except ImportError:
+    # NetBox 4.1, the precompute job is scheduled on first use
+    system_job = None
+
+
+logger = logging.getLogger('nextbox_ui_plugin.jobs')
+
+PLUGIN_SETTINGS = get_plugin_settings()
+
+# Site topologies are recomputed this long after a cabling change,
+# later changes within the delay are covered by the same job
+CHANGE_DELAY = timedelta(minutes=1)
+
+
+def get_site_request_params(site_id):
+    # Request parameters of SiteTopologyView
+    request_params = QueryDict(mutable=True)
+    request_params['site_id'] = str(site_id)
+    return request_params
+
+
+def precompute_site_topology(site_id):
+    """Computes the Site topology and stores it as precomputed."""
+    # Generations are read before building so that changes
+    # made while the topology is being built mark it stale
+    generation_state = cache.get_site_generation_state(site_id)
+    queryset, params = get_topology_params(get_site_request_params(site_id))
+    topology_dict = build_request_topology(queryset, params)
+    cache.set_precomputed_topology(site_id, topology_dict, timezone.now(), generation_state)
+    return topology_dict
+
+
+class SiteTopologyJob(JobRunner):
+    """Precomputes the topology of the Site the job is bound to."""
+
+    class Meta:
+        name = 'Site topology precomputation'
+
+    def run(self, *args, **kwargs):
+        topology_dict = precompute_site_topology(self.job.object_id)
+        self.job.data = {
+            'nodes': len(topology_dict['nodes']),
+            'edges': len(topology_dict['edges']),
+        }
+
+
+class TopologyPrecomputeJob(JobRunner):
+    """
+    Precomputes the topologies of all Sites with at least
+    TOPOLOGY_PRECOMPUTE_MIN_DEVICES Devices, unless they are up to date.
+    """
+
+    class Meta:
+        name = 'Topology precomputation'
+
+    def run(self, *args, **kwargs):
+        site_ids = Device.objects.order_by().values_list('site_id').annotate(
+            devices=Count('pk')
+        ).filter(devices__gte=PLUGIN_SETTINGS.topology_precompute_min_devices).values_list('site_id', flat=True)
+        computed = []
+        for site_id in site_ids:
+            precomputed = cache.get_precomputed_topology(site_id)
+            if precomputed is not None and not precomputed['stale']:
+                continue
+            precompute_site_topology(site_id)
+            computed.append(site_id)
+        logger.info('Precomputed topologies of %d Sites', len(computed))
+        self.job.data = {'sites': computed}
+
+
+if system_job is not None and PLUGIN_SETTINGS.topology_precompute_interval:
+    TopologyPrecomputeJob = system_job(interval=PLUGIN_SETTINGS.topology_precompute_interval)(TopologyPrecomputeJob)
+
+
+@lru_cache(maxsize=None)
+def schedule_topology_precompute():
+    """Schedules the recurring precompute job on NetBox versions with no system jobs."""
+    if system_job is None and PLUGIN_SETTINGS.topology_precompute_interval:
+        TopologyPrecomputeJob.enqueue_once(interval=PLUGIN_SETTINGS.topology_precompute_interval)
+
+
+def enqueue_site_topologies(site_ids, delay=CHANGE_DELAY):
+    """
+    Schedules precompute jobs for the given Sites, unless one
+    was scheduled within CHANGE_DELAY. Returns the scheduled jobs.
+    """
+    jobs = []
+    for site in Site.objects.filter(pk__in=site_ids):
+        if cache.claim_precompute(site.pk, timeout=CHANGE_DELAY.total_seconds()):
+            schedule_at = timezone.now() + delay if delay else None
+            jobs.append(SiteTopologyJob.enqueue(instance=site, schedule_at=schedule_at))
+    return jobs
+
+
+def schedule_site_topologies(site_ids):
+    """
+    Schedules precompute jobs for those of the given Sites
+    that have precomputed topologies, once the current
+    transaction is committed. Called on cabling changes.
+    """
+    if not PLUGIN_SETTINGS.topology_precompute_interval:
+        return
+    site_ids = {site_id for site_id in site_ids if site_id is not None}
+    if not site_ids:
+        return
+    transaction.on_commit(
+        lambda: enqueue_site_topologies(cache.get_precomputed_site_ids(site_ids))
+    )
+
+
+def refresh_site_topology(site, user=None):
+    """
+    Enqueues an immediate precompute job for the Site,
+    unless one is already queued or running. Returns the job.
+    """
+    job = SiteTopologyJob.get_jobs(site).filter(
+        status__in=JobStatusChoices.ENQUEUED_STATE_CHOICES
+    ).exclude(scheduled__gt=timezone.now()).first()
+    if job is None:
+        job = SiteTopologyJob.enqueue(instance=site, user=user)
+    return job
+
+
+def get_request_precomputed_topology(request_params):
+    """
+    Returns the precomputed topology for SiteTopologyView requests,
+    or None. Stale topologies are returned as well,
+    a refresh job is scheduled for them.
+    """
+    if not PLUGIN_SETTINGS.topology_precompute_interval:
+        return None
+    site_id = get_request_site_id(request_params)
+    if site_id is None:
+        return None
+    schedule_topology_precompute()
+    precomputed = cache.get_precomputed_topology(site_id)
+    if precomputed is not None and precomputed['stale']:
+        enqueue_site_topologies({site_id}, delay=timedelta(0))
+    return precomputed
@@ -0,0 +1,116 @@
+"""Server-side topology layout for NextBox-UI Plugin
+
+Computes a layered (Sugiyama-style) layout of topology nodes.
+Layers follow the Device role sort order, the node order within
+every layer is refined by barycenter sweeps to reduce edge
+crossings, and coordinates are assigned row by row.
+Computations are vectorized with NumPy, an optional dependency
+imported on first use.
+"""
+from functools import lru_cache
+from . import instrumentation
+from .plugin_settings import get_plugin_settings, is_installed
+
+
+PLUGIN_SETTINGS = get_plugin_settings()
+
+NODE_SPACING = 150
+ROW_SPACING = 150
+LAYER_SPACING = 300
+# Wider layers are wrapped into multiple rows
+MAX_ROW_NODES = 50
+# Number of alternating downward and upward barycenter sweeps
+CROSSING_SWEEPS = 8
+
+
+def numpy_available():
+    return is_installed('numpy')
+
+
+@lru_cache(maxsize=None)
+def get_numpy():
+    import numpy
+    return numpy
+
+
+def get_layer_positions(ranks, keys, tiebreak):
+    """
+    Orders nodes within their layer by keys and returns
+    the resulting position of every node in its layer.
+    """
+    np = get_numpy()
+    order = np.lexsort((tiebreak, keys, ranks))
+    sorted_ranks = ranks[order]
+    layer_starts = np.searchsorted(sorted_ranks, sorted_ranks, side='left')
+    positions = np.empty(len(ranks), dtype=float)
+    positions[order] = np.arange(len(ranks)) - layer_starts
+    return positions
+
+
+def compute_layered_layout(nodes, edges):
+    """
+    Returns x and y coordinate arrays for the given topology nodes,
+    in node order. Edges between nodes of the same layer
+    do not take part in the crossing reduction.
+    """
+    np = get_numpy()
+    node_count = len(nodes)
+    if not node_count:
+        return np.zeros(0), np.zeros(0)
+    node_index = {node['id']: i for i, node in enumerate(nodes)}
+    ranks = np.unique(np.array([node['layer'] for node in nodes]), return_inverse=True)[1].reshape(-1)
+    layer_count = int(ranks.max()) + 1
+
+    edge_ends = np.array([
+        (node_index[edge['source']], node_index[edge['target']])
+        for edge in edges
+        if edge['source'] in node_index and edge['target'] in node_index
+    ], dtype=int).reshape(-1, 2)
+    edge_ends = edge_ends[ranks[edge_ends[:, 0]] != ranks[edge_ends[:, 1]]]
+    # Orient edges from upper to lower layers
+    swap = ranks[edge_ends[:, 0]] > ranks[edge_ends[:, 1]]
+    upper = np.where(swap, edge_ends[:, 1], edge_ends[:, 0])
+    lower = np.where(swap, edge_ends[:, 0], edge_ends[:, 1])
+
+    # Initial order within layers follows the node order
+    positions = get_layer_positions(ranks, np.arange(node_count, dtype=float), np.zeros(node_count))
+    for sweep in range(CROSSING_SWEEPS):
+        downward = sweep % 2 == 0
+        # Downward sweeps order every layer by the barycenter of
+        # its neighbors in the layers above, upward sweeps below.
+        layer_nodes, neighbors = (lower, upper) if downward else (upper, lower)
+        layers = range(1, layer_count) if downward else range(layer_count - 2, -1, -1)
+        for layer in layers:
+            in_layer = ranks[layer_nodes] == layer
+            if not in_layer.any():
+                continue
+            weights = np.bincount(layer_nodes[in_layer], weights=positions[neighbors[in_layer]], minlength=node_count)
+            counts = np.bincount(layer_nodes[in_layer], minlength=node_count)
+            keys = np.where(counts > 0, weights / np.maximum(counts, 1), positions)
+            positions = get_layer_positions(ranks, keys, positions)
+
+    # Coordinate assignment, every row is centered
+    layer_sizes = np.bincount(ranks, minlength=layer_count)
+    layer_rows = np.maximum(np.ceil(layer_sizes / MAX_ROW_NODES), 1)
+    layer_offsets = np.concatenate(([0], np.cumsum(layer_rows)[:-1])) * ROW_SPACING
+    layer_offsets += np.arange(layer_count) * (LAYER_SPACING - ROW_SPACING)
+    rows = positions // MAX_ROW_NODES
+    columns = positions % MAX_ROW_NODES
+    row_sizes = np.minimum(MAX_ROW_NODES, layer_sizes[ranks] - rows * MAX_ROW_NODES)
+    x = (columns - (row_sizes - 1) / 2) * NODE_SPACING
+    y = layer_offsets[ranks] + rows * ROW_SPACING
+    return x, y
+
+
+def apply_layout(topology_dict):
+    """
+    Adds server-side computed coordinates to the topology nodes
+    if SERVER_LAYOUT is enabled.
+    """
+    if not PLUGIN_SETTINGS.server_layout or not topology_dict['nodes']:
+        return topology_dict
+    with instrumentation.phase('layout'):
+        x, y = compute_layered_layout(topology_dict['nodes'], topology_dict['edges'])
+        for node, node_x, node_y in zip(topology_dict['nodes'], x.tolist(), y.tolist()):
+            node['coord'] = {'x': node_x, 'y': node_y}
+    return topology_dict
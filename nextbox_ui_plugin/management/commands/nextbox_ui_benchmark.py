@@ -0,0 +1,136 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from nextbox_ui_plugin import benchmark
+from nextbox_ui_plugin import NextBoxUIConfig
+from nextbox_ui_plugin.plugin_settings import is_installed
+import json
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark topology builds against synthetic topologies. "
+        "Fixtures are created in a transaction which is rolled back afterwards, "
+        "or committed and deleted afterwards when parallel builds or browsers are measured. "
+        "Results are emitted as JSON so that runs can be compared across commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[100, 1000],
+            help="Device counts of the generated topologies (e.g. 100 1000 10000)",
+        )
+        parser.add_argument(
+            '--shapes', nargs='+', choices=benchmark.SHAPES, default=list(benchmark.SHAPES),
+            help="Topology shapes to generate",
+        )
+        parser.add_argument(
+            '--patch-panels', action='store_true',
+            help="Also benchmark topologies with every uplink patched through front/rear port patch panels",
+        )
+        parser.add_argument(
+            '--circuits', action='store_true',
+            help="Add circuit terminations to the generated topologies",
+        )
+        parser.add_argument(
+            '--power-feeds', action='store_true',
+            help="Add power feed terminations to the generated topologies",
+        )
+        parser.add_argument(
+            '--sites', type=int, default=1,
+            help="Number of Sites the Devices of every topology are split between",
+        )
+        parser.add_argument(
+            '--workers', nargs='+', type=int, default=[],
+            help=(
+                "Also benchmark parallel topology builds with these worker counts (e.g. 1 2 4 8). "
+                "Fixtures are committed to the database, since worker threads use their own connections"
+            ),
+        )
+        parser.add_argument(
+            '--browser-url',
+            help=(
+                "Also measure time to first frame, layout time and main thread blocking of the topology view "
+                "in headless Chromium, loaded from the NetBox instance at this URL. Requires Playwright. "
+                "Fixtures are committed to the database, so that NetBox can serve them"
+            ),
+        )
+        parser.add_argument(
+            '--no-memory', action='store_true',
+            help="Skip peak memory measurements",
+        )
+        parser.add_argument(
+            '--import-time', action='store_true',
+            help="Also measure plugin module import times with 'python -X importtime'",
+        )
+        parser.add_argument(
+            '--label', default='',
+            help="Label stored with the results, e.g. a commit hash",
+        )
+        parser.add_argument(
+            '--output',
+            help="Write JSON results to this file instead of stdout",
+        )
+
+    def run_benchmarks(self, options, delete_fixtures=False):
+        results = []
+        patch_panel_options = (False, True) if options['patch_panels'] else (False,)
+        user = get_user_model().objects.create_superuser(
+            username='nextbox-ui-benchmark', email='', password=None
+        )
+        try:
+            for shape in options['shapes']:
+                for size in options['sizes']:
+                    for patch_panels in patch_panel_options:
+                        fixture = benchmark.TopologyFixture(
+                            shape, size,
+                            patch_panels=patch_panels,
+                            circuits=options['circuits'],
+                            power_feeds=options['power_feeds'],
+                            sites=options['sites'],
+                        )
+                        self.stderr.write(f"Generating {fixture.name}...")
+                        try:
+                            fixture.create()
+                            self.stderr.write(f"Benchmarking {fixture.name}...")
+                            results.extend(benchmark.run_fixture_benchmarks(
+                                fixture, user,
+                                track_memory=not options['no_memory'],
+                                workers=options['workers'],
+                                browser_url=options['browser_url'],
+                            ))
+                        finally:
+                            if delete_fixtures:
+                                self.stderr.write(f"Deleting {fixture.name}...")
+                                fixture.delete()
+        finally:
+            if delete_fixtures:
+                user.delete()
+        return results
+
+    def handle(self, *args, **options):
+        if options['browser_url'] and not is_installed('playwright'):
+            raise CommandError("--browser-url requires Playwright (pip install playwright && playwright install chromium)")
+        if options['workers'] or options['browser_url']:
+            # Worker threads and NetBox only see committed fixtures
+            results = self.run_benchmarks(options, delete_fixtures=True)
+        else:
+            with transaction.atomic():
+                results = self.run_benchmarks(options)
+                transaction.set_rollback(True)
+        if options['import_time']:
+            self.stderr.write("Measuring import time...")
+            results.append(benchmark.measure_import_time())
+
+        output = json.dumps({
+            'label': options['label'],
+            'plugin_version': NextBoxUIConfig.version,
+            'timestamp': timezone.now().isoformat(),
+            'results': results,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output)
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from nextbox_ui_plugin import search_indexes
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the trigram indexes used by the topology filter search, "
+        "regardless of the TRIGRAM_SEARCH_INDEXES setting. "
+        "Requires PostgreSQL with the pg_trgm extension available."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--drop', action='store_true',
+            help="Drop the trigram indexes instead",
+        )
+
+    def handle(self, *args, **options):
+        if options['drop']:
+            search_indexes.drop_trigram_indexes(connection)
+            self.stdout.write(self.style.SUCCESS("Trigram search indexes dropped"))
+            return
+        if not search_indexes.create_trigram_indexes(connection):
+            raise CommandError("Trigram search indexes require PostgreSQL with the pg_trgm extension available")
+        self.stdout.write(self.style.SUCCESS(
+            f"Trigram search indexes created: {', '.join(search_indexes.TRIGRAM_INDEXES)}"
+        ))
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+from nextbox_ui_plugin import search_indexes
+from nextbox_ui_plugin.plugin_settings import get_plugin_settings
+
+# Optional trigram indexes for the icontains lookups of the topology
+# filter search. Created only with TRIGRAM_SEARCH_INDEXES enabled
+# in PLUGINS_CONFIG, otherwise by the nextbox_ui_trigram_indexes command.
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if get_plugin_settings().trigram_search_indexes:
+        search_indexes.create_trigram_indexes(schema_editor.connection)
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    search_indexes.drop_trigram_indexes(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dcim', '0191_module_bay_rebuild'),
+        ('nextbox_ui_plugin', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -1,12 +1,10 @@
 from django.db import models
 from utilities.querysets import RestrictedQuerySet
-from django.conf import settings
 from packaging import version
-
-NETBOX_CURRENT_VERSION = version.parse(settings.VERSION)
+from .plugin_settings import get_plugin_settings
 
 def get_user_model():
-    if NETBOX_CURRENT_VERSION >= version.parse("4.0.0"):
+    if get_plugin_settings().netbox_version >= version.parse("4.0.0"):
         return 'users.User'
     else:
         return 'users.NetBoxUser'
@@ -0,0 +1,230 @@
+"""Plugin settings for NextBox-UI Plugin
+
+PLUGINS_CONFIG['nextbox_ui_plugin'] is parsed and validated once,
+on first use, into a frozen PluginSettings object shared by all
+plugin modules. The NetBox version is resolved at the same time.
+Settings relying on optional packages only check that the package
+is installed, it is imported when it is first needed.
+"""
+from dataclasses import dataclass
+from django.conf import settings
+from functools import lru_cache
+from importlib.util import find_spec
+from packaging import version
+from types import MappingProxyType
+import logging
+
+
+logger = logging.getLogger('nextbox_ui_plugin.settings')
+
+# Topology layers would be sorted
+# in the same descending order
+# as in the tuple below.
+# It is expected that Device Role
+# slugs in Netbox exactly match
+# values listed below.
+# Update mapping to whatever you use.
+DEFAULT_LAYERS_SORT_ORDER = (
+    'undefined',
+    'outside',
+    'border',
+    'edge',
+    'edge-switch',
+    'edge-router',
+    'core',
+    'core-router',
+    'core-switch',
+    'distribution',
+    'distribution-router',
+    'distribution-switch',
+    'leaf',
+    'spine',
+    'access',
+    'access-switch',
+)
+
+
+DEFAULT_ICON_MODEL_MAP = {
+    'CSR1000V': 'network.router',
+    'Nexus': 'network.switch',
+    'IOSXRv': 'network.router',
+    'IOSv': 'network.switch',
+    '2901': 'network.router',
+    '2911': 'network.router',
+    '2921': 'network.router',
+    '2951': 'network.router',
+    '4321': 'network.router',
+    '4331': 'network.router',
+    '4351': 'network.router',
+    '4421': 'network.router',
+    '4431': 'network.router',
+    '4451': 'network.router',
+    '2960': 'network.switch',
+    '3750': 'network.switch',
+    '3850': 'network.switch',
+    'ASA': 'network.firewall',
+}
+
+
+DEFAULT_ICON_ROLE_MAP = {
+    'border': 'network.router',
+    'edge-switch': 'network.switch',
+    'edge-router': 'network.router',
+    'core-router': 'network.router',
+    'core-switch': 'network.switch',
+    'distribution': 'network.switch',
+    'distribution-router': 'network.router',
+    'distribution-switch': 'network.switch',
+    'leaf': 'network.switch',
+    'spine': 'network.switch',
+    'access': 'network.switch',
+    'access-switch': 'network.switch',
+}
+
+INITIAL_LAYOUTS = ('layered', 'forceDirected')
+# Legacy INITIAL_LAYOUT options
+LEGACY_INITIAL_LAYOUTS = {
+    'auto': 'forceDirected',
+    'vertical': 'layered',
+    'horizontal': 'layered',
+}
+
+TOPOLOGY_ENCODINGS = ('json', 'compact', 'msgpack')
+
+
+@dataclass(frozen=True)
+class PluginSettings:
+    netbox_version: version.Version
+    # Device role field name, 'device_role' before NetBox 4.0
+    device_role_field: str
+    layers_sort_order: tuple
+    icon_model_map: MappingProxyType
+    icon_role_map: MappingProxyType
+    # Whether Devices with no connections are displayed by default
+    display_unconnected: bool
+    # Whether passive devices, e.g. patch panels or PDUs, are displayed by default
+    display_passive_devices: bool
+    undisplayed_device_role_slugs: tuple
+    undisplayed_device_tags: tuple
+    select_layers_list_include_device_tags: tuple
+    select_layers_list_exclude_device_tags: tuple
+    initial_layout: str
+    # Client-side force-directed layout iterations, scaled down for larger topologies
+    layout_iterations: int
+    layout_min_iterations: int
+    # Topologies with at least this many nodes are laid out in a Web Worker, 0 disables it
+    layout_worker_min_nodes: int
+    topology_streaming: bool
+    topology_debug: bool
+    streaming_chunk_size: int
+    # Worker threads of parallel topology builds, 1 builds sequentially
+    topology_build_workers: int
+    topology_cache_timeout: int
+    topology_snapshot_timeout: int
+    topology_refresh_interval: int
+    topology_push: bool
+    topology_push_debounce: float
+    # Concurrent Server-Sent Event streams, 0 for no limit
+    topology_push_max_streams: int
+    aggregation_threshold: int
+    # Whether virtual chassis are shown as single nodes by default
+    collapse_virtual_chassis: bool
+    # Whether parallel links between two nodes are shown as one weighted edge by default
+    merge_parallel_links: bool
+    # Bounds of neighborhood topologies
+    neighborhood_max_hops: int
+    neighborhood_max_devices: int
+    # Minutes between background precomputations of Site topologies, 0 disables them
+    topology_precompute_interval: int
+    topology_precompute_min_devices: int
+    server_layout: bool
+    topology_encoding: str
+    # Whether migration 0002 creates the filter search trigram indexes
+    trigram_search_indexes: bool
+    metrics_hook: object
+
+
+def is_installed(module_name):
+    """Checks whether an optional package is installed without importing it."""
+    return find_spec(module_name) is not None
+
+
+def get_bool(config, name, default):
+    # Invalid values disable the option
+    value = config.get(name, default)
+    return value if value in (True, False) else False
+
+
+def get_number(config, name, default, minimum, types=(int,)):
+    value = config.get(name, default)
+    if not isinstance(value, types) or value < minimum:
+        return default
+    return value
+
+
+def get_initial_layout(config):
+    initial_layout = config.get('INITIAL_LAYOUT', 'forceDirected')
+    initial_layout = LEGACY_INITIAL_LAYOUTS.get(initial_layout, initial_layout)
+    return initial_layout if initial_layout in INITIAL_LAYOUTS else 'forceDirected'
+
+
+def get_server_layout(config):
+    server_layout = get_bool(config, 'SERVER_LAYOUT', False)
+    if server_layout and not is_installed('numpy'):
+        logger.warning('SERVER_LAYOUT requires NumPy, falling back to client-side layout')
+        return False
+    return server_layout
+
+
+def get_topology_encoding(config):
+    topology_encoding = config.get('TOPOLOGY_ENCODING', 'json')
+    if topology_encoding not in TOPOLOGY_ENCODINGS:
+        return 'json'
+    if topology_encoding == 'msgpack' and not is_installed('msgpack'):
+        logger.warning('TOPOLOGY_ENCODING msgpack requires the msgpack package, falling back to compact')
+        return 'compact'
+    return topology_encoding
+
+
+@lru_cache(maxsize=None)
+def get_plugin_settings():
+    config = settings.PLUGINS_CONFIG.get("nextbox_ui_plugin", dict())
+    netbox_version = version.parse(settings.VERSION)
+    return PluginSettings(
+        netbox_version=netbox_version,
+        device_role_field='role' if netbox_version >= version.parse("4.0.0") else 'device_role',
+        layers_sort_order=tuple(config.get('layers_sort_order') or DEFAULT_LAYERS_SORT_ORDER),
+        icon_model_map=MappingProxyType(dict(config.get('icon_model_map') or DEFAULT_ICON_MODEL_MAP)),
+        icon_role_map=MappingProxyType(dict(config.get('icon_role_map') or DEFAULT_ICON_ROLE_MAP)),
+        display_unconnected=get_bool(config, 'DISPLAY_UNCONNECTED', True),
+        display_passive_devices=get_bool(config, 'DISPLAY_PASSIVE_DEVICES', False),
+        undisplayed_device_role_slugs=tuple(config.get('undisplayed_device_role_slugs', ())),
+        undisplayed_device_tags=tuple(config.get('undisplayed_device_tags', ())),
+        select_layers_list_include_device_tags=tuple(config.get('select_layers_list_include_device_tags', ())),
+        select_layers_list_exclude_device_tags=tuple(config.get('select_layers_list_exclude_device_tags', ())),
+        initial_layout=get_initial_layout(config),
+        layout_iterations=get_number(config, 'LAYOUT_ITERATIONS', 700, minimum=1),
+        layout_min_iterations=get_number(config, 'LAYOUT_MIN_ITERATIONS', 50, minimum=1),
+        layout_worker_min_nodes=get_number(config, 'LAYOUT_WORKER_MIN_NODES', 500, minimum=0),
+        topology_streaming=get_bool(config, 'TOPOLOGY_STREAMING', False),
+        topology_debug=get_bool(config, 'TOPOLOGY_DEBUG', False),
+        streaming_chunk_size=get_number(config, 'STREAMING_CHUNK_SIZE', 500, minimum=1),
+        topology_build_workers=get_number(config, 'TOPOLOGY_BUILD_WORKERS', 1, minimum=1),
+        topology_cache_timeout=get_number(config, 'TOPOLOGY_CACHE_TIMEOUT', 300, minimum=0),
+        topology_snapshot_timeout=get_number(config, 'TOPOLOGY_SNAPSHOT_TIMEOUT', 3600, minimum=1),
+        topology_refresh_interval=get_number(config, 'TOPOLOGY_REFRESH_INTERVAL', 0, minimum=0),
+        topology_push=get_bool(config, 'TOPOLOGY_PUSH', False),
+        topology_push_debounce=get_number(config, 'TOPOLOGY_PUSH_DEBOUNCE', 2, minimum=0, types=(int, float)),
+        topology_push_max_streams=get_number(config, 'TOPOLOGY_PUSH_MAX_STREAMS', 2, minimum=0),
+        aggregation_threshold=get_number(config, 'AGGREGATION_THRESHOLD', 0, minimum=0),
+        collapse_virtual_chassis=get_bool(config, 'COLLAPSE_VIRTUAL_CHASSIS', False),
+        merge_parallel_links=get_bool(config, 'MERGE_PARALLEL_LINKS', False),
+        neighborhood_max_hops=get_number(config, 'NEIGHBORHOOD_MAX_HOPS', 5, minimum=1),
+        neighborhood_max_devices=get_number(config, 'NEIGHBORHOOD_MAX_DEVICES', 500, minimum=1),
+        topology_precompute_interval=get_number(config, 'TOPOLOGY_PRECOMPUTE_INTERVAL', 0, minimum=0),
+        topology_precompute_min_devices=get_number(config, 'TOPOLOGY_PRECOMPUTE_MIN_DEVICES', 500, minimum=0),
+        server_layout=get_server_layout(config),
+        topology_encoding=get_topology_encoding(config),
+        trigram_search_indexes=get_bool(config, 'TRIGRAM_SEARCH_INDEXES', False),
+        metrics_hook=config.get('METRICS_HOOK', None),
+    )
@@ -0,0 +1,57 @@
+"""Optional trigram indexes for the topology filter search
+
+The icontains lookups of TopologyFilterSet.search() compare
+UPPER("column"::text), which PostgreSQL can serve from pg_trgm
+GIN indexes on the same expressions. The indexes are created by
+migration 0002 with TRIGRAM_SEARCH_INDEXES enabled, or at any time
+by the nextbox_ui_trigram_indexes management command.
+"""
+import logging
+
+logger = logging.getLogger('nextbox_ui_plugin.search_indexes')
+
+TRIGRAM_INDEXES = {
+    'nextbox_ui_device_name_trgm': ('dcim_device', 'name'),
+    'nextbox_ui_device_serial_trgm': ('dcim_device', 'serial'),
+    'nextbox_ui_device_asset_tag_trgm': ('dcim_device', 'asset_tag'),
+    'nextbox_ui_device_description_trgm': ('dcim_device', 'description'),
+    'nextbox_ui_device_comments_trgm': ('dcim_device', 'comments'),
+    'nextbox_ui_inventoryitem_serial_trgm': ('dcim_inventoryitem', 'serial'),
+}
+
+
+def trigram_indexes_supported(connection):
+    """True on PostgreSQL with the pg_trgm extension available."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def create_trigram_indexes(connection):
+    """
+    Creates the pg_trgm extension and the missing trigram indexes.
+    Returns False if the database does not support them.
+    """
+    if not trigram_indexes_supported(connection):
+        logger.warning('pg_trgm extension is not available, trigram search indexes are not created')
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for index_name, (table_name, column_name) in TRIGRAM_INDEXES.items():
+            # Django's icontains lookup compares UPPER("column"::text)
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {index_name} ON {table_name} '
+                f'USING gin ((UPPER("{column_name}"::text)) gin_trgm_ops)'
+            )
+    return True
+
+
+def drop_trigram_indexes(connection):
+    """Drops the trigram indexes, the pg_trgm extension is kept."""
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for index_name in TRIGRAM_INDEXES:
+            cursor.execute(f'DROP INDEX IF EXISTS {index_name}')
@@ -0,0 +1,140 @@
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from dcim.models import (
+    Cable, CableTermination, Device, DeviceRole, DeviceType, FrontPort, Interface, Location, Rack, RearPort, Site,
+    VirtualChassis,
+)
+from extras.models import SavedFilter, Tag
+from ipam.models import IPAddress
+from . import cache, jobs
+
+
+def invalidate_sites(site_ids):
+    site_ids = set(site_ids)
+    cache.invalidate_sites(site_ids)
+    # Precomputed Site topologies are recomputed shortly after
+    jobs.schedule_site_topologies(site_ids)
+
+
+def invalidate_devices(site_ids):
+    # Changed Devices may now match the filters of topologies of other Sites
+    site_ids = set(site_ids)
+    cache.invalidate_devices(site_ids)
+    jobs.schedule_site_topologies(site_ids)
+
+
+def get_object_site_ids(instance):
+    site_ids = {instance.site_id}
+    # Account for Devices, Locations and Racks moved between Sites
+    prechange_snapshot = getattr(instance, '_prechange_snapshot', None) or {}
+    site_ids.add(prechange_snapshot.get('site'))
+    return site_ids
+
+
+def get_primary_ip_site_ids(ip_address):
+    return Device.objects.filter(
+        Q(primary_ip4=ip_address) | Q(primary_ip6=ip_address)
+    ).values_list('site_id', flat=True)
+
+
+@receiver((post_save, post_delete), sender=Device)
+def invalidate_device_topology(instance, **kwargs):
+    invalidate_devices(get_object_site_ids(instance))
+
+
+@receiver((post_save, post_delete), sender=CableTermination)
+def invalidate_cable_termination_topology(instance, **kwargs):
+    invalidate_sites({instance._site_id})
+
+
+@receiver(post_save, sender=Cable)
+def invalidate_cable_topology(instance, **kwargs):
+    # Cable deletions are covered by cascading CableTermination deletions
+    invalidate_sites(
+        CableTermination.objects.filter(cable=instance).values_list('_site_id', flat=True)
+    )
+
+
+@receiver((post_save, post_delete), sender=Interface)
+@receiver((post_save, post_delete), sender=FrontPort)
+@receiver((post_save, post_delete), sender=RearPort)
+def invalidate_device_component_topology(instance, **kwargs):
+    invalidate_devices(
+        Device.objects.filter(pk=instance.device_id).values_list('site_id', flat=True)
+    )
+
+
+@receiver(post_save, sender=IPAddress)
+def invalidate_primary_ip_topology(instance, **kwargs):
+    invalidate_devices(get_primary_ip_site_ids(instance))
+
+
+@receiver(pre_delete, sender=IPAddress)
+def collect_primary_ip_sites(instance, **kwargs):
+    # Primary IPs of Devices are cleared before post_delete
+    instance._nextbox_ui_site_ids = set(get_primary_ip_site_ids(instance))
+
+
+@receiver(post_delete, sender=IPAddress)
+def invalidate_deleted_primary_ip_topology(instance, **kwargs):
+    invalidate_devices(getattr(instance, '_nextbox_ui_site_ids', ()))
+
+
+@receiver(post_save, sender=Site)
+def invalidate_site_topology(instance, **kwargs):
+    # Aggregated groups are named after their Site, Location or Rack,
+    # and Devices may now match region or group filters
+    invalidate_devices({instance.pk})
+
+
+@receiver(post_delete, sender=Site)
+def invalidate_deleted_site_topology(instance, **kwargs):
+    # Deleted Sites have no topology to precompute
+    cache.invalidate_sites({instance.pk})
+
+
+@receiver((post_save, post_delete), sender=Location)
+@receiver((post_save, post_delete), sender=Rack)
+def invalidate_site_group_topology(instance, **kwargs):
+    invalidate_devices(get_object_site_ids(instance))
+
+
+@receiver(post_save, sender=VirtualChassis)
+def invalidate_virtual_chassis_topology(instance, **kwargs):
+    # Collapsed members are named after their virtual chassis and its master
+    invalidate_sites(
+        Device.objects.filter(virtual_chassis=instance).values_list('site_id', flat=True)
+    )
+
+
+@receiver(pre_delete, sender=VirtualChassis)
+def collect_virtual_chassis_sites(instance, **kwargs):
+    # Members are detached from the virtual chassis before post_delete
+    instance._nextbox_ui_site_ids = set(
+        Device.objects.filter(virtual_chassis=instance).values_list('site_id', flat=True)
+    )
+
+
+@receiver(post_delete, sender=VirtualChassis)
+def invalidate_deleted_virtual_chassis_topology(instance, **kwargs):
+    invalidate_devices(getattr(instance, '_nextbox_ui_site_ids', ()))
+
+
+@receiver(m2m_changed, sender=Device.tags.through)
+def invalidate_device_tags_topology(instance, action, model, **kwargs):
+    # The tag through model is shared by all tagged NetBox models
+    if not action.startswith('post_'):
+        return
+    if isinstance(instance, Device):
+        invalidate_devices({instance.site_id})
+    elif isinstance(instance, Tag) and model is Device:
+        cache.invalidate_all()
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=DeviceRole)
+@receiver((post_save, post_delete), sender=DeviceType)
+@receiver((post_save, post_delete), sender=SavedFilter)
+def invalidate_all_topologies(**kwargs):
+    cache.invalidate_all()
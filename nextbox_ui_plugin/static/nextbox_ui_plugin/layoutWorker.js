@@ -0,0 +1,141 @@
+// Force-directed layout of large topologies, run off the main thread.
+//
+// Input message:
+//   positions: Float64Array of x, y pairs, the initial node positions
+//   edges: Int32Array of source, target node index pairs
+//   iterations: number of layout iterations
+//   temperature: largest initial node displacement per iteration
+//   progressInterval: iterations between intermediate results
+// Output messages:
+//   { type: 'progress' | 'done', iteration, positions }
+
+// Preferred distance between connected nodes, in topoSphere coordinates
+const NODE_DISTANCE = 150;
+
+// Nodes in cells holding more nodes than this repel as one, from the cells' center
+const CELL_EXACT_LIMIT = 32;
+
+function repel(displacements, i, deltaX, deltaY, weight) {
+    let distance = Math.sqrt(deltaX * deltaX + deltaY * deltaY);
+    if (distance === 0) {
+        // Overlapping nodes are pushed apart in a fixed direction
+        deltaX = 0.01 * (i % 2 ? 1 : -1);
+        deltaY = 0.01;
+        distance = Math.sqrt(deltaX * deltaX + deltaY * deltaY);
+    }
+    const force = weight * NODE_DISTANCE * NODE_DISTANCE / distance;
+    displacements[2 * i] += deltaX / distance * force;
+    displacements[2 * i + 1] += deltaY / distance * force;
+}
+
+function applyRepulsion(positions, displacements, nodeCount) {
+    // Nodes only repel nodes in the same and adjacent grid cells,
+    // which keeps every iteration close to linear in the node count.
+    // Grid cells are sorted by node with a counting sort.
+    let minX = Infinity, minY = Infinity, maxX = -Infinity, maxY = -Infinity;
+    for (let i = 0; i < nodeCount; i++) {
+        minX = Math.min(minX, positions[2 * i]);
+        maxX = Math.max(maxX, positions[2 * i]);
+        minY = Math.min(minY, positions[2 * i + 1]);
+        maxY = Math.max(maxY, positions[2 * i + 1]);
+    }
+    // Sparse layouts get larger cells, so the grid stays proportional to the node count
+    const gridLimit = Math.ceil(Math.sqrt(nodeCount)) * 2;
+    const cellSize = Math.max(NODE_DISTANCE * 2, (maxX - minX) / gridLimit, (maxY - minY) / gridLimit);
+    const columns = Math.floor((maxX - minX) / cellSize) + 1;
+    const rows = Math.floor((maxY - minY) / cellSize) + 1;
+    const cells = new Int32Array(nodeCount);
+    const cellStarts = new Int32Array(columns * rows + 1);
+    const cellSums = new Float64Array(columns * rows * 2);
+    for (let i = 0; i < nodeCount; i++) {
+        const cell = Math.floor((positions[2 * i] - minX) / cellSize)
+            + Math.floor((positions[2 * i + 1] - minY) / cellSize) * columns;
+        cells[i] = cell;
+        cellStarts[cell + 1]++;
+        cellSums[2 * cell] += positions[2 * i];
+        cellSums[2 * cell + 1] += positions[2 * i + 1];
+    }
+    for (let cell = 0; cell < columns * rows; cell++) {
+        cellStarts[cell + 1] += cellStarts[cell];
+    }
+    const cellNodes = new Int32Array(nodeCount);
+    const cellFill = cellStarts.slice(0, columns * rows);
+    for (let i = 0; i < nodeCount; i++) {
+        cellNodes[cellFill[cells[i]]++] = i;
+    }
+
+    for (let i = 0; i < nodeCount; i++) {
+        const x = positions[2 * i];
+        const y = positions[2 * i + 1];
+        const column = cells[i] % columns;
+        const row = Math.floor(cells[i] / columns);
+        for (let neighborRow = Math.max(0, row - 1); neighborRow <= Math.min(rows - 1, row + 1); neighborRow++) {
+            for (let neighborColumn = Math.max(0, column - 1); neighborColumn <= Math.min(columns - 1, column + 1); neighborColumn++) {
+                const cell = neighborColumn + neighborRow * columns;
+                const count = cellStarts[cell + 1] - cellStarts[cell];
+                if (count > CELL_EXACT_LIMIT) {
+                    // The node itself is left out of its own cell's center
+                    const others = cell === cells[i] ? count - 1 : count;
+                    const centerX = (cellSums[2 * cell] - (cell === cells[i] ? x : 0)) / others;
+                    const centerY = (cellSums[2 * cell + 1] - (cell === cells[i] ? y : 0)) / others;
+                    repel(displacements, i, x - centerX, y - centerY, others);
+                    continue;
+                }
+                for (let k = cellStarts[cell]; k < cellStarts[cell + 1]; k++) {
+                    const j = cellNodes[k];
+                    if (j !== i) {
+                        repel(displacements, i, x - positions[2 * j], y - positions[2 * j + 1], 1);
+                    }
+                }
+            }
+        }
+    }
+}
+
+function applyAttraction(positions, displacements, edges) {
+    for (let e = 0; e < edges.length; e += 2) {
+        const source = edges[e];
+        const target = edges[e + 1];
+        const deltaX = positions[2 * source] - positions[2 * target];
+        const deltaY = positions[2 * source + 1] - positions[2 * target + 1];
+        const distance = Math.sqrt(deltaX * deltaX + deltaY * deltaY);
+        if (distance === 0) {
+            continue;
+        }
+        const force = distance * distance / NODE_DISTANCE;
+        const forceX = deltaX / distance * force;
+        const forceY = deltaY / distance * force;
+        displacements[2 * source] -= forceX;
+        displacements[2 * source + 1] -= forceY;
+        displacements[2 * target] += forceX;
+        displacements[2 * target + 1] += forceY;
+    }
+}
+
+function computeLayout({ positions, edges, iterations, temperature, progressInterval }) {
+    const nodeCount = positions.length / 2;
+    const displacements = new Float64Array(positions.length);
+    for (let iteration = 1; iteration <= iterations; iteration++) {
+        displacements.fill(0);
+        applyRepulsion(positions, displacements, nodeCount);
+        applyAttraction(positions, displacements, edges);
+        // Displacements are capped by a linearly cooling temperature
+        const limit = temperature * (1 - (iteration - 1) / iterations);
+        for (let i = 0; i < nodeCount; i++) {
+            const deltaX = displacements[2 * i];
+            const deltaY = displacements[2 * i + 1];
+            const distance = Math.sqrt(deltaX * deltaX + deltaY * deltaY);
+            if (distance > 0) {
+                const step = Math.min(distance, limit);
+                positions[2 * i] += deltaX / distance * step;
+                positions[2 * i + 1] += deltaY / distance * step;
+            }
+        }
+        if (iteration < iterations && iteration % progressInterval === 0) {
+            self.postMessage({ type: 'progress', iteration, positions: positions.slice() });
+        }
+    }
+    self.postMessage({ type: 'done', iteration: iterations, positions }, [positions.buffer]);
+}
+
+self.onmessage = event => computeLayout(event.data);
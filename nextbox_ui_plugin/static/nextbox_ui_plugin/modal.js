@@ -6,7 +6,7 @@ function decodeSanitizedString(sanitizedStr) {
     return doc.documentElement.textContent;
 }
 
-function showModal(titleConfig, tableData) {
+function showModal(titleConfig, tableData, actions = []) {
     const container = document.getElementById('topology-container');
 
     if (!container) {
@@ -87,6 +87,14 @@ function showModal(titleConfig, tableData) {
     // Construct the resulting modal window
     modal.appendChild(title);
     modal.appendChild(table);  
+    actions.forEach(action => {
+        const button = document.createElement('button');
+        button.type = 'button';
+        button.className = 'btn btn-primary';
+        button.textContent = action.text;
+        button.addEventListener('click', action.handler);
+        modal.appendChild(button);
+    });
     overlay.appendChild(modal);
     container.style.position = 'relative';
     container.appendChild(overlay);
@@ -114,6 +122,18 @@ function nodeClickHandler(event) {
         text: nodeData?.customAttributes?.name,
         href: decodeSanitizedString(nodeData?.customAttributes?.dcimDeviceLink),
     }
+    if (nodeData?.customAttributes?.aggregate) {
+        // Super-nodes of aggregated topologies are expanded on demand
+        showModal(titleConfig, [['Devices', nodeData.customAttributes.deviceCount]], [{
+            text: 'Expand',
+            handler: () => {
+                hideModal();
+                expandAggregateNode(nodeId, nodeData)
+                .catch(error => console.error('Topology expand failed:', error));
+            },
+        }]);
+        return;
+    }
     const tableContent = [
         ['Model', nodeData?.customAttributes?.model || '–'],
         ['Serial Number', nodeData?.customAttributes?.serialNumber || '–'],
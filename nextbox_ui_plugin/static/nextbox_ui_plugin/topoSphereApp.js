@@ -36,15 +36,969 @@ function initNBColorModeToggle() {
 
 function initTopoSphere(config) {
     // Create the topology visualization
-    TopoSphere.create('topology-container', config)
+    return TopoSphere.create('topology-container', config)
     .then(instance => {
         window.topoSphere = instance;
         console.log('TopoSphere initialized and available as window.topoSphere');
+        return instance;
     })
     .catch(error => console.error('Initialization failed:', error));
 }
 
-const topologyData = window.topologyData;
+function renderDebugPanel(serverTiming) {
+    // Renders Server-Timing metrics of the topology build
+    const panel = document.getElementById('topology-debug-panel');
+    if (!window.topologyDebug || !panel) {
+        return;
+    }
+    panel.textContent = '';
+    if (!serverTiming) {
+        panel.textContent = 'No Server-Timing data available.';
+        return;
+    }
+    const table = document.createElement('table');
+    table.className = 'table table-sm mb-0';
+    serverTiming.split(',').forEach(metric => {
+        const [name, ...params] = metric.trim().split(';');
+        const row = document.createElement('tr');
+        const duration = params.find(param => param.startsWith('dur='));
+        const description = params.find(param => param.startsWith('desc='));
+        [
+            name,
+            duration ? `${duration.slice(4)} ms` : '',
+            description ? description.slice(5).replace(/"/g, '') : '',
+        ].forEach(value => {
+            const cell = document.createElement('td');
+            cell.textContent = value;
+            row.appendChild(cell);
+        });
+        table.appendChild(row);
+    });
+    panel.appendChild(table);
+}
+
+function renderClientTiming(name, duration) {
+    // Adds client-side timings, e.g. of the initial layout, to the debug panel.
+    // Timings are also kept in window.topologyClientTimings for the browser benchmark.
+    window.topologyClientTimings[name] = duration;
+    const panel = document.getElementById('topology-debug-panel');
+    if (!window.topologyDebug || !panel) {
+        return;
+    }
+    let element = document.getElementById(`topology-client-timing-${name}`);
+    if (!element) {
+        element = document.createElement('div');
+        element.id = `topology-client-timing-${name}`;
+        element.className = 'text-muted small mt-1';
+        panel.after(element);
+    }
+    element.textContent = `${name}: ${duration.toFixed(1)} ms`;
+}
+
+const TOPOLOGY_MEDIA_TYPES = {
+    json: 'application/json',
+    compact: 'application/vnd.nextbox.topology+json',
+    msgpack: 'application/msgpack',
+};
+
+function decodeMessagePack(buffer) {
+    // Minimal MessagePack decoder for topology payloads:
+    // nil, booleans, integers, floats, strings, binaries, arrays and maps
+    const view = new DataView(buffer);
+    const bytes = new Uint8Array(buffer);
+    const textDecoder = new TextDecoder();
+    let offset = 0;
+    const readString = length => {
+        const value = textDecoder.decode(bytes.subarray(offset, offset + length));
+        offset += length;
+        return value;
+    };
+    const readArray = length => {
+        const value = new Array(length);
+        for (let i = 0; i < length; i++) {
+            value[i] = read();
+        }
+        return value;
+    };
+    const readMap = length => {
+        const value = {};
+        for (let i = 0; i < length; i++) {
+            const key = read();
+            value[key] = read();
+        }
+        return value;
+    };
+    const readBinary = length => {
+        const value = bytes.slice(offset, offset + length);
+        offset += length;
+        return value;
+    };
+    const next = (size, getter) => {
+        const value = getter(offset);
+        offset += size;
+        return value;
+    };
+    function read() {
+        const type = bytes[offset++];
+        if (type <= 0x7f) return type;
+        if (type <= 0x8f) return readMap(type & 0x0f);
+        if (type <= 0x9f) return readArray(type & 0x0f);
+        if (type <= 0xbf) return readString(type & 0x1f);
+        if (type >= 0xe0) return type - 0x100;
+        switch (type) {
+            case 0xc0: return null;
+            case 0xc2: return false;
+            case 0xc3: return true;
+            case 0xc4: return readBinary(next(1, o => view.getUint8(o)));
+            case 0xc5: return readBinary(next(2, o => view.getUint16(o)));
+            case 0xc6: return readBinary(next(4, o => view.getUint32(o)));
+            case 0xca: return next(4, o => view.getFloat32(o));
+            case 0xcb: return next(8, o => view.getFloat64(o));
+            case 0xcc: return next(1, o => view.getUint8(o));
+            case 0xcd: return next(2, o => view.getUint16(o));
+            case 0xce: return next(4, o => view.getUint32(o));
+            case 0xcf: return next(8, o => Number(view.getBigUint64(o)));
+            case 0xd0: return next(1, o => view.getInt8(o));
+            case 0xd1: return next(2, o => view.getInt16(o));
+            case 0xd2: return next(4, o => view.getInt32(o));
+            case 0xd3: return next(8, o => Number(view.getBigInt64(o)));
+            case 0xd9: return readString(next(1, o => view.getUint8(o)));
+            case 0xda: return readString(next(2, o => view.getUint16(o)));
+            case 0xdb: return readString(next(4, o => view.getUint32(o)));
+            case 0xdc: return readArray(next(2, o => view.getUint16(o)));
+            case 0xdd: return readArray(next(4, o => view.getUint32(o)));
+            case 0xde: return readMap(next(2, o => view.getUint16(o)));
+            case 0xdf: return readMap(next(4, o => view.getUint32(o)));
+        }
+        throw new Error(`Unsupported MessagePack type 0x${type.toString(16)}`);
+    }
+    return read();
+}
+
+function decodeCompactTopology(data) {
+    // Restores the topoSphere topology data structure from the compact
+    // column format. Labels, URLs and edge end names are derived here.
+    const strings = data.strings;
+    const string = index => (index < 0 ? null : strings[index]);
+    const nodes = [];
+    const deviceNames = {};
+    const n = data.nodes;
+    for (let i = 0; i < n.id.length; i++) {
+        const name = string(n.name[i]);
+        deviceNames[n.id[i]] = name;
+        const node = {
+            id: `device-${n.id[i]}`,
+            name: name,
+            label: name,
+            layer: n.layer[i],
+            iconName: string(n.icon[i]),
+            isPassive: (n.flags[i] & 1) !== 0,
+            isUnconnected: (n.flags[i] & 2) !== 0,
+            tags: n.tags[i].map(string),
+            customAttributes: {
+                name: name,
+                model: string(n.model[i]),
+                serialNumber: string(n.serial[i]),
+                deviceRole: string(n.role[i]),
+                primaryIP: string(n.ip[i]),
+                dcimDeviceLink: data.urls.device.replace('{pk}', n.id[i]),
+            },
+        };
+        if (n.coord && n.coord[i]) {
+            node.coord = { x: n.coord[i][0], y: n.coord[i][1] };
+        }
+        nodes.push(node);
+    }
+    const edges = [];
+    const e = data.edges;
+    for (let i = 0; i < e.kind.length; i++) {
+        const edge = {
+            source: `device-${e.source[i]}`,
+            target: `device-${e.target[i]}`,
+            sourceInterface: string(e.sourceInterface[i]),
+            sourceInterfaceLabel: { text: string(e.sourceLabel[i]) },
+            targetInterface: string(e.targetInterface[i]),
+            targetInterfaceLabel: { text: string(e.targetLabel[i]) },
+        };
+        if (e.kind[i] === 0) {
+            edge.id = `cable-${e.ref[i]}`;
+            edge.label = `Cable ${e.ref[i]}`;
+            edge.customAttributes = {
+                name: edge.label,
+                dcimCableURL: data.urls.cable.replace('{pk}', e.ref[i]),
+            };
+        } else {
+            edge.id = `path-${Math.min(e.ref[i], e.peer[i])}-${Math.max(e.ref[i], e.peer[i])}`;
+            edge.isLogicalMultiCable = true;
+            edge.customAttributes = {
+                name: 'Multi-Cable Connection',
+                dcimCableURL: `/dcim/interfaces/${e.ref[i]}/trace/`,
+            };
+        }
+        edge.customAttributes.source = deviceNames[e.source[i]];
+        edge.customAttributes.target = deviceNames[e.target[i]];
+        edges.push(edge);
+    }
+    return {
+        nodes: nodes.concat(data.extra.nodes),
+        edges: edges.concat(data.extra.edges),
+    };
+}
+
+async function readTopologyData(response) {
+    // Decodes the topology data in the encoding the server responded with
+    const contentType = response.headers.get('Content-Type') || '';
+    const isMessagePack = contentType.startsWith(TOPOLOGY_MEDIA_TYPES.msgpack);
+    const body = isMessagePack ? await response.arrayBuffer() : await response.text();
+    const decodeStarted = performance.now();
+    let topologyData = isMessagePack ? decodeMessagePack(body) : JSON.parse(body);
+    if (isMessagePack || contentType.startsWith(TOPOLOGY_MEDIA_TYPES.compact)) {
+        topologyData = decodeCompactTopology(topologyData);
+    }
+    renderClientTiming('decode', performance.now() - decodeStarted);
+    return topologyData;
+}
+
+function requestTopologyData(url) {
+    // The browser revalidates cached data with conditional requests.
+    const mediaType = TOPOLOGY_MEDIA_TYPES[window.topologyEncoding] || TOPOLOGY_MEDIA_TYPES.json;
+    return fetch(url, {
+        credentials: 'same-origin',
+        headers: {'Accept': mediaType},
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`Topology data request failed: ${response.status}`);
+        }
+        return response;
+    });
+}
+
+function readTopologyResponse(response) {
+    renderDebugPanel(response.headers.get('Server-Timing'));
+    renderTopologyStatus(response);
+    topologyVersion = response.headers.get('X-Topology-Version');
+    return readTopologyData(response);
+}
+
+function fetchTopologyData(url) {
+    // Topology data is loaded after the page shell is rendered.
+    return requestTopologyData(url).then(readTopologyResponse);
+}
+
+function renderTopologyStatus(response) {
+    // Shows when a precomputed Site topology was computed
+    // and whether it has changed since
+    const status = document.getElementById('topology-status');
+    const computed = response.headers.get('X-Topology-Computed');
+    if (!status || !computed) {
+        return;
+    }
+    precomputedAt = computed;
+    let text = `Computed ${new Date(computed).toLocaleString()}`;
+    if (response.headers.get('X-Topology-Stale') === 'true') {
+        text += ', outdated, refresh scheduled';
+    }
+    document.getElementById('topology-status-text').textContent = text;
+    status.style.display = '';
+}
+
+async function waitForPrecomputedTopology() {
+    // Polls the topology until a newer precomputed one is served
+    const started = performance.now();
+    while (performance.now() - started < PRECOMPUTED_REFRESH_TIMEOUT) {
+        await new Promise(resolve => setTimeout(resolve, PRECOMPUTED_REFRESH_POLL_INTERVAL));
+        const response = await requestTopologyData(window.topologyDataURL);
+        if (response.headers.get('X-Topology-Computed') !== precomputedAt) {
+            return readTopologyResponse(response);
+        }
+    }
+    throw new Error('Topology refresh timed out');
+}
+
+function refreshPrecomputedTopology() {
+    // Enqueues the recomputation of the Site topology and
+    // replaces the displayed one once it is done
+    const button = document.getElementById('topology-refresh');
+    if (!window.topologyRefreshURL || !window.topoSphere) {
+        return;
+    }
+    button.disabled = true;
+    document.getElementById('topology-status-text').textContent = 'Refreshing...';
+    fetch(window.topologyRefreshURL, {
+        method: 'POST',
+        credentials: 'same-origin',
+        headers: {
+            'Accept': 'application/json',
+            'X-CSRFToken': window.netbox_csrf_token,
+        },
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`Topology refresh request failed: ${response.status}`);
+        }
+        return waitForPrecomputedTopology();
+    })
+    .then(topologyData => applyFullTopology(window.topoSphere, topologyData))
+    .catch(error => console.error('Topology refresh failed:', error))
+    .finally(() => {
+        button.disabled = false;
+    });
+}
+
+function initRefreshControl() {
+    const button = document.getElementById('topology-refresh');
+    if (button && window.topologyRefreshURL) {
+        button.addEventListener('click', refreshPrecomputedTopology);
+    }
+}
+
+async function streamTopologyData(url, onRecords) {
+    // Reads newline-delimited JSON records as they arrive
+    // and passes every parsed batch to onRecords.
+    const response = await fetch(url, {
+        credentials: 'same-origin',
+        headers: {'Accept': 'application/x-ndjson'},
+    });
+    if (!response.ok) {
+        throw new Error(`Topology data request failed: ${response.status}`);
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+        const lines = buffer.split('\n');
+        buffer = done ? '' : lines.pop();
+        const records = lines.filter(line => line.trim()).map(line => JSON.parse(line));
+        if (records.length) {
+            await onRecords(records);
+        }
+        if (done) {
+            break;
+        }
+    }
+}
+
+function whenTopologyReady(instance) {
+    // topoSphere finishes loading its initial data asynchronously.
+    // Incremental updates are applied only after that.
+    return new Promise(resolve => {
+        const check = () => {
+            if (instance.topology && instance.topology.touchHandler) {
+                resolve(instance);
+            } else {
+                setTimeout(check, 50);
+            }
+        };
+        check();
+    });
+}
+
+async function initStreamedTopoSphere(url, config) {
+    // The first streamed batch is rendered right away,
+    // later nodes and edges are added incrementally.
+    let instance = null;
+    await streamTopologyData(url, async records => {
+        const nodes = records.filter(record => record.type === 'node').map(record => record.data);
+        const edges = records.filter(record => record.type === 'edge').map(record => record.data);
+        if (!instance) {
+            instance = await TopoSphere.create('topology-container', { ...config, data: { nodes, edges } });
+            window.topoSphere = instance;
+            await whenTopologyReady(instance);
+            return;
+        }
+        for (const node of nodes) {
+            await instance.topology.addNode(node);
+        }
+        edges.forEach(edge => instance.topology.addEdge(edge));
+    });
+    if (!instance) {
+        return initTopoSphere({ ...config, data: { nodes: [], edges: [] } });
+    }
+    instance.topology.applyLayout();
+    instance.topology.scheduleRender();
+    console.log('TopoSphere initialized and available as window.topoSphere');
+    return instance;
+}
+
+function getNewNodeCoord(topology, nodeId, edges) {
+    // New nodes are placed next to their connected nodes,
+    // so the existing layout is kept as is.
+    const neighbors = edges
+        .filter(edge => edge.source === nodeId || edge.target === nodeId)
+        .map(edge => topology.getNode(edge.source === nodeId ? edge.target : edge.source))
+        .filter(node => node && node.coord);
+    const offset = () => (Math.random() - 0.5) * 200;
+    if (!neighbors.length) {
+        return { x: offset(), y: offset() };
+    }
+    return {
+        x: neighbors.reduce((sum, node) => sum + node.coord.x, 0) / neighbors.length + offset(),
+        y: neighbors.reduce((sum, node) => sum + node.coord.y, 0) / neighbors.length + offset(),
+    };
+}
+
+async function applyTopologyDelta(instance, delta) {
+    // Patches the rendered topology in place without re-layout.
+    // Updated nodes keep their position.
+    const topology = instance.topology;
+    const edges = delta.edges.added.concat(delta.edges.updated);
+    delta.edges.removed.forEach(edgeId => topology.removeEdge(edgeId));
+    delta.nodes.removed.forEach(nodeId => topology.removeNode(nodeId));
+    for (const node of delta.nodes.updated) {
+        const existing = topology.getNode(node.id);
+        const coord = existing ? { ...existing.coord } : getNewNodeCoord(topology, node.id, edges);
+        topology.removeNode(node.id);
+        await topology.addNode({ ...node, coord });
+    }
+    for (const node of delta.nodes.added) {
+        topology.removeNode(node.id);
+        await topology.addNode({ ...node, coord: getNewNodeCoord(topology, node.id, edges) });
+    }
+    edges.forEach(edge => {
+        topology.removeEdge(edge.id);
+        topology.addEdge(edge);
+    });
+    topology.scheduleRender();
+}
+
+async function applyFullTopology(instance, topologyData) {
+    // Replaces the rendered topology, keeping positions of known nodes
+    const topology = instance.topology;
+    const coords = {};
+    topology.nodes.forEach(node => {
+        coords[node.id] = { ...node.coord };
+    });
+    topology.nodes.map(node => node.id).forEach(nodeId => topology.removeNode(nodeId));
+    for (const node of topologyData.nodes) {
+        await topology.addNode({ ...node, coord: coords[node.id] || getNewNodeCoord(topology, node.id, topologyData.edges) });
+    }
+    topologyData.edges.forEach(edge => topology.addEdge(edge));
+    // Aggregated topologies are replaced with all super-nodes collapsed
+    expandedGroups = {};
+    topology.scheduleRender();
+}
+
+async function applyTopologyUpdate(instance, delta) {
+    if (delta.full) {
+        await applyFullTopology(instance, delta.topology);
+    } else {
+        await applyTopologyDelta(instance, delta);
+    }
+    topologyVersion = delta.version;
+}
+
+function pollTopologyDeltas(instance, url, interval) {
+    // Periodically fetches topology changes since the displayed version
+    const poll = async () => {
+        try {
+            const deltaURL = new URL(url, window.location.origin);
+            if (topologyVersion) {
+                deltaURL.searchParams.set('version', topologyVersion);
+            }
+            const response = await fetch(deltaURL, {
+                credentials: 'same-origin',
+                headers: {'Accept': 'application/json'},
+            });
+            if (!response.ok) {
+                throw new Error(`Topology delta request failed: ${response.status}`);
+            }
+            renderDebugPanel(response.headers.get('Server-Timing'));
+            await applyTopologyUpdate(instance, await response.json());
+        } catch (error) {
+            console.error('Topology update failed:', error);
+        }
+        setTimeout(poll, interval * 1000);
+    };
+    setTimeout(poll, interval * 1000);
+}
+
+function subscribeTopologyEvents(instance, url) {
+    // Topology changes are pushed by the server as they happen.
+    // The browser reconnects automatically and resumes
+    // from the last received topology version. Streams refused
+    // by the server, e.g. when too many are open, fall back to polling.
+    const eventsURL = new URL(url, window.location.origin);
+    if (topologyVersion) {
+        eventsURL.searchParams.set('version', topologyVersion);
+    }
+    const source = new EventSource(eventsURL, { withCredentials: true });
+    let updates = Promise.resolve();
+    source.addEventListener('delta', event => {
+        const delta = JSON.parse(event.data);
+        updates = updates
+        .then(() => applyTopologyUpdate(instance, delta))
+        .catch(error => console.error('Topology update failed:', error));
+    });
+    source.addEventListener('error', () => {
+        if (source.readyState === EventSource.CLOSED) {
+            updates.then(() => pollTopologyDeltas(
+                instance, window.topologyDeltaURL, window.topologyRefreshInterval || PUSH_FALLBACK_POLL_INTERVAL
+            ));
+        }
+    });
+    return source;
+}
+
+async function expandAggregateNode(nodeId, nodeData) {
+    // Replaces a super-node with the Devices it aggregates,
+    // placed in a circle around its position
+    const topology = window.topoSphere.topology;
+    const node = topology.getNode(nodeId);
+    if (!node) {
+        return;
+    }
+    const aggregate = nodeData.customAttributes.aggregate;
+    const groupId = nodeData.customAttributes.groupId;
+    const expanded = expandedGroups[aggregate] || [];
+    const expandURL = new URL(window.topologyExpandURL, window.location.origin);
+    expandURL.searchParams.set('aggregate', aggregate);
+    expandURL.searchParams.set('group_id', groupId === null ? 'null' : groupId);
+    expanded.forEach(id => expandURL.searchParams.append('expanded', id === null ? 'null' : id));
+    const response = await fetch(expandURL, {
+        credentials: 'same-origin',
+        headers: {'Accept': 'application/json'},
+    });
+    if (!response.ok) {
+        throw new Error(`Topology expand request failed: ${response.status}`);
+    }
+    renderDebugPanel(response.headers.get('Server-Timing'));
+    const subgraph = await response.json();
+    expandedGroups[aggregate] = expanded.concat([groupId]);
+
+    const center = { ...node.coord };
+    const radius = 80 * Math.sqrt(subgraph.nodes.length);
+    topology.removeNode(nodeId);
+    for (const [i, device] of subgraph.nodes.entries()) {
+        const angle = 2 * Math.PI * i / subgraph.nodes.length;
+        await topology.addNode({
+            ...device,
+            coord: { x: center.x + radius * Math.cos(angle), y: center.y + radius * Math.sin(angle) },
+        });
+    }
+    // Edges to hidden Devices are skipped
+    subgraph.edges.forEach(edge => {
+        if (topology.getNode(edge.source) && topology.getNode(edge.target)) {
+            topology.removeEdge(edge.id);
+            topology.addEdge(edge);
+        }
+    });
+    topology.scheduleRender();
+}
+
+function getSavedLayout() {
+    // Layout saved by the user for the same filters, if any
+    const element = document.getElementById('topology-saved-layout');
+    return element ? JSON.parse(element.textContent) : null;
+}
+
+function getLayoutData(instance) {
+    return {
+        nodes: instance.topology.nodes.map(node => ({ id: node.id, coord: { x: node.coord.x, y: node.coord.y } })),
+    };
+}
+
+function applySavedLayout(instance, layout) {
+    // Known nodes are moved to their saved positions,
+    // new nodes are placed next to their connected nodes.
+    const topology = instance.topology;
+    const coords = {};
+    (layout.nodes || []).forEach(node => {
+        coords[node.id] = node.coord;
+    });
+    const edges = topology.edges.map(edge => ({ source: edge.sourceNode.id, target: edge.targetNode.id }));
+    const newNodes = [];
+    topology.nodes.forEach(node => {
+        const coord = coords[node.id];
+        if (coord) {
+            topology.setNodePosition(node.id, coord.x, coord.y);
+        } else {
+            newNodes.push(node);
+        }
+    });
+    newNodes.forEach(node => {
+        const coord = getNewNodeCoord(topology, node.id, edges);
+        topology.setNodePosition(node.id, coord.x, coord.y);
+    });
+    topology.edges.forEach(edge => edge.updateInterfaceLabels());
+    if (typeof topology.calculateZoomToFit === 'function') {
+        topology.calculateZoomToFit();
+    }
+    topology.scheduleRender();
+}
+
+function savedTopologiesRequest(url, options = {}) {
+    return fetch(url, {
+        credentials: 'same-origin',
+        ...options,
+        headers: {
+            'Accept': 'application/json',
+            'Content-Type': 'application/json',
+            'X-CSRFToken': window.netbox_csrf_token,
+        },
+    })
+    .then(response => {
+        if (!response.ok) {
+            throw new Error(`Saved topology request failed: ${response.status}`);
+        }
+        return response.json();
+    });
+}
+
+function loadSavedLayouts() {
+    // Lists layouts saved for the same filters in the Load Layout menu
+    const menu = document.getElementById('topology-saved-layouts');
+    if (!menu || !window.savedTopologiesURL) {
+        return;
+    }
+    const url = new URL(window.savedTopologiesURL, window.location.origin);
+    url.searchParams.set('filter_key', window.topologyFilterKey);
+    savedTopologiesRequest(url)
+    .then(data => {
+        menu.textContent = '';
+        const savedTopologies = data.results || data;
+        if (!savedTopologies.length) {
+            const item = document.createElement('li');
+            item.innerHTML = '<span class="dropdown-item-text text-muted">No saved layouts</span>';
+            menu.appendChild(item);
+            return;
+        }
+        savedTopologies.forEach(savedTopology => {
+            const item = document.createElement('li');
+            const link = document.createElement('a');
+            link.className = 'dropdown-item';
+            link.href = '#';
+            link.textContent = `${savedTopology.name} (${savedTopology.created_by})`;
+            link.addEventListener('click', event => {
+                event.preventDefault();
+                applySavedLayout(window.topoSphere, savedTopology.topology);
+            });
+            item.appendChild(link);
+            menu.appendChild(item);
+        });
+    })
+    .catch(error => console.error('Saved layouts loading failed:', error));
+}
+
+function saveLayout() {
+    if (!window.topoSphere) {
+        return;
+    }
+    const name = window.prompt('Layout name:');
+    if (name === null) {
+        return;
+    }
+    savedTopologiesRequest(window.savedTopologiesURL, {
+        method: 'POST',
+        body: JSON.stringify({
+            name: name,
+            topology: getLayoutData(window.topoSphere),
+            layout_context: {
+                filter_key: window.topologyFilterKey,
+                layout: initialLayout,
+                url: window.location.search,
+            },
+        }),
+    })
+    .then(() => loadSavedLayouts())
+    .catch(error => console.error('Layout saving failed:', error));
+}
+
+function resetLayout() {
+    if (!window.topoSphere) {
+        return;
+    }
+    const topology = window.topoSphere.topology;
+    if (useLayoutWorker(topology.nodes.length)) {
+        relayoutWithWorker(window.topoSphere)
+        .catch(error => console.error('Layout failed:', error));
+        return;
+    }
+    // Restore the full layout run reduced for saved layouts
+    const layoutConfig = topology.config && topology.config.layoutConfigAlgorithm;
+    if (layoutConfig && layoutConfig.forceDirected) {
+        layoutConfig.forceDirected.iterations = getLayoutIterations(topology.nodes.length);
+    }
+    topology.applyLayout();
+    topology.scheduleRender();
+}
+
+function getLayoutIterations(nodeCount) {
+    // Layout iterations are scaled down with the topology size,
+    // every iteration of a larger topology costs more
+    const maxIterations = window.layoutIterations || FORCE_DIRECTED_ITERATIONS;
+    const minIterations = Math.min(window.layoutMinIterations || 1, maxIterations);
+    const iterations = Math.round(maxIterations * LAYOUT_ITERATIONS_REFERENCE_NODES / Math.max(nodeCount, 1));
+    return Math.max(minIterations, Math.min(maxIterations, iterations));
+}
+
+function useLayoutWorker(nodeCount) {
+    // Force-directed layouts of large topologies are computed by a Web Worker
+    return Boolean(
+        window.Worker && window.layoutWorkerURL && initialLayout === 'forceDirected'
+        && window.layoutWorkerMinNodes > 0 && nodeCount >= window.layoutWorkerMinNodes
+    );
+}
+
+function getCachedLayout() {
+    // Positions of the last worker layout for the same filters, if any
+    try {
+        const layout = window.localStorage.getItem(LAYOUT_CACHE_PREFIX + window.topologyFilterKey);
+        return layout ? JSON.parse(layout) : null;
+    } catch (error) {
+        return null;
+    }
+}
+
+function setCachedLayout(instance) {
+    try {
+        window.localStorage.setItem(
+            LAYOUT_CACHE_PREFIX + window.topologyFilterKey, JSON.stringify(getLayoutData(instance))
+        );
+    } catch (error) {
+        // Storage may be disabled or full, the layout is computed again next time
+    }
+}
+
+function getSeedPositions(nodes, layout) {
+    // Known positions are reused. Other nodes are placed on a grid,
+    // ordered by layer, so that the first frame is readable.
+    const coords = {};
+    ((layout && layout.nodes) || []).forEach(node => {
+        coords[node.id] = node.coord;
+    });
+    const positions = new Float64Array(nodes.length * 2);
+    const columns = Math.ceil(Math.sqrt(nodes.length));
+    const order = nodes.map((node, index) => index)
+        .sort((a, b) => (nodes[a].layer || 0) - (nodes[b].layer || 0));
+    order.forEach((index, position) => {
+        const coord = coords[nodes[index].id];
+        positions[2 * index] = coord ? coord.x : (position % columns) * LAYOUT_NODE_DISTANCE;
+        positions[2 * index + 1] = coord ? coord.y : Math.floor(position / columns) * LAYOUT_NODE_DISTANCE;
+    });
+    return positions;
+}
+
+function getEdgeIndexes(nodeIds, edges) {
+    const indexes = new Map(nodeIds.map((id, index) => [id, index]));
+    const edgeIndexes = [];
+    edges.forEach(edge => {
+        if (indexes.has(edge.source) && indexes.has(edge.target)) {
+            edgeIndexes.push(indexes.get(edge.source), indexes.get(edge.target));
+        }
+    });
+    return Int32Array.from(edgeIndexes);
+}
+
+function computeWorkerLayout(positions, edgeIndexes, iterations, temperature, onProgress) {
+    // Resolves with the final positions, intermediate ones are passed to onProgress
+    return new Promise((resolve, reject) => {
+        const worker = new Worker(window.layoutWorkerURL);
+        worker.onmessage = event => {
+            if (event.data.type === 'done') {
+                worker.terminate();
+                resolve(event.data.positions);
+            } else {
+                onProgress(event.data.positions);
+            }
+        };
+        worker.onerror = error => {
+            worker.terminate();
+            reject(error);
+        };
+        worker.postMessage({
+            positions,
+            edges: edgeIndexes,
+            iterations,
+            temperature,
+            progressInterval: LAYOUT_PROGRESS_INTERVAL,
+        }, [positions.buffer, edgeIndexes.buffer]);
+    });
+}
+
+function nextFrame() {
+    return new Promise(resolve => window.requestAnimationFrame(() => resolve()));
+}
+
+function applyNodePositions(instance, nodeIds, positions) {
+    const topology = instance.topology;
+    nodeIds.forEach((id, index) => topology.setNodePosition(id, positions[2 * index], positions[2 * index + 1]));
+    topology.edges.forEach(edge => edge.updateInterfaceLabels());
+    topology.scheduleRender();
+}
+
+// Latest intermediate worker layout positions not applied yet
+let pendingPositions = null;
+
+function scheduleNodePositions(instance, nodeIds, positions) {
+    // Intermediate positions are applied at most once per animation frame
+    if (!pendingPositions) {
+        window.requestAnimationFrame(() => {
+            if (pendingPositions) {
+                applyNodePositions(instance, nodeIds, pendingPositions);
+                pendingPositions = null;
+            }
+        });
+    }
+    pendingPositions = positions;
+}
+
+async function renderProgressively(config, topologyData, positions) {
+    // The first batch of nodes is rendered right away at the seed positions,
+    // the others are added in batches, one batch per animation frame
+    const nodes = topologyData.nodes.map((node, index) => ({
+        ...node, coord: { x: positions[2 * index], y: positions[2 * index + 1] },
+    }));
+    const firstNodes = nodes.slice(0, RENDER_BATCH_SIZE);
+    const shownNodeIds = new Set(firstNodes.map(node => node.id));
+    const isShown = edge => shownNodeIds.has(edge.source) && shownNodeIds.has(edge.target);
+    const instance = await TopoSphere.create('topology-container', {
+        ...config, data: { nodes: firstNodes, edges: topologyData.edges.filter(isShown) },
+    });
+    window.topoSphere = instance;
+    await whenTopologyReady(instance);
+    applySavedLayout(instance, { nodes: firstNodes });
+    renderClientTiming('first-frame', performance.now() - loadStarted);
+
+    let pendingEdges = topologyData.edges.filter(edge => !isShown(edge));
+    for (let i = RENDER_BATCH_SIZE; i < nodes.length; i += RENDER_BATCH_SIZE) {
+        await nextFrame();
+        for (const node of nodes.slice(i, i + RENDER_BATCH_SIZE)) {
+            await instance.topology.addNode(node);
+            shownNodeIds.add(node.id);
+        }
+        const remainingEdges = [];
+        pendingEdges.forEach(edge => {
+            if (isShown(edge)) {
+                instance.topology.addEdge(edge);
+            } else {
+                remainingEdges.push(edge);
+            }
+        });
+        pendingEdges = remainingEdges;
+        instance.topology.scheduleRender();
+    }
+    renderClientTiming('render-complete', performance.now() - loadStarted);
+    return instance;
+}
+
+function runWorkerLayout(getInstance, nodeIds, positions, edgeIndexes, temperature) {
+    // Intermediate positions are shown once the topology is rendered
+    let latestPositions = null;
+    const layout = computeWorkerLayout(
+        positions, edgeIndexes, getLayoutIterations(nodeIds.length), temperature,
+        intermediatePositions => {
+            latestPositions = intermediatePositions;
+            if (getInstance()) {
+                scheduleNodePositions(getInstance(), nodeIds, intermediatePositions);
+            }
+        },
+    );
+    return { layout, getLatestPositions: () => latestPositions };
+}
+
+function finishWorkerLayout(instance, nodeIds, positions) {
+    pendingPositions = null;
+    applyNodePositions(instance, nodeIds, positions);
+    if (typeof instance.topology.calculateZoomToFit === 'function') {
+        instance.topology.calculateZoomToFit();
+    }
+    setCachedLayout(instance);
+    renderClientTiming('client-layout', performance.now() - layoutStarted);
+    renderClientTiming('main-thread-blocking', mainThreadBlocking);
+    return instance;
+}
+
+async function initWorkerLayoutTopoSphere(config, topologyData) {
+    // topoSphere only renders, the layout is computed by a Web Worker
+    // while nodes are added. The first frame shows the positions cached
+    // by the last layout, which is then refined with less movement.
+    const cachedLayout = getCachedLayout();
+    const nodeIds = topologyData.nodes.map(node => node.id);
+    const seedPositions = getSeedPositions(topologyData.nodes, cachedLayout);
+    const temperature = cachedLayout ? LAYOUT_NODE_DISTANCE : LAYOUT_NODE_DISTANCE * Math.sqrt(nodeIds.length) / 4;
+    let instance = null;
+    const { layout, getLatestPositions } = runWorkerLayout(
+        () => instance, nodeIds, seedPositions.slice(), getEdgeIndexes(nodeIds, topologyData.edges), temperature,
+    );
+    instance = await renderProgressively(config, topologyData, seedPositions);
+    if (getLatestPositions()) {
+        scheduleNodePositions(instance, nodeIds, getLatestPositions());
+    }
+    return finishWorkerLayout(instance, nodeIds, await layout);
+}
+
+async function relayoutWithWorker(instance) {
+    // Full layout from scratch, with no cached positions
+    layoutStarted = performance.now();
+    const topology = instance.topology;
+    const nodes = topology.nodes.map(node => ({ id: node.id, layer: node.layer }));
+    const nodeIds = nodes.map(node => node.id);
+    const edges = topology.edges.map(edge => ({ source: edge.sourceNode.id, target: edge.targetNode.id }));
+    const { layout } = runWorkerLayout(
+        () => instance, nodeIds, getSeedPositions(nodes, null), getEdgeIndexes(nodeIds, edges),
+        LAYOUT_NODE_DISTANCE * Math.sqrt(nodeIds.length) / 4,
+    );
+    return finishWorkerLayout(instance, nodeIds, await layout);
+}
+
+function initLayoutControls() {
+    const controls = {
+        'topology-save-layout': saveLayout,
+        'topology-reset-layout': resetLayout,
+    };
+    Object.entries(controls).forEach(([id, handler]) => {
+        const button = document.getElementById(id);
+        if (button) {
+            button.addEventListener('click', handler);
+        }
+    });
+    loadSavedLayouts();
+}
+
+// Version of the displayed topology, used for incremental updates
+let topologyVersion = null;
+
+// Expanded super-node group IDs by aggregation level
+let expandedGroups = {};
+
+// Computation time of the displayed precomputed Site topology
+let precomputedAt = null;
+
+const PRECOMPUTED_REFRESH_POLL_INTERVAL = 3000;
+const PRECOMPUTED_REFRESH_TIMEOUT = 300000;
+
+// Delta polling interval in seconds when the event stream is refused,
+// unless TOPOLOGY_REFRESH_INTERVAL is set
+const PUSH_FALLBACK_POLL_INTERVAL = 30;
+
+// Default of LAYOUT_ITERATIONS
+const FORCE_DIRECTED_ITERATIONS = 700;
+// Topologies of up to this many nodes get all LAYOUT_ITERATIONS
+const LAYOUT_ITERATIONS_REFERENCE_NODES = 100;
+// Worker layout iterations between intermediate position updates
+const LAYOUT_PROGRESS_INTERVAL = 10;
+// Distance between connected nodes preferred by the worker layout
+const LAYOUT_NODE_DISTANCE = 150;
+const LAYOUT_CACHE_PREFIX = 'nextbox-ui-layout:';
+// Nodes added to the topology per animation frame
+const RENDER_BATCH_SIZE = 500;
+
+// Client-side timings in milliseconds, see renderClientTiming()
+window.topologyClientTimings = {};
+
+// Main thread blocking time, the total of long tasks beyond 50 ms
+let mainThreadBlocking = 0;
+if (window.PerformanceObserver && (PerformanceObserver.supportedEntryTypes || []).includes('longtask')) {
+    new PerformanceObserver(list => {
+        list.getEntries().forEach(entry => {
+            mainThreadBlocking += Math.max(0, entry.duration - 50);
+        });
+    }).observe({ type: 'longtask', buffered: true });
+}
+
 const initialLayout = window.initialLayout || 'forceDirected'; // 'layered' or 'forceDirected'
 
 let themeName = 'network-blue';
@@ -53,7 +1007,6 @@ if (detectNBColorMode() === 'dark') {
 }
 
 const config = {
-    data: topologyData,
     theme: themeName,
     layoutConfigAlgorithm: {
         layout: initialLayout,
@@ -65,14 +1018,92 @@ const config = {
             maxLayerDistance: 10000,
         },
         forceDirected: {
-            iterations: 700,
+            iterations: window.layoutIterations || FORCE_DIRECTED_ITERATIONS,
             padding: 120,
         }
     },
 };
 
-// Initialize topoSphere
-initTopoSphere(config);
+function reduceInitialLayout(config) {
+    // With known node positions, the initial layout run is reduced
+    // to a minimum as nodes are moved to their positions right after.
+    config.animation = { enabled: false };
+    config.layoutConfigAlgorithm.forceDirected.iterations = 1;
+}
+
+// Layouts saved by the user take precedence over server-side positions
+let initialPositions = getSavedLayout();
+if (initialPositions) {
+    reduceInitialLayout(config);
+}
+
+function startSavedLayout(instance) {
+    if (!instance) {
+        return instance;
+    }
+    return whenTopologyReady(instance).then(() => {
+        if (initialPositions) {
+            applySavedLayout(instance, initialPositions);
+        }
+        renderClientTiming('client-layout', performance.now() - layoutStarted);
+        renderClientTiming('main-thread-blocking', mainThreadBlocking);
+        return instance;
+    });
+}
+
+function startTopologyUpdates(instance) {
+    if (!instance) {
+        return;
+    }
+    if (window.topologyEventsURL) {
+        whenTopologyReady(instance)
+        .then(() => subscribeTopologyEvents(instance, window.topologyEventsURL));
+    } else if (window.topologyRefreshInterval > 0) {
+        whenTopologyReady(instance)
+        .then(() => pollTopologyDeltas(instance, window.topologyDeltaURL, window.topologyRefreshInterval));
+    }
+}
+
+// Fetch topology data and initialize topoSphere.
+// first-frame and render-complete include data loading,
+// client-layout covers the layout once the data is loaded.
+const loadStarted = performance.now();
+let layoutStarted = loadStarted;
+if (window.topologyStreaming) {
+    initStreamedTopoSphere(window.topologyDataURL, config)
+    .then(startSavedLayout)
+    .then(startTopologyUpdates)
+    .catch(error => console.error('Topology data loading failed:', error));
+} else {
+    fetchTopologyData(window.topologyDataURL)
+    .then(topologyData => {
+        config.data = topologyData;
+        if (!initialPositions) {
+            // Saved layouts keep the initial layout run reduced
+            config.layoutConfigAlgorithm.forceDirected.iterations = getLayoutIterations(topologyData.nodes.length);
+        }
+        if (!initialPositions && topologyData.nodes.some(node => node.coord)) {
+            // Nodes are pre-positioned by the server-side layout
+            initialPositions = { nodes: topologyData.nodes.filter(node => node.coord) };
+            reduceInitialLayout(config);
+        }
+        layoutStarted = performance.now();
+        renderClientTiming('data-load', layoutStarted - loadStarted);
+        if (!initialPositions && useLayoutWorker(topologyData.nodes.length)) {
+            reduceInitialLayout(config);
+            return initWorkerLayoutTopoSphere(config, topologyData);
+        }
+        return initTopoSphere(config).then(startSavedLayout);
+    })
+    .then(startTopologyUpdates)
+    .catch(error => console.error('Topology data loading failed:', error));
+}
 
 // Initialize NB Color Mode Toggle handler
 initNBColorModeToggle();
+
+// Initialize layout save and load controls
+initLayoutControls();
+
+// Initialize the precomputed topology refresh control
+initRefreshControl();
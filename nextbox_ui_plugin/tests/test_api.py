@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase
+
+from nextbox_ui_plugin.api.serializers import SavedTopologySerializer
+from nextbox_ui_plugin.models import SavedTopology
+
+
+class SavedTopologySerializerTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.owner = User.objects.create_user(username='owner')
+        cls.other_user = User.objects.create_user(username='other-user')
+
+    def get_context(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        return {'request': request}
+
+    def save(self, user, data, instance=None, partial=False):
+        serializer = SavedTopologySerializer(
+            instance, data=data, partial=partial, context=self.get_context(user)
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        return serializer.save()
+
+    def test_create(self):
+        saved_topology = self.save(self.owner, {'name': 'Layout 1', 'topology': {'nodes': []}})
+        self.assertEqual(saved_topology.created_by, self.owner)
+
+    def test_update_keeps_owner(self):
+        saved_topology = self.save(self.owner, {'name': 'Layout 1', 'topology': {'nodes': []}})
+        timestamp = saved_topology.timestamp
+        self.save(self.other_user, {'name': 'Layout 2', 'topology': {'nodes': []}}, instance=saved_topology)
+        self.save(self.other_user, {'name': 'Layout 3'}, instance=saved_topology, partial=True)
+        saved_topology = SavedTopology.objects.get(pk=saved_topology.pk)
+        self.assertEqual(saved_topology.name, 'Layout 3')
+        self.assertEqual(saved_topology.created_by, self.owner)
+        self.assertGreater(saved_topology.timestamp, timestamp)
@@ -0,0 +1,44 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.testing import StaticLiveServerTestCase
+from django.test import tag
+
+from nextbox_ui_plugin.benchmark import TopologyFixture, measure_browser
+
+try:
+    import playwright
+except ImportError:
+    playwright = None
+
+
+@tag('browser')
+@skipUnless(playwright, 'Playwright is not installed')
+class TopologyBrowserTestCase(StaticLiveServerTestCase):
+    """
+    Large topologies are rendered progressively while
+    they are laid out in a Web Worker.
+    """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser(username='browser-test')
+
+    def assert_progressive_render(self, size):
+        fixture = TopologyFixture('leaf-spine', size)
+        fixture.create()
+        timings = measure_browser(fixture, self.user, self.live_server_url)
+        for name, duration in timings.items():
+            self.assertIsNotNone(duration, name)
+        # first-frame and render-complete include data loading, client-layout does not
+        self.assertLessEqual(timings['first_frame_ms'], timings['render_complete_ms'])
+        self.assertLess(timings['first_frame_ms'], timings['data_load_ms'] + timings['client_layout_ms'])
+        self.assertLess(timings['main_thread_blocking_ms'], timings['client_layout_ms'])
+
+    def test_1000_devices(self):
+        self.assert_progressive_render(1000)
+
+    def test_5000_devices(self):
+        self.assert_progressive_render(5000)
+
+    def test_10000_devices(self):
+        self.assert_progressive_render(10000)
@@ -0,0 +1,145 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from dcim.models import (
+    Cable, CablePath, Device, DeviceRole, DeviceType, FrontPort, Interface, Manufacturer, RearPort, Site,
+)
+from circuits.models import Circuit, CircuitTermination, CircuitType, Provider
+
+from nextbox_ui_plugin.views import get_cable_path_signature, resolve_multi_cable_paths
+
+
+class ResolveMultiCablePathsTestCase(TestCase):
+    """Batched resolution of Interface paths through patch panels and circuits."""
+
+    @classmethod
+    def setUpTestData(cls):
+        manufacturer = Manufacturer.objects.create(name='Manufacturer 1', slug='manufacturer-1')
+        cls.device_type = DeviceType.objects.create(
+            manufacturer=manufacturer, model='Device Type 1', slug='device-type-1'
+        )
+        cls.role = DeviceRole.objects.create(name='Device Role 1', slug='device-role-1')
+        cls.site = Site.objects.create(name='Site 1', slug='site-1')
+
+    def create_device(self, name):
+        return Device.objects.create(name=name, site=self.site, role=self.role, device_type=self.device_type)
+
+    def create_interface(self, name):
+        return Interface.objects.create(device=self.create_device(name), name='Ethernet0', type='1000base-t')
+
+    def create_patch_panel(self, name):
+        patch_panel = self.create_device(name)
+        rear_port = RearPort.objects.create(device=patch_panel, name='Rear1', type='8p8c', positions=1)
+        front_port = FrontPort.objects.create(
+            device=patch_panel, name='Front1', type='8p8c', rear_port=rear_port, rear_port_position=1
+        )
+        return front_port, rear_port
+
+    def create_circuit(self, cid):
+        provider, _ = Provider.objects.get_or_create(name='Provider 1', slug='provider-1')
+        circuit_type, _ = CircuitType.objects.get_or_create(name='Circuit Type 1', slug='circuit-type-1')
+        circuit = Circuit.objects.create(cid=cid, provider=provider, type=circuit_type)
+        circuit_terminations = []
+        for term_side in ('A', 'Z'):
+            circuit_termination = CircuitTermination(circuit=circuit, term_side=term_side)
+            if hasattr(CircuitTermination, 'termination_type'):
+                circuit_termination.termination = self.site
+            else:
+                circuit_termination.site = self.site
+            circuit_termination.save()
+            circuit_terminations.append(circuit_termination)
+        return circuit_terminations
+
+    def create_patch_panel_chain(self, name, length):
+        """
+        Cables two Interfaces through a chain of patch panels,
+        alternately entering them on their front and rear ports.
+        """
+        interface_a = self.create_interface(f'{name}-a')
+        interface_b = self.create_interface(f'{name}-b')
+        ends = [interface_a]
+        for i in range(length):
+            front_port, rear_port = self.create_patch_panel(f'{name}-panel-{i}')
+            ends.extend([front_port, rear_port] if i % 2 == 0 else [rear_port, front_port])
+        ends.append(interface_b)
+        for a_termination, b_termination in zip(ends[::2], ends[1::2]):
+            Cable(a_terminations=[a_termination], b_terminations=[b_termination]).save()
+        return interface_a, interface_b
+
+    def get_path_ids(self, *interfaces):
+        return [Interface.objects.get(pk=interface.pk)._path_id for interface in interfaces]
+
+    def test_patch_panel_chain(self):
+        interface_a, interface_b = self.create_patch_panel_chain('chain', 3)
+        paths = resolve_multi_cable_paths(self.get_path_ids(interface_a), set())
+        self.assertEqual(len(paths), 1)
+        # One segment per Cable
+        segments = paths[0]
+        self.assertEqual(len(segments), 4)
+        self.assertEqual(segments[0][0], [interface_a])
+        self.assertEqual(segments[-1][2], [interface_b])
+        self.assertEqual(segments[-1][2][0].device, interface_b.device)
+        for near_end, cables, far_end in segments:
+            self.assertIsInstance(cables[0], Cable)
+        for near_end, cables, far_end in segments[1:]:
+            self.assertIsInstance(near_end[0], (FrontPort, RearPort))
+
+    def test_paths_from_both_ends(self):
+        interface_a, interface_b = self.create_patch_panel_chain('chain', 3)
+        path_ids = self.get_path_ids(interface_a, interface_b)
+        signatures = set()
+        paths = resolve_multi_cable_paths(path_ids, signatures)
+        self.assertEqual(len(paths), 1)
+        self.assertEqual(len(signatures), 1)
+        # Already resolved paths are skipped
+        self.assertEqual(resolve_multi_cable_paths(path_ids, signatures), [])
+
+    def test_direct_cable(self):
+        interface_a = self.create_interface('direct-a')
+        interface_b = self.create_interface('direct-b')
+        Cable(a_terminations=[interface_a], b_terminations=[interface_b]).save()
+        self.assertEqual(resolve_multi_cable_paths(self.get_path_ids(interface_a), set()), [])
+
+    def test_mixed_termination_types(self):
+        interface_a = self.create_interface('mixed-a')
+        interface_b = self.create_interface('mixed-b')
+        front_port, rear_port = self.create_patch_panel('mixed-panel')
+        circuit_termination_a, circuit_termination_z = self.create_circuit('mixed-circuit')
+        cables = [
+            Cable(a_terminations=[interface_a], b_terminations=[front_port]),
+            Cable(a_terminations=[rear_port], b_terminations=[circuit_termination_a]),
+            Cable(a_terminations=[circuit_termination_z], b_terminations=[interface_b]),
+        ]
+        for cable in cables:
+            cable.save()
+        path_a, path_b = CablePath.objects.filter(pk__in=self.get_path_ids(interface_a, interface_b))
+        # Only the Cable nodes of the path make up its signature
+        cable_content_type = ContentType.objects.get_for_model(Cable)
+        signature = get_cable_path_signature(path_a.path)
+        self.assertEqual(signature, frozenset(f'{cable_content_type.pk}:{cable.pk}' for cable in cables))
+        self.assertEqual(signature, get_cable_path_signature(path_b.path))
+
+        paths = resolve_multi_cable_paths([path_a.pk], set())
+        self.assertEqual(len(paths), 1)
+        self.assertEqual(
+            [[type(step[0]) for step in segment] for segment in paths[0]],
+            [
+                [Interface, Cable, FrontPort],
+                [RearPort, Cable, CircuitTermination],
+                [CircuitTermination, Cable, Interface],
+            ],
+        )
+
+    def test_constant_query_count(self):
+        def resolve(path_ids):
+            # Cached ContentTypes would save queries on later runs only
+            ContentType.objects.clear_cache()
+            return resolve_multi_cable_paths(path_ids, set())
+
+        small = [self.create_patch_panel_chain(f'small-{i}', 3)[0] for i in range(2)]
+        large = [self.create_patch_panel_chain(f'large-{i}', 3)[0] for i in range(8)]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(resolve(self.get_path_ids(*small))), 2)
+        with self.assertNumQueries(len(queries)):
+            self.assertEqual(len(resolve(self.get_path_ids(*large))), 8)
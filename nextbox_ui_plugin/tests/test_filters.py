@@ -0,0 +1,111 @@
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase
+from dcim.models import (
+    ConsolePort, Device, DeviceRole, DeviceType, FrontPort, Interface, InventoryItem, Manufacturer, RearPort, Site,
+)
+from ipam.models import IPAddress
+
+from nextbox_ui_plugin.filters import TopologyFilterSet
+
+
+class TopologyFilterSetTestCase(TestCase):
+    """
+    Related objects are matched by EXISTS semi-joins, which return
+    the Devices of the former JOIN and DISTINCT queries, each once.
+    Their SQL and, on PostgreSQL, their EXPLAIN output are checked.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        manufacturer = Manufacturer.objects.create(name='Manufacturer 1', slug='manufacturer-1')
+        device_type = DeviceType.objects.create(
+            manufacturer=manufacturer, model='Device Type 1', slug='device-type-1'
+        )
+        role = DeviceRole.objects.create(name='Device Role 1', slug='device-role-1')
+        site = Site.objects.create(name='Site 1', slug='site-1')
+        devices = [
+            Device.objects.create(name=f'Device {i}', site=site, role=role, device_type=device_type)
+            for i in range(6)
+        ]
+        # Several components per Device would repeat it in a JOIN
+        for device in devices[:3]:
+            for i in range(3):
+                Interface.objects.create(device=device, name=f'Ethernet{i}', type='1000base-t')
+                InventoryItem.objects.create(device=device, name=f'Item {i}', serial=f'SERIAL-{device.pk}-{i}')
+        for device in devices[2:4]:
+            ConsolePort.objects.create(device=device, name='Console')
+        rear_port = RearPort.objects.create(device=devices[3], name='Rear1', type='8p8c', positions=1)
+        FrontPort.objects.create(
+            device=devices[3], name='Front1', type='8p8c', rear_port=rear_port, rear_port_position=1
+        )
+        RearPort.objects.create(device=devices[4], name='Rear1', type='8p8c', positions=1)
+        interface = Interface.objects.get(device=devices[0], name='Ethernet0')
+        ip_address = IPAddress.objects.create(address='192.0.2.1/24', assigned_object=interface)
+        devices[0].primary_ip4 = ip_address
+        devices[0].save()
+
+    def filter(self, **params):
+        return TopologyFilterSet(params, Device.objects.all()).qs
+
+    def assert_semi_join_plan(self, queryset):
+        """
+        Checks the PostgreSQL query plan for semi- or anti-joins,
+        or EXISTS subplans where the EXISTS clauses are combined,
+        and for the absence of the DISTINCT step of JOIN queries.
+        """
+        if connection.vendor != 'postgresql':
+            return
+        plan = queryset.explain()
+        self.assertRegex(plan, r'(Semi|Anti) Join|SubPlan')
+        self.assertNotRegex(plan.splitlines()[0], r'^(Unique|HashAggregate|GroupAggregate)')
+
+    def assert_semi_join(self, queryset, expected):
+        sql = str(queryset.query).upper()
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('DISTINCT', sql)
+        self.assertNotIn(' JOIN ', sql)
+        self.assert_semi_join_plan(queryset)
+        pks = list(queryset.values_list('pk', flat=True))
+        self.assertEqual(len(pks), len(set(pks)))
+        self.assertEqual(set(pks), set(expected.values_list('pk', flat=True)))
+
+    def test_interfaces(self):
+        self.assert_semi_join(
+            self.filter(interfaces='true'), Device.objects.filter(interfaces__isnull=False).distinct()
+        )
+        self.assert_semi_join(self.filter(interfaces='false'), Device.objects.filter(interfaces__isnull=True))
+
+    def test_console_ports(self):
+        self.assert_semi_join(
+            self.filter(console_ports='true'), Device.objects.filter(consoleports__isnull=False).distinct()
+        )
+        self.assert_semi_join(self.filter(console_ports='false'), Device.objects.filter(consoleports__isnull=True))
+
+    def test_pass_through_ports(self):
+        self.assert_semi_join(
+            self.filter(pass_through_ports='true'),
+            Device.objects.filter(Q(frontports__isnull=False) | Q(rearports__isnull=False)).distinct(),
+        )
+        # Devices missing front or rear ports, including those with rear ports only
+        self.assert_semi_join(
+            self.filter(pass_through_ports='false'),
+            Device.objects.exclude(frontports__isnull=False, rearports__isnull=False),
+        )
+
+    def test_search(self):
+        for value in ('serial-', 'Device 1', '192.0.2.1'):
+            with self.subTest(q=value):
+                self.assert_semi_join(
+                    self.filter(q=value),
+                    Device.objects.filter(
+                        Q(name__icontains=value) |
+                        Q(serial__icontains=value) |
+                        Q(inventoryitems__serial__icontains=value) |
+                        Q(asset_tag__icontains=value) |
+                        Q(description__icontains=value) |
+                        Q(comments__icontains=value) |
+                        Q(primary_ip4__address__startswith=value) |
+                        Q(primary_ip6__address__startswith=value)
+                    ).distinct(),
+                )
@@ -0,0 +1,14 @@
+from django.test import SimpleTestCase
+
+from nextbox_ui_plugin.benchmark import get_plugin_imports, trace_imports
+
+# Imported on first use only, see wire.get_optional_module() and layout.get_numpy()
+OPTIONAL_PACKAGES = {'numpy', 'msgpack', 'brotli'}
+
+
+class ImportTimeTestCase(SimpleTestCase):
+
+    def test_optional_packages_not_imported(self):
+        plugin_imports = get_plugin_imports(trace_imports())
+        imported_packages = {module.split('.')[0] for module in plugin_imports}
+        self.assertEqual(imported_packages & OPTIONAL_PACKAGES, set())
@@ -0,0 +1,22 @@
+from unittest import skipUnless
+
+from django.test import SimpleTestCase
+
+from nextbox_ui_plugin import layout
+
+
+@skipUnless(layout.numpy_available(), 'NumPy is not installed')
+class LayeredLayoutTestCase(SimpleTestCase):
+
+    def test_empty_topology(self):
+        x, y = layout.compute_layered_layout([], [])
+        self.assertEqual(len(x), 0)
+        self.assertEqual(len(y), 0)
+
+    def test_layers(self):
+        nodes = [{'id': 'a', 'layer': 1}, {'id': 'b', 'layer': 2}, {'id': 'c', 'layer': 2}]
+        edges = [{'source': 'a', 'target': 'b'}, {'source': 'a', 'target': 'c'}]
+        x, y = layout.compute_layered_layout(nodes, edges)
+        self.assertLess(y[0], y[1])
+        self.assertEqual(y[1], y[2])
+        self.assertNotEqual(x[1], x[2])
@@ -0,0 +1,72 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from dcim.models import Cable
+
+from nextbox_ui_plugin.benchmark import TopologyFixture
+from nextbox_ui_plugin.views import get_topology_graph
+
+
+class TopologyQueryCountTestCase(TestCase):
+    """
+    Topology builds run the same number of queries
+    whatever the number of Devices and Cables.
+    """
+
+    def build_topology(self, fixture, params):
+        # Cached ContentTypes would save queries on later builds only
+        ContentType.objects.clear_cache()
+        return get_topology_graph(fixture.get_devices(), params)
+
+    def create_split_cables(self, fixture):
+        """
+        Cables pairs of leaves to a spine with a single
+        Cable terminating on both leaves on its A side.
+        """
+        spines = [device for device in fixture.devices if device.role.slug == 'spine']
+        leaves = [device for device in fixture.devices if device.role.slug == 'leaf']
+        for i in range(0, len(leaves) - 1, 2):
+            Cable(
+                a_terminations=[fixture.create_interface(leaves[i]), fixture.create_interface(leaves[i + 1])],
+                b_terminations=[fixture.create_interface(spines[i % len(spines)])],
+            ).save()
+
+    def assert_unique_edge_ids(self, topology_graph):
+        edge_ids = [edge.as_dict()['id'] for edge in topology_graph.edges]
+        self.assertEqual(len(edge_ids), len(set(edge_ids)))
+
+    def assert_constant_query_count(self, shape, params, patch_panels=False, split_cables=False):
+        small = TopologyFixture(shape, 10, patch_panels=patch_panels)
+        small.create()
+        large = TopologyFixture(shape, 40, patch_panels=patch_panels)
+        large.create()
+        if split_cables:
+            self.create_split_cables(small)
+            self.create_split_cables(large)
+        with CaptureQueriesContext(connection) as queries:
+            small_graph = self.build_topology(small, params)[0]
+        with self.assertNumQueries(len(queries)):
+            large_graph = self.build_topology(large, params)[0]
+        self.assertGreater(len(large_graph.nodes), len(small_graph.nodes))
+        self.assertGreater(len(large_graph.edges), len(small_graph.edges))
+        self.assert_unique_edge_ids(small_graph)
+        self.assert_unique_edge_ids(large_graph)
+
+    def test_leaf_spine(self):
+        self.assert_constant_query_count('leaf-spine', {'display_unconnected': True, 'display_passive': True})
+
+    def test_campus(self):
+        self.assert_constant_query_count('campus', {'display_unconnected': True, 'display_passive': True})
+
+    def test_patch_panels(self):
+        # Patched uplinks are traced into multi-cable edges
+        self.assert_constant_query_count(
+            'leaf-spine', {'display_unconnected': True, 'display_passive': False}, patch_panels=True
+        )
+
+    def test_multi_termination_cables(self):
+        # Cables with A terminations on several Devices get an edge per Device
+        self.assert_constant_query_count(
+            'leaf-spine', {'display_unconnected': True, 'display_passive': True}, split_cables=True
+        )
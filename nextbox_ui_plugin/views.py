@@ -1,20 +1,35 @@
 #!./venv/bin/python
 
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import Count, Max, OuterRef, Q, Subquery, Value
 from django.shortcuts import render
+from django.urls import reverse
 from django.views.generic import View
-from dcim.models import *
-from ipam.models import *
-from circuits.models import *
+from dcim.models import (
+    CablePath, CableTermination, Device, DeviceRole, FrontPort, Interface, Location, PowerFeed, Rack, RearPort, Site,
+)
+from circuits.models import CircuitTermination
+from dcim.utils import decompile_path_node
 from extras.models import SavedFilter
-from . import forms, filters
+from . import cache, forms, filters, graph, instrumentation, layout
+from .models import SavedTopology
+from .plugin_settings import get_plugin_settings
 from django.contrib.auth.mixins import PermissionRequiredMixin
-from django.conf import settings
-from packaging import version
-import json
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import lru_cache
+from itertools import islice
+from operator import attrgetter
 import re
 
 
-NETBOX_CURRENT_VERSION = version.parse(settings.VERSION)
+PLUGIN_SETTINGS = get_plugin_settings()
+
+# Topologies of fewer Devices are always built sequentially,
+# worker threads and connections would cost more than they save
+PARALLEL_BUILD_MIN_DEVICES = 1000
 
 # Default NeXt UI icons
 SUPPORTED_ICONS = {
@@ -39,32 +54,6 @@ SUPPORTED_ICONS = {
     'network.wirelesshost',
 }
 
-# Topology layers would be sorted
-# in the same descending order
-# as in the tuple below.
-# It is expected that Device Role
-# slugs in Netbox exactly match
-# values listed below.
-# Update mapping to whatever you use.
-DEFAULT_LAYERS_SORT_ORDER = (
-    'undefined',
-    'outside',
-    'border',
-    'edge',
-    'edge-switch',
-    'edge-router',
-    'core',
-    'core-router',
-    'core-switch',
-    'distribution',
-    'distribution-router',
-    'distribution-switch',
-    'leaf',
-    'spine',
-    'access',
-    'access-switch',
-)
-
 
 interface_full_name_map = {
     'Eth': 'Ethernet',
@@ -74,91 +63,59 @@ interface_full_name_map = {
 }
 
 
-DEFAULT_ICON_MODEL_MAP = {
-    'CSR1000V': 'network.router',
-    'Nexus': 'network.switch',
-    'IOSXRv': 'network.router',
-    'IOSv': 'network.switch',
-    '2901': 'network.router',
-    '2911': 'network.router',
-    '2921': 'network.router',
-    '2951': 'network.router',
-    '4321': 'network.router',
-    '4331': 'network.router',
-    '4351': 'network.router',
-    '4421': 'network.router',
-    '4431': 'network.router',
-    '4451': 'network.router',
-    '2960': 'network.switch',
-    '3750': 'network.switch',
-    '3850': 'network.switch',
-    'ASA': 'network.firewall',
-}
-
+# Resolved once for the NetBox version in use
+get_device_role = attrgetter(PLUGIN_SETTINGS.device_role_field)
 
-DEFAULT_ICON_ROLE_MAP = {
-    'border': 'network.router',
-    'edge-switch': 'network.switch',
-    'edge-router': 'network.router',
-    'core-router': 'network.router',
-    'core-switch': 'network.switch',
-    'distribution': 'network.switch',
-    'distribution-router': 'network.router',
-    'distribution-switch': 'network.switch',
-    'leaf': 'network.switch',
-    'spine': 'network.switch',
-    'access': 'network.switch',
-    'access-switch': 'network.switch',
+# Levels Devices can be aggregated at:
+# (Device field, CableTermination lookup, group model).
+# Site, Location and Rack are cached on CableTerminations.
+AGGREGATION_GROUPS = {
+    'site': ('site', '_site_id', Site),
+    'location': ('location', '_location_id', Location),
+    'rack': ('rack', '_rack_id', Rack),
+    'role': (
+        PLUGIN_SETTINGS.device_role_field, f'_device__{PLUGIN_SETTINGS.device_role_field}_id', DeviceRole,
+    ),
 }
 
+def compile_tag_patterns(tag_patterns):
+    """
+    Compiles a list of tag regexes into a single search function
+    matching if any of the patterns matches.
+    """
+    if not tag_patterns:
+        return None
+    try:
+        return re.compile('|'.join(f'(?:{tag_regex})' for tag_regex in tag_patterns)).search
+    except re.error:
+        # Patterns with global inline flags cannot be combined
+        compiled_patterns = [re.compile(tag_regex) for tag_regex in tag_patterns]
+        return lambda tag: any(tag_regex.search(tag) for tag_regex in compiled_patterns)
 
-PLUGIN_SETTINGS = settings.PLUGINS_CONFIG.get("nextbox_ui_plugin", dict())
-
-MANUAL_LAYERS_SORT_ORDER = PLUGIN_SETTINGS.get("layers_sort_order", "")
-LAYERS_SORT_ORDER = MANUAL_LAYERS_SORT_ORDER or DEFAULT_LAYERS_SORT_ORDER
-
-MANUAL_ICON_MODEL_MAP = PLUGIN_SETTINGS.get("icon_model_map", "")
-ICON_MODEL_MAP = MANUAL_ICON_MODEL_MAP or DEFAULT_ICON_MODEL_MAP
-
-MANUAL_ICON_ROLE_MAP = PLUGIN_SETTINGS.get("icon_role_map", "")
-ICON_ROLE_MAP = MANUAL_ICON_ROLE_MAP or DEFAULT_ICON_ROLE_MAP
-
-# Defines whether Devices with no connections
-# are displayed on the topology view by default or not.
-DISPLAY_UNCONNECTED = PLUGIN_SETTINGS.get("DISPLAY_UNCONNECTED", True)
-if DISPLAY_UNCONNECTED not in (True, False):
-    DISPLAY_UNCONNECTED = False
-
-# Defines whether passive devices
-# are displayed on the topology view by default or not.
-# Passive devices are patch pannels, power distribution units, etc.
-DISPLAY_PASSIVE_DEVICES = PLUGIN_SETTINGS.get("DISPLAY_PASSIVE_DEVICES", False)
-if DISPLAY_PASSIVE_DEVICES not in (True, False):
-    DISPLAY_PASSIVE_DEVICES = False
-
-# Hide these roles by default
-UNDISPLAYED_DEVICE_ROLE_SLUGS = PLUGIN_SETTINGS.get("undisplayed_device_role_slugs", tuple())
 
-# Hide devices tagged with these tags
-UNDISPLAYED_DEVICE_TAGS = PLUGIN_SETTINGS.get("undisplayed_device_tags", tuple())
+# Tag lists are compiled once into combined alternation regexes
+UNDISPLAYED_DEVICE_TAGS_SEARCH = compile_tag_patterns(PLUGIN_SETTINGS.undisplayed_device_tags)
+INCLUDE_DEVICE_TAGS_SEARCH = compile_tag_patterns(PLUGIN_SETTINGS.select_layers_list_include_device_tags)
+EXCLUDE_DEVICE_TAGS_SEARCH = compile_tag_patterns(PLUGIN_SETTINGS.select_layers_list_exclude_device_tags)
 
-# Filter device tags listed in Select Layers menu
-SELECT_LAYERS_LIST_INCLUDE_DEVICE_TAGS = PLUGIN_SETTINGS.get("select_layers_list_include_device_tags", tuple())
-SELECT_LAYERS_LIST_EXCLUDE_DEVICE_TAGS = PLUGIN_SETTINGS.get("select_layers_list_exclude_device_tags", tuple())
 
-# Defines the initial layer alignment direction on the view
-INITIAL_LAYOUT = PLUGIN_SETTINGS.get("INITIAL_LAYOUT", 'forceDirected')
+def compile_icon_map(icon_map):
+    return {
+        str(key): icon_type if icon_type.startswith('network.') else f'network.{icon_type}'
+        for key, icon_type in icon_map.items()
+    }
 
-if INITIAL_LAYOUT not in ('vertica', 'horizontal', 'layered', 'forceDirected', 'auto'):
-    INITIAL_LAYOUT = 'forceDirected'
 
-# Translate from legacy options
-if INITIAL_LAYOUT == 'auto':
-    INITIAL_LAYOUT = 'forceDirected'
-elif INITIAL_LAYOUT in ('vertical', 'horizontal'):
-    INITIAL_LAYOUT = 'layered'
+# Icon maps are compiled once into lookup structures:
+# a normalized role dict and a single model substring regex.
+COMPILED_ICON_MODEL_MAP = compile_icon_map(PLUGIN_SETTINGS.icon_model_map)
+COMPILED_ICON_ROLE_MAP = compile_icon_map(PLUGIN_SETTINGS.icon_role_map)
+ICON_MODEL_REGEX = None
+if COMPILED_ICON_MODEL_MAP:
+    ICON_MODEL_REGEX = re.compile('|'.join(re.escape(model_base) for model_base in COMPILED_ICON_MODEL_MAP))
 
 
+@lru_cache(maxsize=4096)
 def if_shortname(ifname):
     for k, v in interface_full_name_map.items():
         if ifname.startswith(v):
@@ -169,321 +126,1160 @@ def if_shortname(ifname):
 def get_node_layer_sort_preference(device_role):
     """Layer priority selection function
     Layer sort preference is designed as numeric value.
-    This function identifies it by LAYERS_SORT_ORDER
+    This function identifies it by layers_sort_order
     object position by default. With numeric values,
     the logic may be improved without changes on NeXt app side.
     0(null) results undefined layer position in NeXt UI.
     Valid indexes start with 1.
     """
-    for i, role in enumerate(LAYERS_SORT_ORDER, start=1):
+    for i, role in enumerate(PLUGIN_SETTINGS.layers_sort_order, start=1):
         if device_role == role:
             return i
     return 1
 
 
-def get_icon_type(device_id):
+def get_icon_type(device_type_model, device_role_slug, tags):
     """
     Node icon getter function.
+    Takes already loaded Device attributes: device type model,
+    device role slug and the list of device tag names.
     Selection order:
     1. Based on 'icon_{icon_type}' tag in Netbox device
-    2. Based on Netbox device type and ICON_MODEL_MAP
-    3. Based on Netbox device role and ICON_ROLE_MAP
+    2. Based on Netbox device type and icon_model_map
+    3. Based on Netbox device role and icon_role_map
     4. Default 'undefined'
     """
-    nb_device = Device.objects.get(id=device_id)
-    if NETBOX_CURRENT_VERSION >= version.parse("4.0.0"):
-        device_role_obj = nb_device.role
-    else:
-        device_role_obj = nb_device.device_role
-    if not nb_device:
-        return 'unknown'
-    for tag in nb_device.tags.names():
-        if 'icon_' in tag:
-            if tag.replace('icon_', 'network.') in SUPPORTED_ICONS:
-                return tag.replace('icon_', 'network.')
-    for model_base, icon_type in ICON_MODEL_MAP.items():
-        if model_base in str(nb_device.device_type.model):
-            if icon_type.startswith('network.'):
-                return icon_type
-            else:
-                return f'network.{icon_type}'
-    for role_slug, icon_type in ICON_ROLE_MAP.items():
-        if str(device_role_obj.slug) == role_slug:
-            if icon_type.startswith('network.'):
+    icon_tags = tuple(tag for tag in tags if 'icon_' in tag)
+    return resolve_icon_type(str(device_type_model), str(device_role_slug), icon_tags)
+
+
+@lru_cache(maxsize=4096)
+def resolve_icon_type(device_type_model, device_role_slug, icon_tags):
+    """
+    Memoized icon resolution for a distinct
+    (device type model, device role slug, icon tags) combination.
+    Uses lookup structures compiled from the icon maps at import.
+    """
+    for tag in icon_tags:
+        if tag.replace('icon_', 'network.') in SUPPORTED_ICONS:
+            return tag.replace('icon_', 'network.')
+    if ICON_MODEL_REGEX and ICON_MODEL_REGEX.search(device_type_model):
+        # Keep icon_model_map order precedence among all matching substrings
+        for model_base, icon_type in COMPILED_ICON_MODEL_MAP.items():
+            if model_base in device_type_model:
                 return icon_type
-            else:
-                return f'network.{icon_type}'
-    return 'network.unknown'
+    return COMPILED_ICON_ROLE_MAP.get(device_role_slug, 'network.unknown')
 
 
+@lru_cache(maxsize=4096)
 def tag_is_hidden(tag):
-    for tag_regex in UNDISPLAYED_DEVICE_TAGS:
-        if re.search(tag_regex, tag):
-            return True
-    return False
+    return UNDISPLAYED_DEVICE_TAGS_SEARCH is not None and bool(UNDISPLAYED_DEVICE_TAGS_SEARCH(tag))
+
+
+@lru_cache(maxsize=4096)
+def tag_is_listed(tag):
+    """
+    Memoized Select Layers list verdict for a tag name.
+    Hidden tags are always listed so they can be toggled on.
+    """
+    hidden = tag_is_hidden(tag)
+    if INCLUDE_DEVICE_TAGS_SEARCH is not None and not (INCLUDE_DEVICE_TAGS_SEARCH(tag) or hidden):
+        return False
+    if EXCLUDE_DEVICE_TAGS_SEARCH is not None and EXCLUDE_DEVICE_TAGS_SEARCH(tag) and not hidden:
+        return False
+    return True
 
 
 def filter_tags(tags):
     if not tags:
         return []
-    if SELECT_LAYERS_LIST_INCLUDE_DEVICE_TAGS:
-        filtered_tags = []
-        for tag in tags:
-            for tag_regex in SELECT_LAYERS_LIST_INCLUDE_DEVICE_TAGS:
-                if re.search(tag_regex, tag):
-                    filtered_tags.append(tag)
-                    break
-            if tag_is_hidden(tag):
-                filtered_tags.append(tag)
-        tags = filtered_tags
-    if SELECT_LAYERS_LIST_EXCLUDE_DEVICE_TAGS:
-        filtered_tags = []
-        for tag in tags:
-            for tag_regex in SELECT_LAYERS_LIST_EXCLUDE_DEVICE_TAGS:
-                if re.search(tag_regex, tag) and not tag_is_hidden(tag):
-                    break
-            else:
-                filtered_tags.append(tag)
-        tags = filtered_tags
-    return tags
+    return [tag for tag in tags if tag_is_listed(tag)]
 
-def get_topology(nb_devices_qs, params):
+
+def get_cable_index(device_ids):
+    """Bulk cable loader for the topology builder.
+    Fetches every CableTermination of every Cable attached
+    to the given Devices in a single query. device_ids may be
+    a list of Device IDs or a Device values('pk') queryset.
+    Cables and cached termination Devices are joined in,
+    termination objects are prefetched with one query
+    per termination type.
+    Returns a dict of {cable_id: {'cable': Cable, 'A': [...], 'B': [...]}}
+    with CableTermination lists in NetBox's native order and
+    a dict of {device_id: {'A': [cable_id, ...], 'B': [cable_id, ...]}}.
+    """
+    cables = {}
+    device_cables = defaultdict(lambda: {'A': [], 'B': []})
+    cable_ids = CableTermination.objects.filter(
+        _device_id__in=device_ids
+    ).values('cable_id')
+    terminations = CableTermination.objects.filter(
+        cable_id__in=cable_ids
+    ).select_related(
+        'cable', '_device'
+    ).prefetch_related(
+        'termination'
+    ).order_by('cable', 'cable_end', 'pk')
+    for cable_termination in terminations:
+        link = cables.setdefault(cable_termination.cable_id, {
+            'cable': cable_termination.cable,
+            'A': [],
+            'B': [],
+        })
+        link[cable_termination.cable_end].append(cable_termination)
+        if cable_termination._device_id is None:
+            continue
+        device_side = device_cables[cable_termination._device_id][cable_termination.cable_end]
+        if cable_termination.cable_id not in device_side:
+            device_side.append(cable_termination.cable_id)
+    return cables, device_cables
+
+
+def get_topology_devices(nb_devices_qs):
+    return nb_devices_qs.select_related(
+        PLUGIN_SETTINGS.device_role_field, 'device_type', 'primary_ip4', 'primary_ip6',
+    ).prefetch_related('tags')
+
+
+def get_device_link(link, device_id):
+    """
+    Narrows a Cable with A terminations on several Devices
+    to the terminations of the given Device, so that every
+    Device on the A side gets its own edge.
+    """
+    a_terminations = [t for t in link['A'] if t._device_id == device_id]
+    if len(a_terminations) == len(link['A']):
+        return link
+    return {**link, 'A': a_terminations, 'split': True}
+
+
+def get_device_links(nb_device, cables, device_cables):
+    """
+    Returns complete Cables connected to the Device
+    on their A and B sides respectively.
+    """
+    links_from_device = [get_device_link(cables[c], nb_device.id) for c in device_cables[nb_device.id]['A']]
+    links_to_device = [cables[c] for c in device_cables[nb_device.id]['B']]
+
+    # Filter out cables with incomplete terminations
+    links_from_device = [c for c in links_from_device if (c['A'] and c['B'])]
+    links_to_device = [c for c in links_to_device if (c['A'] and c['B'])]
+    return links_from_device, links_to_device
+
+
+def get_device_node(nb_device, links_from_device, links_to_device):
+    """
+    Node builder. Returns the node record
+    for the Device and the Device role.
+    """
+    device_is_passive = False
+    primary_ip = ''
+    device_role_obj = get_device_role(nb_device)
+    if nb_device.primary_ip:
+        primary_ip = str(nb_device.primary_ip.address)
+    raw_tags = [str(tag.name) for tag in nb_device.tags.all()] or []
+    with instrumentation.phase('icons'):
+        icon_type = get_icon_type(nb_device.device_type.model, device_role_obj.slug, raw_tags)
+    tags = filter_tags(raw_tags)
+    # Device is considered passive if it has no linked Interfaces.
+    # Passive cabling devices use Rear and Front Ports.
+    interfaces_found = False
+    for link in links_from_device + links_to_device:
+        for ab_link in link['A'] + link['B']:
+            if isinstance(ab_link.termination, Interface) and ab_link._device_id == nb_device.id:
+                interfaces_found = True
+                break
+        if interfaces_found:
+            break
+    if links_to_device or links_from_device:
+        device_is_passive = not interfaces_found
+
+    if not (links_from_device or links_to_device):
+        divice_is_unconnected = True
+    else:
+        divice_is_unconnected = False
+
+    node = graph.TopologyNode(
+        device_id=nb_device.id,
+        name=nb_device.name,
+        layer=get_node_layer_sort_preference(
+            device_role_obj.slug
+        ),
+        icon_type=icon_type,
+        is_passive=device_is_passive,
+        is_unconnected=divice_is_unconnected,
+        tags=tags,
+        model=nb_device.device_type.model,
+        serial=nb_device.serial,
+        role_name=device_role_obj.name,
+        primary_ip=primary_ip,
+    )
+    return node, device_role_obj
+
+
+def link_is_displayable(link, device_ids):
+    side_a = link['A'][0].termination
+    side_b = link['B'][0].termination
+    # Exclude PowerFeed-connected links
+    if (isinstance(side_a, PowerFeed) or (isinstance(side_b, PowerFeed))):
+        return False
+    # Exclude CircuitTermination-connected links
+    if (isinstance(side_a, CircuitTermination) or (isinstance(side_b, CircuitTermination))):
+        return False
+    # Include links to discovered devices only
+    return link['B'][0]._device_id in device_ids
+
+
+def get_link_edge(link):
+    side_a, side_b = link['A'][0], link['B'][0]
+    return graph.CableEdge(
+        link['cable'].id,
+        link.get('split', False),
+        side_a._device_id,
+        side_b._device_id,
+        side_a.termination.name,
+        if_shortname(side_a.termination.name),
+        side_b.termination.name,
+        if_shortname(side_b.termination.name),
+        side_a._device.name,
+        side_b._device.name,
+    )
+
+
+def get_link_interface(link):
+    side_a, side_b = link['A'][0].termination, link['B'][0].termination
+    if isinstance(side_a, Interface):
+        return side_a
+    if isinstance(side_b, Interface):
+        return side_b
+    return None
+
+
+def get_link_path_ids(links):
+    """CablePath IDs of the Interface ends of the links."""
+    path_ids = []
+    for link in links:
+        interface_side = get_link_interface(link)
+        if interface_side is not None and interface_side._path_id is not None:
+            path_ids.append(interface_side._path_id)
+    return path_ids
+
+
+def get_cable_path_signature(path):
+    """
+    Hashable signature of a CablePath: the set of Cable
+    path nodes along it. Identical for the paths
+    originating from either end.
+    """
+    return frozenset(node for step in path[1::3] for node in step)
+
+
+def resolve_multi_cable_paths(path_ids, multi_cable_signatures):
+    """
+    Batched cable path resolver.
+    Fetches CablePath records of the Interface ends of all links,
+    given by get_link_path_ids(), in a single query instead of
+    tracing every Interface.
+    Paths are deduplicated by their signature before any path
+    object is loaded, so a path discovered from both ends is
+    resolved once. Objects along the remaining paths are then
+    resolved with one query per object type.
+    Returns segmented paths between two Interfaces
+    in Interface.trace() format and updates
+    multi_cable_signatures with their signatures.
+    Bridged Interfaces are not followed beyond the path destination.
+    """
+    if not path_ids:
+        return []
+    cable_paths = CablePath.objects.filter(pk__in=path_ids, is_complete=True).in_bulk()
+    unique_paths = []
+    for path_id in path_ids:
+        cable_path = cable_paths.get(path_id)
+        # identify segmented cable paths between end-devices
+        if cable_path is None or len(cable_path.path) < 6:
+            continue
+        signature = get_cable_path_signature(cable_path.path)
+        if signature in multi_cable_signatures:
+            continue
+        multi_cable_signatures.add(signature)
+        unique_paths.append(cable_path)
+
+    to_prefetch = defaultdict(set)
+    for cable_path in unique_paths:
+        for step in cable_path.path:
+            for node in step:
+                ct_id, object_id = decompile_path_node(node)
+                to_prefetch[ct_id].add(object_id)
+    prefetched = {}
+    for ct_id, object_ids in to_prefetch.items():
+        model_class = ContentType.objects.get_for_id(ct_id).model_class()
+        queryset = model_class.objects.filter(pk__in=object_ids)
+        if hasattr(model_class, 'device'):
+            queryset = queryset.select_related('device')
+        prefetched[ct_id] = queryset.in_bulk()
+
+    multi_cable_paths = []
+    for cable_path in unique_paths:
+        path = []
+        for step in cable_path.path:
+            step_objects = []
+            for node in step:
+                ct_id, object_id = decompile_path_node(node)
+                # Ignore stale (deleted) objects
+                if object_id in prefetched[ct_id]:
+                    step_objects.append(prefetched[ct_id][object_id])
+            path.append(step_objects)
+        segments = list(zip(*[iter(path)] * 3))
+        if not (segments[0][0] and segments[-1][2]):
+            continue
+        if isinstance(segments[0][0][0], Interface) and isinstance(segments[-1][2][0], Interface):
+            multi_cable_paths.append(segments)
+    return multi_cable_paths
+
+
+def get_multi_cable_edge(cable_path):
+    side_a_interface = cable_path[0][0][0]
+    side_b_interface = cable_path[-1][2][0]
+    return graph.MultiCableEdge(
+        side_a_interface.id,
+        side_b_interface.id,
+        side_a_interface.device_id,
+        side_b_interface.device_id,
+        side_a_interface.name,
+        if_shortname(side_a_interface.name),
+        side_b_interface.name,
+        if_shortname(side_b_interface.name),
+        side_a_interface.device.name,
+        side_b_interface.device.name,
+    )
+
+
+def get_topology_graph(nb_devices_qs, params, device_ids=None):
+    """
+    Compact topology builder.
+    Returns a TopologyGraph of node and edge records,
+    the displayed Device roles and the Device tags.
+    Device, Cable and termination model instances are released
+    as soon as the records are built, before cable paths are traced.
+    Cables are followed to the Devices in device_ids,
+    the Devices of the queryset by default.
+    """
     display_unconnected = params.get('display_unconnected')
     display_passive = params.get('display_passive')
-    topology_dict = {'nodes': [], 'edges': []}
+    topology_graph = graph.TopologyGraph()
     device_roles = set()
     all_device_tags = set()
-    multi_cable_connections = []
-    if not nb_devices_qs:
-        return topology_dict, device_roles, multi_cable_connections, list(all_device_tags)
+    with instrumentation.phase('devices'):
+        nb_devices = list(get_topology_devices(nb_devices_qs))
+    if not nb_devices:
+        return topology_graph, device_roles, list(all_device_tags)
     links = []
-    device_ids = [d.id for d in nb_devices_qs]
-    for nb_device in nb_devices_qs:
-        device_is_passive = False
-        device_url = nb_device.get_absolute_url()
-        primary_ip = ''
-        if NETBOX_CURRENT_VERSION >= version.parse("4.0.0"):
-            device_role_obj = nb_device.role
-        else:
-            device_role_obj = nb_device.device_role
-        if nb_device.primary_ip:
-            primary_ip = str(nb_device.primary_ip.address)
-        tags = [str(tag) for tag in nb_device.tags.names()] or []
-        tags = filter_tags(tags)
-        for tag in tags:
-            all_device_tags.add((tag, not tag_is_hidden(tag)))
-        # Device is considered passive if it has no linked Interfaces.
-        # Passive cabling devices use Rear and Front Ports.
-        links_from_device = Cable.objects.filter(terminations__cable_end='A', terminations___device_id=nb_device.id)
-        links_to_device = Cable.objects.filter(terminations__cable_end='B', terminations___device_id=nb_device.id)
-
-        # Filter out cables with incomplete terminations
-        links_from_device = [c for c in links_from_device if (c.a_terminations and c.b_terminations)]
-        links_to_device = [c for c in links_to_device if (c.a_terminations and c.b_terminations)]
-        
-        interfaces_found = False
-        if links_from_device:
-            for link in links_from_device:
-                for ab_link in link.a_terminations + link.b_terminations:
-                    if isinstance(ab_link, Interface) and ab_link.device.id == nb_device.id:
-                        interfaces_found = True
-                        break
-        if links_to_device:
-            for link in links_to_device:
-                for ab_link in link.a_terminations + link.b_terminations:
-                    if isinstance(ab_link, Interface) and ab_link.device.id == nb_device.id:
-                        interfaces_found = True
-                        break
-        if links_to_device or links_from_device:
-            device_is_passive = not interfaces_found
-        
-        if not (links_from_device or links_to_device):
-            divice_is_unconnected = True
-        else:
-            divice_is_unconnected = False
-
-        if display_unconnected is False and divice_is_unconnected:
-            continue
+    if device_ids is None:
+        device_ids = {d.id for d in nb_devices}
+    with instrumentation.phase('cables'):
+        cables, device_cables = get_cable_index(nb_devices_qs.values('pk'))
+    with instrumentation.phase('nodes'):
+        for nb_device in nb_devices:
+            links_from_device, links_to_device = get_device_links(nb_device, cables, device_cables)
+            node, device_role_obj = get_device_node(nb_device, links_from_device, links_to_device)
+            for tag in node.tags:
+                all_device_tags.add((tag, not tag_is_hidden(tag)))
 
-        node_data = {
-            'id': f'device-{nb_device.id}',
-            'name': nb_device.name,
-            'label': nb_device.name,
-            'layer': get_node_layer_sort_preference(
-                device_role_obj.slug
-            ),
-            'iconName': get_icon_type(
-                nb_device.id
-            ),
-            'isPassive': device_is_passive,
-            'isUnconnected': divice_is_unconnected,
-            'tags': tags,
-            'customAttributes': {
-                'name': nb_device.name,
-                'model': nb_device.device_type.model,
-                'serialNumber': nb_device.serial,
-                'deviceRole': device_role_obj.name,
-                'primaryIP': primary_ip,
-                'dcimDeviceLink': device_url,
-            }
-        }
+            if display_unconnected is False and node.is_unconnected:
+                continue
 
-        if display_passive:
-            is_visible = not (device_role_obj.slug in UNDISPLAYED_DEVICE_ROLE_SLUGS)
-            device_roles.add((device_role_obj.slug, device_role_obj.name, is_visible))
-            topology_dict['nodes'].append(node_data)
-        elif not display_passive and not device_is_passive:
-            is_visible = not (device_role_obj.slug in UNDISPLAYED_DEVICE_ROLE_SLUGS)
-            device_roles.add((device_role_obj.slug, device_role_obj.name, is_visible))
-            topology_dict['nodes'].append(node_data)
+            if display_passive or not node.is_passive:
+                is_visible = not (device_role_obj.slug in PLUGIN_SETTINGS.undisplayed_device_role_slugs)
+                device_roles.add((device_role_obj.slug, device_role_obj.name, is_visible))
+                topology_graph.nodes.append(node)
 
-        if not links_from_device:
-            continue
-        for link in links_from_device:
-            # Exclude PowerFeed-connected links
-            if (isinstance(link.a_terminations[0], PowerFeed) or (isinstance(link.b_terminations[0], PowerFeed))):
-                continue
-            # Exclude CircuitTermination-connected links
-            if (isinstance(link.a_terminations[0], CircuitTermination) or (isinstance(link.b_terminations[0], CircuitTermination))):
-                continue
-            # Include links to discovered devices only
-            if link.b_terminations[0].device_id in device_ids:
-                links.append(link)
+            for link in links_from_device:
+                if link_is_displayable(link, device_ids):
+                    links.append(link)
+    instrumentation.count('nodes', len(topology_graph.nodes))
 
     device_roles = list(device_roles)
     device_roles.sort(key=lambda i: get_node_layer_sort_preference(i[0]))
     all_device_tags = list(all_device_tags)
     all_device_tags.sort()
     if not links:
-        return topology_dict, device_roles, multi_cable_connections, list(all_device_tags)
-    link_ids = set()
-    for link in links:
-        interface_to_interface = isinstance(link.a_terminations[0], Interface) and isinstance(link.b_terminations[0], Interface)
-        at_least_one_interface = isinstance(link.a_terminations[0], Interface) or isinstance(link.b_terminations[0], Interface)
-        link_url = link.get_absolute_url()
-        edge_data = {
-            "label": f"Cable {link.id}",
-            "source": f"device-{link.a_terminations[0].device.id}",
-            "target": f"device-{link.b_terminations[0].device.id}",
-            "sourceInterface": link.a_terminations[0].name,
-            "sourceInterfaceLabel": {'text': if_shortname(link.a_terminations[0].name)},
-            "targetInterface": link.b_terminations[0].name,
-            "targetInterfaceLabel": {'text': if_shortname(link.b_terminations[0].name)},
-            "customAttributes": {
-                "name": f"Cable {link.id}",
-                "dcimCableURL": link_url,
-                "source": link.a_terminations[0].device.name,
-                "target": link.b_terminations[0].device.name,
-            }
-        }
-        if display_passive:
-            link_ids.add(link.id)
-            topology_dict['edges'].append(edge_data)
+        return topology_graph, device_roles, all_device_tags
+    with instrumentation.phase('edges'):
+        for link in links:
+            side_a, side_b = link['A'][0].termination, link['B'][0].termination
+            interface_to_interface = isinstance(side_a, Interface) and isinstance(side_b, Interface)
+            if display_passive or interface_to_interface:
+                topology_graph.edges.append(get_link_edge(link))
+        path_ids = get_link_path_ids(links)
+    # Only IDs are needed from here on
+    del nb_devices, cables, device_cables, links
 
-        if not display_passive and interface_to_interface:
-            link_ids.add(link.id)
-            topology_dict['edges'].append(edge_data)
+    # Do not calculate logical links if passive devices are displayed
+    if not display_passive:
+        with instrumentation.phase('trace'):
+            multi_cable_connections = resolve_multi_cable_paths(path_ids, set())
+            topology_graph.edges.extend(
+                get_multi_cable_edge(cable_path) for cable_path in multi_cable_connections
+            )
+        instrumentation.count('traces', len(multi_cable_connections))
+    instrumentation.count('edges', len(topology_graph.edges))
+    return topology_graph, device_roles, all_device_tags
 
-        if not at_least_one_interface:
-            # Skip trace if none of cable terminations is an Interface
-            continue
-        if display_passive:
-            # Do not calculate logical links if passive devices are displayed
-            continue
-        interface_side = None
-        if isinstance(link.a_terminations[0], Interface):
-            interface_side = link.a_terminations[0]
-        elif isinstance(link.b_terminations[0], Interface):
-            interface_side = link.b_terminations[0]
-        trace_result = interface_side.trace()
-        if not trace_result:
-            continue
-        cable_path = trace_result
-        # identify segmented cable paths between end-devices
-        if len(cable_path) < 2:
-            continue
 
-        side_a_interface = cable_path[0][0]
-        side_b_interface = cable_path[-1][2]
-        if not (side_a_interface and side_b_interface):
-            continue
+def get_site_partitions(nb_devices_qs, partition_count):
+    """
+    Splits the Sites of the Devices into at most partition_count
+    lists of Site IDs holding similar numbers of Devices.
+    """
+    site_device_counts = nb_devices_qs.order_by().values_list('site_id').annotate(devices=Count('pk'))
+    partitions = [[] for _ in range(partition_count)]
+    partition_sizes = [0] * partition_count
+    # Largest Sites first, each into the smallest partition
+    for site_id, devices in sorted(site_device_counts, key=lambda i: i[1], reverse=True):
+        index = partition_sizes.index(min(partition_sizes))
+        partitions[index].append(site_id)
+        partition_sizes[index] += devices
+    return [site_ids for site_ids in partitions if site_ids]
+
+
+def build_topology_partition(nb_devices_qs, params, device_ids):
+    """Worker thread entry point of the parallel topology builder."""
+    try:
+        with instrumentation.worker_queries():
+            return get_topology_graph(nb_devices_qs, params, device_ids=device_ids)
+    finally:
+        # Every worker thread opens its own database connection
+        connection.close()
+
+
+def get_partitioned_topology_graph(nb_devices_qs, params, workers=PLUGIN_SETTINGS.topology_build_workers,
+                                   min_devices=PARALLEL_BUILD_MIN_DEVICES):
+    """
+    Parallel topology builder.
+    Splits the Devices by Site into partitions of similar size and
+    builds the records of every partition concurrently in a thread
+    pool, each thread with its own database connection.
+    Cable edges between partitions are built by the partition
+    holding their A side. Logical multi-cable edges between partitions
+    are traced from both ends and merged.
+    Returns the same values as get_topology_graph(), which builds
+    small or single-partition topologies.
+    """
+    if workers < 2:
+        return get_topology_graph(nb_devices_qs, params)
+    with instrumentation.phase('partitions'):
+        device_ids = set(nb_devices_qs.values_list('pk', flat=True))
+        partitions = []
+        if len(device_ids) >= min_devices:
+            partitions = get_site_partitions(nb_devices_qs, workers)
+    if len(partitions) < 2:
+        return get_topology_graph(nb_devices_qs, params)
+    instrumentation.count('partitions', len(partitions))
+
+    with ThreadPoolExecutor(max_workers=len(partitions), thread_name_prefix='nextbox-topology') as executor:
+        # Worker threads record into the active topology profile
+        futures = [
+            executor.submit(
+                copy_context().run, build_topology_partition,
+                nb_devices_qs.filter(site_id__in=site_ids), params, device_ids,
+            )
+            for site_ids in partitions
+        ]
+        partition_results = [future.result() for future in futures]
+
+    with instrumentation.phase('merge'):
+        topology_graph = graph.TopologyGraph()
+        device_roles = set()
+        all_device_tags = set()
+        multi_cable_edge_ids = set()
+        for partition_graph, partition_roles, partition_tags in partition_results:
+            topology_graph.nodes.extend(partition_graph.nodes)
+            device_roles.update(partition_roles)
+            all_device_tags.update(partition_tags)
+            for edge in partition_graph.edges:
+                if isinstance(edge, graph.MultiCableEdge):
+                    edge_id = frozenset((edge.source_interface_id, edge.target_interface_id))
+                    if edge_id in multi_cable_edge_ids:
+                        instrumentation.count('edges', -1)
+                        continue
+                    multi_cable_edge_ids.add(edge_id)
+                topology_graph.edges.append(edge)
+    device_roles = sorted(device_roles, key=lambda i: get_node_layer_sort_preference(i[0]))
+    return topology_graph, device_roles, sorted(all_device_tags)
+
+
+def is_collapsed(params):
+    return bool(params.get('collapse_virtual_chassis') or params.get('merge_links'))
+
+
+def get_virtual_chassis_members(nb_devices_qs):
+    """
+    Returns {device_id: (virtual_chassis_id, name, is_master)}
+    for the virtual chassis members among the Devices.
+    """
+    members = nb_devices_qs.filter(virtual_chassis__isnull=False).order_by().values_list(
+        'pk', 'virtual_chassis_id', 'virtual_chassis__name', 'virtual_chassis__master_id'
+    )
+    return {
+        device_id: (virtual_chassis_id, name, device_id == master_id)
+        for device_id, virtual_chassis_id, name, master_id in members
+    }
+
+
+def get_collapsed_topology_graph(topology_graph, nb_devices_qs, params):
+    """
+    Collapses virtual chassis members and merges parallel edges
+    of the records as requested, before they are expanded.
+    """
+    with instrumentation.phase('collapse'):
+        virtual_chassis = {}
+        if params.get('collapse_virtual_chassis'):
+            virtual_chassis = get_virtual_chassis_members(nb_devices_qs)
+        collapsed_graph = graph.collapse_topology_graph(
+            topology_graph, virtual_chassis, merge_links=params.get('merge_links')
+        )
+    instrumentation.count('nodes', len(collapsed_graph.nodes) - len(topology_graph.nodes))
+    instrumentation.count('edges', len(collapsed_graph.edges) - len(topology_graph.edges))
+    return collapsed_graph
+
+
+def get_topology(nb_devices_qs, params):
+    """
+    Returns the topology dict in topoSphere format,
+    the displayed Device roles and the Device tags.
+    With TOPOLOGY_BUILD_WORKERS set, large multi-Site
+    topologies are built in parallel.
+    """
+    if PLUGIN_SETTINGS.topology_build_workers > 1:
+        topology_graph, device_roles, all_device_tags = get_partitioned_topology_graph(nb_devices_qs, params)
+    else:
+        topology_graph, device_roles, all_device_tags = get_topology_graph(nb_devices_qs, params)
+    if is_collapsed(params):
+        topology_graph = get_collapsed_topology_graph(topology_graph, nb_devices_qs, params)
+    with instrumentation.phase('expand'):
+        topology_dict = topology_graph.as_dict()
+    return topology_dict, device_roles, all_device_tags
+
+
+def iter_topology_chunks(nb_devices_qs, params, chunk_size=PLUGIN_SETTINGS.streaming_chunk_size):
+    """
+    Streaming topology builder.
+    Iterates the Device queryset in chunks and yields lists of
+    ('node' | 'edge', data) records: all nodes first, then cable
+    edges and finally logical multi-cable edges.
+    Peak memory is bounded by the chunk size rather than
+    the topology size. Only Device IDs, multi-cable path
+    signatures and logical edge records are kept for the whole topology.
+    Aggregated and collapsed topologies are built at once.
+    """
+    nb_devices_qs = get_neighborhood_queryset(nb_devices_qs, params)
+    if params.get('aggregate') or is_collapsed(params):
+        # Aggregated topologies are small, they are sent at once.
+        # Collapsing needs the whole topology
+        if params.get('aggregate'):
+            topology_dict = get_aggregated_topology(nb_devices_qs, params)
         else:
-            side_a_interface = side_a_interface[0]
-            side_b_interface = side_b_interface[0]
+            topology_dict = get_topology(nb_devices_qs, params)[0]
+        yield [('node', node) for node in topology_dict['nodes']]
+        yield [('edge', edge) for edge in topology_dict['edges']]
+        return
 
-        if isinstance(side_a_interface, Interface) and isinstance(side_b_interface, Interface):
-            if set([c[1][0] for c in cable_path]) in [set([c[1][0] for c in x]) for x in multi_cable_connections]:
+    display_unconnected = params.get('display_unconnected')
+    display_passive = params.get('display_passive')
+
+    def iter_device_chunks():
+        devices = get_topology_devices(nb_devices_qs).iterator(chunk_size=chunk_size)
+        while True:
+            chunk = list(islice(devices, chunk_size))
+            if not chunk:
+                return
+            yield chunk, get_cable_index([d.id for d in chunk])
+
+    # Nodes
+    device_ids = set()
+    for nb_devices, (cables, device_cables) in iter_device_chunks():
+        records = []
+        for nb_device in nb_devices:
+            device_ids.add(nb_device.id)
+            links_from_device, links_to_device = get_device_links(nb_device, cables, device_cables)
+            node = get_device_node(nb_device, links_from_device, links_to_device)[0]
+            if display_unconnected is False and node.is_unconnected:
                 continue
-            multi_cable_connections.append(cable_path)
-    for cable_path in multi_cable_connections:
-        source_device_id = f"device-{side_a_interface.device.id}"
-        target_device_id = f"device-{side_b_interface.device.id}"
-        side_a_interface = cable_path[0][0][0]
-        side_b_interface = cable_path[-1][2][0]
-        topology_dict['edges'].append({
-            "source": source_device_id,
-            "target": target_device_id,
-            "sourceInterface": side_a_interface.name,
-            "sourceInterfaceLabel": {'text': if_shortname(side_a_interface.name)},
-            "targetInterface": side_b_interface.name,
-            "targetInterfaceLabel": {'text': if_shortname(side_b_interface.name)},
-            "isLogicalMultiCable": True,
-            "customAttributes": {
-                "name": f"Multi-Cable Connection",
-                "dcimCableURL": f"/dcim/interfaces/{side_a_interface.id}/trace/",
-                "source": side_a_interface.device.name,
-                "target": side_b_interface.device.name,
-            }
-        })
-    return topology_dict, device_roles, multi_cable_connections, all_device_tags
+            if display_passive or not node.is_passive:
+                records.append(('node', node.as_dict()))
+        yield records
 
+    # Cable edges, logical multi-cable edges are held back
+    # until all cable edges are sent
+    multi_cable_edges = []
+    multi_cable_signatures = set()
+    for nb_devices, (cables, device_cables) in iter_device_chunks():
+        records = []
+        links = []
+        for nb_device in nb_devices:
+            links_from_device = get_device_links(nb_device, cables, device_cables)[0]
+            for link in links_from_device:
+                if not link_is_displayable(link, device_ids):
+                    continue
+                side_a, side_b = link['A'][0].termination, link['B'][0].termination
+                if display_passive or (isinstance(side_a, Interface) and isinstance(side_b, Interface)):
+                    records.append(('edge', get_link_edge(link).as_dict()))
+                links.append(link)
+        # Do not calculate logical links if passive devices are displayed
+        if not display_passive:
+            multi_cable_edges.extend(
+                get_multi_cable_edge(cable_path)
+                for cable_path in resolve_multi_cable_paths(get_link_path_ids(links), multi_cable_signatures)
+            )
+        yield records
 
-class TopologyView(PermissionRequiredMixin, View):
-    """Generic Topology View"""
-    permission_required = ('dcim.view_site', 'dcim.view_device', 'dcim.view_cable')
+    for i in range(0, len(multi_cable_edges), chunk_size):
+        yield [('edge', edge.as_dict()) for edge in multi_cable_edges[i:i + chunk_size]]
+
+
+def get_group_node_id(group_by, group_pk):
+    return f'{group_by}-{"none" if group_pk is None else group_pk}'
+
+
+def get_group_name(group_by, group):
+    if group is None:
+        return f'No {group_by.capitalize()}'
+    return str(group)
+
+
+def get_group_node(group_by, group_pk, group, device_count):
+    """
+    Super-node builder. Returns topoSphere node data
+    for a group of aggregated Devices.
+    """
+    name = get_group_name(group_by, group)
+    if device_count < 10:
+        icon_type = 'network.groups'
+    elif device_count < 100:
+        icon_type = 'network.groupm'
+    else:
+        icon_type = 'network.groupl'
+    layer = 1
+    if group_by == 'role' and group is not None:
+        layer = get_node_layer_sort_preference(group.slug)
+    return {
+        'id': get_group_node_id(group_by, group_pk),
+        'name': name,
+        'label': f'{name} ({device_count})',
+        'layer': layer,
+        'iconName': icon_type,
+        'isPassive': False,
+        'isUnconnected': False,
+        'tags': [],
+        'customAttributes': {
+            'name': name,
+            'aggregate': group_by,
+            'groupId': group_pk,
+            'deviceCount': device_count,
+            'dcimDeviceLink': group.get_absolute_url() if group is not None else '',
+        }
+    }
+
+
+def get_group_edge(edge_id, source, target, source_name, target_name, cable_count):
+    label = f'{cable_count} Cable' if cable_count == 1 else f'{cable_count} Cables'
+    return {
+        "id": edge_id,
+        "label": label,
+        "source": source,
+        "target": target,
+        "weight": cable_count,
+        "isAggregated": True,
+        "customAttributes": {
+            "name": label,
+            "cableCount": cable_count,
+            "source": source_name,
+            "target": target_name,
+        }
+    }
+
+
+def get_far_end_terminations(device_ids):
+    """
+    CableTerminations of the Devices at the far end of the Cable
+    of the outer CableTermination, for use in subqueries.
+    Only Cables between Interfaces and pass-through ports are considered.
+    """
+    return CableTermination.objects.filter(
+        cable_id=OuterRef('cable_id'),
+        _device_id__in=device_ids,
+        termination_type__in=get_link_termination_types(),
+    ).exclude(
+        cable_end=OuterRef('cable_end')
+    ).order_by('pk')
+
+
+def get_link_termination_types():
+    return list(ContentType.objects.get_for_models(Interface, FrontPort, RearPort).values())
+
+
+def get_group_cable_counts(nb_devices_qs, termination_field):
+    """
+    Counts Cables between Devices of different groups
+    with a single grouped query.
+    Returns a dict of {(group_pk, group_pk): cable_count}
+    keyed by unordered group pairs.
+    """
+    device_ids = nb_devices_qs.values('pk')
+    far_end = get_far_end_terminations(device_ids)
+    rows = CableTermination.objects.filter(
+        cable_end='A',
+        _device_id__in=device_ids,
+        termination_type__in=get_link_termination_types(),
+    ).annotate(
+        far_device_id=Subquery(far_end.values('_device_id')[:1]),
+        far_group_id=Subquery(far_end.values(termination_field)[:1]),
+    ).filter(
+        far_device_id__isnull=False
+    ).order_by().values_list(
+        termination_field, 'far_group_id'
+    ).annotate(
+        cable_count=Count('cable_id', distinct=True)
+    )
+    cable_counts = defaultdict(int)
+    for group_pk, far_group_pk, cable_count in rows:
+        if group_pk == far_group_pk:
+            continue
+        cable_counts[tuple(sorted((group_pk, far_group_pk), key=str))] += cable_count
+    return cable_counts
+
+
+def get_aggregated_topology(nb_devices_qs, params):
+    """
+    Aggregated topology builder.
+    Collapses Devices into one super-node per Site, Location,
+    Rack or Device role. Edges between super-nodes are weighted
+    by the number of Cables between their Devices.
+    Device and Cable counts are computed by grouped SQL aggregates,
+    no Device is loaded.
+    """
+    group_by = params['aggregate']
+    device_field, termination_field, group_model = AGGREGATION_GROUPS[group_by]
+    topology_dict = {'nodes': [], 'edges': []}
+    with instrumentation.phase('devices'):
+        device_counts = dict(
+            nb_devices_qs.order_by().values_list(f'{device_field}_id').annotate(device_count=Count('pk'))
+        )
+        groups = group_model.objects.in_bulk([pk for pk in device_counts if pk is not None])
+    with instrumentation.phase('cables'):
+        cable_counts = get_group_cable_counts(nb_devices_qs, termination_field)
+    with instrumentation.phase('nodes'):
+        for group_pk, device_count in device_counts.items():
+            topology_dict['nodes'].append(
+                get_group_node(group_by, group_pk, groups.get(group_pk), device_count)
+            )
+    instrumentation.count('nodes', len(topology_dict['nodes']))
+    with instrumentation.phase('edges'):
+        for (group_a, group_b), cable_count in cable_counts.items():
+            source, target = get_group_node_id(group_by, group_a), get_group_node_id(group_by, group_b)
+            topology_dict['edges'].append(get_group_edge(
+                f'aggregate-{source}-{target}', source, target,
+                get_group_name(group_by, groups.get(group_a)),
+                get_group_name(group_by, groups.get(group_b)),
+                cable_count,
+            ))
+    instrumentation.count('edges', len(topology_dict['edges']))
+    return topology_dict
+
+
+def get_group_lookup(device_field, group_pks):
+    """Device lookup matching any of the groups, None stands for Devices with no group."""
+    lookup = Q(**{f'{device_field}_id__in': [pk for pk in group_pks if pk is not None]})
+    if None in group_pks:
+        lookup |= Q(**{f'{device_field}__isnull': True})
+    return lookup
+
+
+def get_expanded_topology(nb_devices_qs, params, group_pk, expanded_group_pks):
+    """
+    Builds the Device-level subgraph of a single super-node.
+    Edges to Devices of already expanded groups are regular
+    cable and multi-cable edges. Cables to collapsed groups are
+    aggregated into weighted edges between Devices and super-nodes.
+    """
+    group_by = params['aggregate']
+    device_field, termination_field, group_model = AGGREGATION_GROUPS[group_by]
+    shown_group_pks = set(expanded_group_pks) | {group_pk}
+    group_devices_qs = nb_devices_qs.filter(get_group_lookup(device_field, [group_pk]))
+    shown_devices_qs = nb_devices_qs.filter(get_group_lookup(device_field, shown_group_pks))
+
+    # Devices of the super-node are shown individually
+    topology_dict = get_topology(shown_devices_qs, {**params, 'aggregate': None, 'collapse_virtual_chassis': False})[0]
+    group_node_ids = {f'device-{pk}' for pk in group_devices_qs.values_list('pk', flat=True)}
+    nodes = [node for node in topology_dict['nodes'] if node['id'] in group_node_ids]
+    node_ids = {node['id'] for node in nodes}
+    edges = [
+        edge for edge in topology_dict['edges']
+        if edge['source'] in group_node_ids or edge['target'] in group_node_ids
+    ]
+
+    with instrumentation.phase('cables'):
+        far_end = get_far_end_terminations(nb_devices_qs.values('pk'))
+        rows = CableTermination.objects.filter(
+            _device_id__in=group_devices_qs.values('pk'),
+            termination_type__in=get_link_termination_types(),
+        ).annotate(
+            far_group_id=Subquery(far_end.values(termination_field)[:1]),
+            far_device_id=Subquery(far_end.values('_device_id')[:1]),
+        ).filter(
+            far_device_id__isnull=False
+        ).order_by().values_list(
+            '_device_id', 'far_group_id'
+        ).annotate(
+            cable_count=Count('cable_id', distinct=True)
+        )
+        rows = [
+            (device_id, far_group_pk, cable_count) for device_id, far_group_pk, cable_count in rows
+            if far_group_pk not in shown_group_pks and f'device-{device_id}' in node_ids
+        ]
+        groups = group_model.objects.in_bulk([far_group_pk for _, far_group_pk, _ in rows if far_group_pk is not None])
+    device_names = {node['id']: node['name'] for node in nodes}
+    for device_id, far_group_pk, cable_count in rows:
+        source, target = f'device-{device_id}', get_group_node_id(group_by, far_group_pk)
+        edges.append(get_group_edge(
+            f'aggregate-{source}-{target}', source, target,
+            device_names[source], get_group_name(group_by, groups.get(far_group_pk)),
+            cable_count,
+        ))
+    return {
+        'group': get_group_node_id(group_by, group_pk),
+        'nodes': nodes,
+        'edges': edges,
+    }
+
+
+def get_path_neighbor_ids(device_ids, allowed_devices):
+    """
+    Returns IDs of the Devices at the far end of complete
+    cable paths from Interfaces of the given Devices, e.g. through
+    patch panels. Two queries regardless of the number of Devices.
+    """
+    interface_type = ContentType.objects.get_for_model(Interface)
+    interface_ids = set()
+    paths = Interface.objects.filter(
+        device_id__in=device_ids, _path__is_complete=True
+    ).values_list('_path__path', flat=True)
+    for path in paths:
+        for node in path[-1]:
+            ct_id, object_id = decompile_path_node(node)
+            if ct_id == interface_type.pk:
+                interface_ids.add(object_id)
+    if not interface_ids:
+        return set()
+    return set(
+        Interface.objects.filter(
+            pk__in=interface_ids, device_id__in=allowed_devices
+        ).values_list('device_id', flat=True)
+    )
+
+
+def get_hop_neighbor_ids(device_ids, allowed_devices, display_passive):
+    """
+    Returns IDs of the Devices one hop away from the given Devices,
+    found with the same number of queries for any number of them.
+    Unless passive Devices are displayed, neighbors are the Devices
+    cabled to an Interface, directly or through cable paths.
+    """
+    cable_ids = CableTermination.objects.filter(_device_id__in=device_ids).values('cable_id')
+    neighbors = CableTermination.objects.filter(cable_id__in=cable_ids, _device_id__in=allowed_devices)
+    if display_passive:
+        return set(neighbors.values_list('_device_id', flat=True))
+    neighbors = neighbors.filter(termination_type=ContentType.objects.get_for_model(Interface))
+    return set(neighbors.values_list('_device_id', flat=True)) | get_path_neighbor_ids(device_ids, allowed_devices)
+
+
+def get_neighborhood_device_ids(nb_devices_qs, params):
+    """
+    Bounded breadth-first expansion from the neighborhood root Devices.
+    Every hop is resolved for its whole frontier at once. Expansion
+    stops at the hop limit or once NEIGHBORHOOD_MAX_DEVICES Devices
+    are found, the closest Devices are kept.
+    Only Devices of the filtered queryset are expanded to.
+    """
+    neighborhood = params['neighborhood']
+    max_devices = PLUGIN_SETTINGS.neighborhood_max_devices
+    allowed_devices = nb_devices_qs.values('pk')
+    device_ids = set(nb_devices_qs.filter(pk__in=neighborhood['device_ids']).values_list('pk', flat=True))
+    frontier = device_ids
+    for _ in range(neighborhood['hops']):
+        if not frontier or len(device_ids) >= max_devices:
+            break
+        with instrumentation.phase('neighborhood'):
+            frontier = get_hop_neighbor_ids(frontier, allowed_devices, params['display_passive']) - device_ids
+        instrumentation.count('hops')
+        if len(device_ids) + len(frontier) > max_devices:
+            frontier = set(sorted(frontier)[:max_devices - len(device_ids)])
+            instrumentation.count('truncated')
+        device_ids |= frontier
+    return device_ids
+
+
+def get_neighborhood_queryset(nb_devices_qs, params):
+    """Narrows the Devices to the requested neighborhood, if any."""
+    if not params.get('neighborhood'):
+        return nb_devices_qs
+    return nb_devices_qs.filter(pk__in=get_neighborhood_device_ids(nb_devices_qs, params))
+
+
+def get_neighborhood_params(request_params):
+    """
+    Returns the neighborhood root Device IDs and hop count
+    of the request, or None.
+    """
+    device_ids = sorted({
+        int(device_id) for device_id in request_params.getlist('neighborhood_device_id') if device_id.isdigit()
+    })
+    if not device_ids:
+        return None
+    hops = request_params.get('hops', '1')
+    hops = int(hops) if hops.isdigit() else 1
+    return {
+        'device_ids': device_ids,
+        'hops': max(1, min(hops, PLUGIN_SETTINGS.neighborhood_max_hops)),
+    }
+
+
+def get_aggregate_subquery(queryset, aggregate):
+    """Aggregate over the whole queryset, as a scalar subquery."""
+    # Grouping by a constant leaves out GROUP BY, so all rows form one group
+    return Subquery(
+        queryset.order_by().annotate(group=Value(1)).values('group').annotate(value=aggregate).values('value')
+    )
+
+
+def get_topology_fingerprint(nb_devices_qs):
+    """
+    Cheap fingerprint of the data a topology is built from.
+    Row counts and the latest changes of the Devices, their
+    CableTerminations and Cables are read with one aggregate query.
+    Changes made to any of them change the fingerprint,
+    deletions through the row counts. The Device count is
+    also the one the aggregation threshold is compared to.
+    Neighborhoods are fingerprinted by all Devices they may
+    expand to, the filtered queryset, rather than by running the
+    expansion itself. Changes outside the neighborhood but within
+    the filters therefore change its fingerprint as well.
+    """
+    terminations = CableTermination.objects.filter(_device_id__in=nb_devices_qs.values('pk'))
+    # Uncorrelated scalar subqueries are evaluated once,
+    # aggregating them keeps all values in a single row
+    return nb_devices_qs.order_by().aggregate(
+        devices=Count('pk'),
+        devices_updated=Max('last_updated'),
+        terminations=Max(get_aggregate_subquery(terminations, Count('pk'))),
+        terminations_updated=Max(get_aggregate_subquery(terminations, Max('last_updated'))),
+        cables=Max(get_aggregate_subquery(terminations, Count('cable_id', distinct=True))),
+        cables_updated=Max(get_aggregate_subquery(terminations, Max('cable__last_updated'))),
+    )
+
+
+def get_related_fingerprint(nb_devices_qs, params):
+    """
+    Fingerprint of the related objects topology records are named
+    after, depending on the topology parameters: the virtual chassis
+    of collapsed members and the Sites, Locations, Racks or roles
+    of aggregated groups. Empty, without a query, if there are none.
+    """
+    aggregates = {}
+    if params.get('collapse_virtual_chassis'):
+        aggregates['virtual_chassis_updated'] = Max('virtual_chassis__last_updated')
+    if params.get('aggregate') in AGGREGATION_GROUPS:
+        device_field = AGGREGATION_GROUPS[params['aggregate']][0]
+        aggregates['groups'] = Count(device_field, distinct=True)
+        aggregates['groups_updated'] = Max(f'{device_field}__last_updated')
+    if not aggregates:
+        return {}
+    return nb_devices_qs.order_by().aggregate(**aggregates)
+
+
+def get_topology_queryset(request_params):
+    """Filtered Device queryset of request GET parameters."""
     queryset = Device.objects.all()
-    filterset = filters.TopologyFilterSet
-    template_name = 'nextbox_ui_plugin/topology_4.x.html'
+    if not request_params:
+        queryset = Device.objects.none()
+    return filters.TopologyFilterSet(request_params, queryset).qs
 
-    def get(self, request):
 
-        clean_request = request.GET.copy()
+def get_topology_params(request_params, queryset=None, device_count=None):
+    """
+    Resolves the filtered Device queryset and plugin-specific
+    topology parameters from request GET parameters.
+    A queryset already filtered by get_topology_queryset() and
+    its Device count, e.g. from its fingerprint, may be passed in.
+    """
+    if queryset is None:
+        queryset = get_topology_queryset(request_params)
+
+    saved_filter = None
+    if 'filter_id' in request_params and request_params['filter_id']:
+        filter_id = request_params['filter_id']
+        saved_filter = SavedFilter.objects.get(pk=filter_id)
+
+    if saved_filter:
+        # Extract only plugin-specific filters from the SavedFilter.
+        # All NetBox-native filters are handled by filtersets.
+        display_unconnected = saved_filter.parameters.get('display_unconnected', [PLUGIN_SETTINGS.display_unconnected])[0]
+        display_passive = saved_filter.parameters.get('display_passive', [PLUGIN_SETTINGS.display_passive_devices])[0]
+        aggregate = saved_filter.parameters.get('aggregate', [None])[0]
+        collapse_virtual_chassis = saved_filter.parameters.get(
+            'collapse_virtual_chassis', [PLUGIN_SETTINGS.collapse_virtual_chassis]
+        )[0]
+        merge_links = saved_filter.parameters.get('merge_links', [PLUGIN_SETTINGS.merge_parallel_links])[0]
+    else:
+        display_unconnected = PLUGIN_SETTINGS.display_unconnected
+        display_passive = PLUGIN_SETTINGS.display_passive_devices
+        aggregate = None
+        collapse_virtual_chassis = PLUGIN_SETTINGS.collapse_virtual_chassis
+        merge_links = PLUGIN_SETTINGS.merge_parallel_links
 
-        if not clean_request:
-            self.queryset = Device.objects.none()
+    if request_params.get('display_unconnected') is not None:
+        display_unconnected = request_params.get('display_unconnected')
 
-        self.queryset = self.filterset(clean_request, self.queryset).qs
+    if request_params.get('display_passive') is not None:
+        display_passive = request_params.get('display_passive')
 
-        saved_filter = None
-        if 'filter_id' in clean_request and clean_request['filter_id']:
-            filter_id = clean_request['filter_id']
-            saved_filter = SavedFilter.objects.get(pk=filter_id)
+    if request_params.get('aggregate'):
+        aggregate = request_params.get('aggregate')
 
-        if saved_filter:
-            # Extract only plugin-specific filters from the SavedFilter.
-            # All NetBox-native filters are handled by filtersets.
-            display_unconnected = saved_filter.parameters.get('display_unconnected', [DISPLAY_UNCONNECTED])[0]
-            display_passive = saved_filter.parameters.get('display_passive', [DISPLAY_PASSIVE_DEVICES])[0]
+    if request_params.get('collapse_virtual_chassis') is not None:
+        collapse_virtual_chassis = request_params.get('collapse_virtual_chassis')
+
+    if request_params.get('merge_links') is not None:
+        merge_links = request_params.get('merge_links')
+
+    # Neighborhoods are small, they are never aggregated
+    neighborhood = get_neighborhood_params(request_params)
+    if neighborhood:
+        aggregate = None
+    elif aggregate not in AGGREGATION_GROUPS:
+        # Large topologies are aggregated by Site unless
+        # Device-level topology is requested explicitly
+        aggregation_threshold = PLUGIN_SETTINGS.aggregation_threshold
+        if aggregation_threshold and aggregate != 'none':
+            if device_count is None:
+                device_count = queryset.count()
+            aggregate = 'site' if device_count > aggregation_threshold else None
         else:
-            display_unconnected = DISPLAY_UNCONNECTED
-            display_passive = DISPLAY_PASSIVE_DEVICES
+            aggregate = None
 
-        if clean_request.get('display_unconnected') is not None:
-            display_unconnected = clean_request.get('display_unconnected')
+    params = {
+        'display_unconnected': str(display_unconnected).lower() == 'true',
+        'display_passive': str(display_passive).lower() == 'true',
+        'aggregate': aggregate,
+        'neighborhood': neighborhood,
+        'collapse_virtual_chassis': str(collapse_virtual_chassis).lower() == 'true',
+        'merge_links': str(merge_links).lower() == 'true',
+    }
+    return queryset, params
 
-        if clean_request.get('display_passive') is not None:
-            display_passive = clean_request.get('display_passive')
 
-        params = {
-            'display_unconnected': str(display_unconnected).lower() == 'true',
-            'display_passive': str(display_passive).lower() == 'true',
-        }
+def build_request_topology(queryset, params):
+    """
+    Builds the topology dict for the resolved request parameters,
+    aggregated if requested and with server-side node positions.
+    """
+    if params.get('aggregate'):
+        return layout.apply_layout(get_aggregated_topology(queryset, params))
+    return layout.apply_layout(get_topology(get_neighborhood_queryset(queryset, params), params)[0])
+
+
+def get_request_site_id(request_params):
+    """
+    Returns the Site ID of requests for the topology of a single Site
+    with no other filters, such as those of SiteTopologyView, or None.
+    """
+    request_params = cache.normalize_request_params(request_params)
+    if len(request_params) != 1:
+        return None
+    key, values = request_params[0]
+    if key != 'site_id' or len(values) != 1 or not values[0].isdigit():
+        return None
+    return int(values[0])
+
+
+def get_cached_request_topology(request_params, queryset, params, user):
+    """
+    Returns the topology dict for the resolved request parameters
+    along with its computation timestamp.
+    Served from the topology cache whenever possible.
+    Server-side node positions are cached along with the topology.
+    """
+    cache_key = cache.get_topology_cache_key(request_params, params, user)
+    return cache.get_cached_topology(
+        cache_key,
+        queryset,
+        lambda: build_request_topology(queryset, params),
+        site_scoped=cache.is_site_scoped(request_params),
+    )
+
+
+class TopologyView(PermissionRequiredMixin, View):
+    """
+    Generic Topology View.
+    Renders the page shell only. Topology data is fetched
+    asynchronously from the topology API endpoint.
+    """
+    permission_required = ('dcim.view_site', 'dcim.view_device', 'dcim.view_cable')
+    queryset = Device.objects.all()
+    filterset = filters.TopologyFilterSet
+    template_name = 'nextbox_ui_plugin/topology_4.x.html'
+
+    def get(self, request):
+        # Precomputed Site topologies are served by the list endpoint only
+        topology_precomputed = bool(
+            PLUGIN_SETTINGS.topology_precompute_interval and get_request_site_id(request.GET) is not None
+        )
+        topology_streaming = PLUGIN_SETTINGS.topology_streaming and not topology_precomputed
+        if topology_streaming:
+            topology_data_url = reverse('plugins-api:nextbox_ui_plugin-api:topology-stream')
+        else:
+            topology_data_url = reverse('plugins-api:nextbox_ui_plugin-api:topology-list')
+        topology_delta_url = reverse('plugins-api:nextbox_ui_plugin-api:topology-delta')
+        topology_expand_url = reverse('plugins-api:nextbox_ui_plugin-api:topology-expand')
+        topology_refresh_url = ''
+        if topology_precomputed:
+            topology_refresh_url = reverse('plugins-api:nextbox_ui_plugin-api:topology-refresh')
+        topology_events_url = ''
+        if PLUGIN_SETTINGS.topology_push:
+            topology_events_url = reverse('plugins-api:nextbox_ui_plugin-api:topology-events')
+        if request.GET:
+            topology_data_url = f'{topology_data_url}?{request.GET.urlencode()}'
+            topology_delta_url = f'{topology_delta_url}?{request.GET.urlencode()}'
+            topology_expand_url = f'{topology_expand_url}?{request.GET.urlencode()}'
+            if topology_refresh_url:
+                topology_refresh_url = f'{topology_refresh_url}?{request.GET.urlencode()}'
+            if topology_events_url:
+                topology_events_url = f'{topology_events_url}?{request.GET.urlencode()}'
 
-        topology_dict, device_roles, multi_cable_connections, device_tags = get_topology(self.queryset, params)
+        # Layouts saved by the user for the same filters are reused
+        filter_key = cache.get_filter_key(request.GET)
+        saved_topology = SavedTopology.objects.filter(
+            created_by=request.user,
+            layout_context__filter_key=filter_key,
+        ).order_by('-timestamp').only('topology').first()
 
         return render(request, self.template_name, {
-            'source_data': json.dumps(topology_dict),
-            'initial_layout': INITIAL_LAYOUT,
+            'topology_data_url': topology_data_url,
+            'topology_delta_url': topology_delta_url,
+            'topology_events_url': topology_events_url,
+            'topology_expand_url': topology_expand_url,
+            'topology_refresh_url': topology_refresh_url,
+            'topology_refresh_interval': PLUGIN_SETTINGS.topology_refresh_interval,
+            'saved_topologies_url': reverse('plugins-api:nextbox_ui_plugin-api:savedtopology-list'),
+            'filter_key': filter_key,
+            'saved_layout': saved_topology.topology if saved_topology else None,
+            'topology_streaming': topology_streaming,
+            'topology_encoding': PLUGIN_SETTINGS.topology_encoding,
+            'topology_debug': PLUGIN_SETTINGS.topology_debug,
+            'initial_layout': PLUGIN_SETTINGS.initial_layout,
+            'layout_iterations': PLUGIN_SETTINGS.layout_iterations,
+            'layout_min_iterations': PLUGIN_SETTINGS.layout_min_iterations,
+            'layout_worker_min_nodes': PLUGIN_SETTINGS.layout_worker_min_nodes,
             'filter_form': forms.TopologyFilterForm(
                 request.GET,
                 label_suffix=''
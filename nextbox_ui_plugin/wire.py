@@ -0,0 +1,212 @@
+"""Compact topology wire format for NextBox-UI Plugin
+
+Topology dicts are encoded column by column. Every string is
+replaced by its index in a string table shared by all columns,
+and values topoSphereApp.js derives on its own, such as labels,
+object URLs and Device names of edge ends, are left out.
+Nodes and edges of any other structure, such as aggregated
+super-nodes, are passed through unchanged.
+Encoded topologies are sent as JSON or, with the msgpack
+package installed, as MessagePack. The optional msgpack and
+brotli packages are imported on first use.
+"""
+from functools import lru_cache
+from importlib import import_module
+from . import graph
+from .plugin_settings import is_installed
+import json
+
+COMPACT_FORMAT = 'nextbox-compact-1'
+
+# Brotli quality level of topology responses, favors speed over size
+BROTLI_QUALITY = 5
+
+NODE_KEYS = {'id', 'name', 'label', 'layer', 'iconName', 'isPassive', 'isUnconnected', 'tags', 'customAttributes'}
+NODE_ATTRIBUTE_KEYS = {'name', 'model', 'serialNumber', 'deviceRole', 'primaryIP', 'dcimDeviceLink'}
+CABLE_EDGE_KEYS = {
+    'id', 'label', 'source', 'target', 'sourceInterface', 'sourceInterfaceLabel',
+    'targetInterface', 'targetInterfaceLabel', 'customAttributes',
+}
+MULTI_CABLE_EDGE_KEYS = CABLE_EDGE_KEYS - {'label'} | {'isLogicalMultiCable'}
+EDGE_ATTRIBUTE_KEYS = {'name', 'dcimCableURL', 'source', 'target'}
+
+# Node flags
+PASSIVE = 1
+UNCONNECTED = 2
+
+# Edge kinds
+CABLE_EDGE = 0
+MULTI_CABLE_EDGE = 1
+
+
+@lru_cache(maxsize=None)
+def get_optional_module(module_name):
+    """Returns the optional module, or None if it is not installed."""
+    if not is_installed(module_name):
+        return None
+    return import_module(module_name)
+
+
+class StringTable:
+    """Maps strings to their index in the table. None is encoded as -1."""
+
+    def __init__(self):
+        self.strings = []
+        self.indexes = {}
+
+    def __call__(self, value):
+        if value is None:
+            return -1
+        index = self.indexes.get(value)
+        if index is None:
+            index = self.indexes[value] = len(self.strings)
+            self.strings.append(value)
+        return index
+
+
+def is_string(value):
+    return value is None or isinstance(value, str)
+
+
+def parse_object_ids(object_id, prefix, count=1):
+    """
+    Returns the integer IDs of '{prefix}-{ID}[-{ID}...]' strings,
+    or None if the string has another form.
+    """
+    if not isinstance(object_id, str) or not object_id.startswith(f'{prefix}-'):
+        return None
+    parts = object_id[len(prefix) + 1:].split('-')
+    if len(parts) != count or not all(part.isdigit() and str(int(part)) == part for part in parts):
+        return None
+    return [int(part) for part in parts]
+
+
+def get_compact_node(node, device_url):
+    """Returns the node's Device ID if all its other values can be derived, otherwise None."""
+    ids = parse_object_ids(node.get('id'), 'device')
+    attributes = node.get('customAttributes')
+    if ids is None or set(node) - {'coord'} != NODE_KEYS or not isinstance(attributes, dict):
+        return None
+    if set(attributes) != NODE_ATTRIBUTE_KEYS or not node['name'] == node['label'] == attributes['name']:
+        return None
+    if attributes['dcimDeviceLink'] != device_url.format(pk=ids[0]):
+        return None
+    strings = [node['name'], node['iconName'], *(attributes[key] for key in ('model', 'serialNumber', 'deviceRole', 'primaryIP'))]
+    if not all(is_string(value) for value in strings):
+        return None
+    if not isinstance(node['tags'], list) or not all(isinstance(tag, str) for tag in node['tags']):
+        return None
+    if type(node['layer']) is not int or type(node['isPassive']) is not bool or type(node['isUnconnected']) is not bool:
+        return None
+    coord = node.get('coord')
+    if 'coord' in node and not (isinstance(coord, dict) and set(coord) == {'x', 'y'}):
+        return None
+    return ids[0]
+
+
+def get_compact_edge(edge, cable_url, device_names):
+    """
+    Returns the edge's kind, object ID, peer object ID and end Device IDs
+    if all its other values can be derived, otherwise None.
+    """
+    attributes = edge.get('customAttributes')
+    ends = [parse_object_ids(edge.get(end), 'device') for end in ('source', 'target')]
+    if None in ends or not isinstance(attributes, dict) or set(attributes) != EDGE_ATTRIBUTE_KEYS:
+        return None
+    source_id, target_id = ends[0][0], ends[1][0]
+    if source_id not in device_names or target_id not in device_names:
+        return None
+    if attributes['source'] != device_names[source_id] or attributes['target'] != device_names[target_id]:
+        return None
+    for key in ('sourceInterface', 'targetInterface'):
+        if not isinstance(edge.get(key), str):
+            return None
+    for key in ('sourceInterfaceLabel', 'targetInterfaceLabel'):
+        label = edge.get(key)
+        if not (isinstance(label, dict) and set(label) == {'text'} and isinstance(label['text'], str)):
+            return None
+
+    cable_ids = parse_object_ids(edge['id'], 'cable')
+    if cable_ids is not None and set(edge) == CABLE_EDGE_KEYS:
+        cable_id = cable_ids[0]
+        if edge['label'] == attributes['name'] == f'Cable {cable_id}' and \
+                attributes['dcimCableURL'] == cable_url.format(pk=cable_id):
+            return CABLE_EDGE, cable_id, 0, source_id, target_id
+        return None
+
+    interface_ids = parse_object_ids(edge['id'], 'path', count=2)
+    if interface_ids is not None and set(edge) == MULTI_CABLE_EDGE_KEYS and edge['isLogicalMultiCable'] is True:
+        for interface_id, peer_id in (interface_ids, interface_ids[::-1]):
+            if attributes['dcimCableURL'] == f'/dcim/interfaces/{interface_id}/trace/':
+                if attributes['name'] == 'Multi-Cable Connection':
+                    return MULTI_CABLE_EDGE, interface_id, peer_id, source_id, target_id
+                return None
+    return None
+
+
+def encode_compact(topology_dict):
+    """Encodes a topology dict in the compact column format."""
+    device_url = graph.get_url_pattern('dcim:device')
+    cable_url = graph.get_url_pattern('dcim:cable')
+    string = StringTable()
+    nodes = {key: [] for key in ('id', 'name', 'layer', 'icon', 'flags', 'tags', 'model', 'serial', 'role', 'ip')}
+    coords = []
+    edges = {key: [] for key in (
+        'kind', 'ref', 'peer', 'source', 'target',
+        'sourceInterface', 'sourceLabel', 'targetInterface', 'targetLabel',
+    )}
+    extra = {'nodes': [], 'edges': []}
+    device_names = {}
+
+    for node in topology_dict['nodes']:
+        device_id = get_compact_node(node, device_url)
+        if device_id is None:
+            extra['nodes'].append(node)
+            continue
+        attributes = node['customAttributes']
+        device_names[device_id] = node['name']
+        nodes['id'].append(device_id)
+        nodes['name'].append(string(node['name']))
+        nodes['layer'].append(node['layer'])
+        nodes['icon'].append(string(node['iconName']))
+        nodes['flags'].append(PASSIVE * node['isPassive'] | UNCONNECTED * node['isUnconnected'])
+        nodes['tags'].append([string(tag) for tag in node['tags']])
+        nodes['model'].append(string(attributes['model']))
+        nodes['serial'].append(string(attributes['serialNumber']))
+        nodes['role'].append(string(attributes['deviceRole']))
+        nodes['ip'].append(string(attributes['primaryIP']))
+        coord = node.get('coord')
+        coords.append([coord['x'], coord['y']] if coord else None)
+    # Server-side positions are sent only if there are any
+    if any(coords):
+        nodes['coord'] = coords
+
+    for edge in topology_dict['edges']:
+        compact_edge = get_compact_edge(edge, cable_url, device_names)
+        if compact_edge is None:
+            extra['edges'].append(edge)
+            continue
+        for key, value in zip(('kind', 'ref', 'peer', 'source', 'target'), compact_edge):
+            edges[key].append(value)
+        edges['sourceInterface'].append(string(edge['sourceInterface']))
+        edges['sourceLabel'].append(string(edge['sourceInterfaceLabel']['text']))
+        edges['targetInterface'].append(string(edge['targetInterface']))
+        edges['targetLabel'].append(string(edge['targetInterfaceLabel']['text']))
+
+    return {
+        'format': COMPACT_FORMAT,
+        'urls': {'device': device_url, 'cable': cable_url},
+        'strings': string.strings,
+        'nodes': nodes,
+        'edges': edges,
+        'extra': extra,
+    }
+
+
+def encode_topology(topology_dict, encoding):
+    """Serializes a topology dict in the given encoding."""
+    if encoding == 'compact':
+        return json.dumps(encode_compact(topology_dict), separators=(',', ':')).encode()
+    if encoding == 'msgpack':
+        return get_optional_module('msgpack').packb(encode_compact(topology_dict))
+    return json.dumps(topology_dict).encode()